@@ -0,0 +1,223 @@
+"""
+连接性能基准：在本进程内启动SSH/SFTP服务器（ssh_server.py），用ConnectionManager测量
+连接耗时、单条命令耗时、大量输出的吞吐、SFTP上传下载速度和大目录的列出耗时，结果以JSON输出。
+下载速度同时与paramiko自带的sftp.get()对比，明显更慢时以退出码1结束。
+可以注入往返延迟和带宽上限，模拟远程服务器的网络条件；--compare与之前保存的结果逐项对比。
+
+    python benchmarks/connection_bench.py --output base.json
+    python benchmarks/connection_bench.py --rtt 50 --bandwidth 10 --compare base.json
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import paramiko  # noqa: E402
+
+from connection import ConnectionManager  # noqa: E402
+from known_hosts import KnownHosts  # noqa: E402
+from logger import get  # noqa: E402
+from ssh_server import LocalSSHServer  # noqa: E402
+
+MB = 1024 * 1024
+REGRESSION_THRESHOLD = 0.10  # --compare时变差超过该比例视为退化，以退出码1结束
+DOWNLOAD_MIN_RATIO = 0.5  # 下载速度低于paramiko自带sftp.get()的该比例时，以退出码1结束
+
+
+def summarize(samples):
+    """毫秒数列表 -> 中位数、p95、最小值"""
+    samples = sorted(samples)
+    return {
+        "median": round(statistics.median(samples), 2),
+        "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        "min": round(samples[0], 2),
+        "runs": len(samples),
+    }
+
+
+def timed(operation):
+    start = time.perf_counter()
+    result = operation()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def connect(log, server, known_hosts):
+    connection_manager = ConnectionManager(log, session_mode=True, known_hosts=known_hosts)
+    if not connection_manager.connect("127.0.0.1", "bench", "bench", server.port, monitor=False):
+        raise RuntimeError(f"连接本地服务器失败：{connection_manager.last_error}")
+    return connection_manager
+
+
+def bench_connect(log, server, known_hosts, runs):
+    samples = []
+    for _ in range(runs):
+        elapsed, connection_manager = timed(lambda: connect(log, server, known_hosts))
+        samples.append(elapsed)
+        connection_manager.disconnect()
+    return summarize(samples)
+
+
+def bench_command(connection_manager, runs):
+    # 第一条命令会打开shell通道，不计入结果
+    connection_manager.execute_remote_command("true")
+    samples = [timed(lambda: connection_manager.execute_remote_command("true"))[0] for _ in range(runs)]
+    return summarize(samples)
+
+
+def bench_output(connection_manager, size):
+    """命令输出size字节，按块回调计数，返回MB/s"""
+    received = [0]
+
+    def on_output(data):
+        received[0] += len(data)
+
+    elapsed, _ = timed(lambda: connection_manager.execute_remote_command(
+        f"head -c {size} /dev/zero | tr '\\0' x", on_output))
+    if received[0] < size:
+        raise RuntimeError(f"输出不完整：收到{received[0]}字节，应为{size}字节")
+    return round(size / MB / (elapsed / 1000), 2)
+
+
+def bench_transfer(connection_manager, workdir, size):
+    """上传再下载一个size字节的文件，返回(上传MB/s, 下载MB/s, sftp.get()下载MB/s)"""
+    local_file = os.path.join(workdir, "payload.bin")
+    with open(local_file, "wb") as f:
+        f.write(os.urandom(size))
+    remote_dir = os.path.join(workdir, "remote")
+    os.makedirs(remote_dir, exist_ok=True)
+    remote_file = os.path.join(remote_dir, "payload.bin")
+    upload_ms, uploaded = timed(lambda: connection_manager.upload_file(local_file, remote_dir))
+    download_file = os.path.join(workdir, "download.bin")
+    download_ms, downloaded = timed(lambda: connection_manager.download_file(remote_file, download_file))
+    if not (uploaded and downloaded) or os.path.getsize(download_file) != size:
+        raise RuntimeError("SFTP传输失败")
+    # 同一个文件用paramiko自带的sftp.get()再下载一次，作为下载速度的参照
+    get_ms, _ = timed(lambda: connection_manager.with_sftp(lambda sftp: sftp.get(remote_file, download_file)))
+    for path in (local_file, download_file, remote_file):
+        os.remove(path)
+    return tuple(round(size / MB / (elapsed / 1000), 2) for elapsed in (upload_ms, download_ms, get_ms))
+
+
+def bench_listing(connection_manager, workdir, entries, runs):
+    """列出有entries个文件的目录，每次都绕过缓存"""
+    directory = os.path.join(workdir, "listing")
+    os.makedirs(directory, exist_ok=True)
+    for i in range(entries):
+        open(os.path.join(directory, f"file_{i:07d}.log"), "w").close()
+    samples = []
+    for _ in range(runs):
+        elapsed, attrs = timed(lambda: connection_manager.list_files_attr(directory, refresh=True))
+        if len(attrs) != entries:
+            raise RuntimeError(f"列出的条目数不对：{len(attrs)}，应为{entries}")
+        samples.append(elapsed)
+    shutil.rmtree(directory)
+    return summarize(samples)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """逐项对比，返回[(指标, 旧值, 新值, 变化比例, 是否退化)]；*_mb_s越大越好，其余越小越好"""
+    rows = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if isinstance(value, dict):
+            value, old = value["median"], old["median"] if isinstance(old, dict) else None
+        if not old:
+            continue
+        change = (value - old) / old
+        worse = -change if name.endswith("_mb_s") else change
+        rows.append((name, old, value, change, worse > REGRESSION_THRESHOLD))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量连接、命令执行、SFTP传输和列目录的性能")
+    parser.add_argument("--rtt", type=float, default=0, help="注入的网络往返延迟（毫秒）")
+    parser.add_argument("--bandwidth", type=float, default=None, help="注入的带宽上限（MB/s），默认不限速")
+    parser.add_argument("--runs", type=int, default=20, help="连接、命令和列目录的重复次数")
+    parser.add_argument("--output-size", type=int, default=16, help="大量输出测试的输出大小（MB）")
+    parser.add_argument("--file-size", type=int, default=32, help="SFTP传输测试的文件大小（MB）")
+    parser.add_argument("--entries", type=int, default=20000, help="列目录测试的文件数")
+    parser.add_argument("--output", help="把结果写入该JSON文件")
+    parser.add_argument("--compare", metavar="BASELINE", help="与之前保存的JSON结果对比")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="shell-bench-")
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None
+    # 日志、known_hosts等文件都写在临时目录里
+    os.chdir(workdir)
+    log = get(console_level=logging.CRITICAL + 1)
+    known_hosts = KnownHosts(os.path.join(workdir, "known_hosts"))
+    server = LocalSSHServer(rtt=args.rtt / 1000, bandwidth=args.bandwidth * MB if args.bandwidth else None)
+    try:
+        results = {"connect_ms": bench_connect(log, server, known_hosts, args.runs)}
+        connection_manager = connect(log, server, known_hosts)
+        try:
+            results["command_ms"] = bench_command(connection_manager, args.runs)
+            results["output_mb_s"] = bench_output(connection_manager, args.output_size * MB)
+            results["upload_mb_s"], results["download_mb_s"], results["sftp_get_mb_s"] = bench_transfer(
+                connection_manager, workdir, args.file_size * MB)
+            results["listing_ms"] = bench_listing(connection_manager, workdir, args.entries, max(1, args.runs // 4))
+        finally:
+            connection_manager.disconnect()
+    finally:
+        server.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "paramiko": paramiko.__version__,
+            "rtt_ms": args.rtt,
+            "bandwidth_mb_s": args.bandwidth,
+            "output_size_mb": args.output_size,
+            "file_size_mb": args.file_size,
+            "entries": args.entries,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+    regressed = False
+    if results["download_mb_s"] < results["sftp_get_mb_s"] * DOWNLOAD_MIN_RATIO:
+        regressed = True
+        print(f"下载速度{results['download_mb_s']}MB/s低于sftp.get()的{DOWNLOAD_MIN_RATIO:.0%}"
+              f"（{results['sftp_get_mb_s']}MB/s）", file=sys.stderr)
+    if baseline is None:
+        return 1 if regressed else 0
+    for name, old, value, change, worse in compare(results, baseline.get("results", {})):
+        regressed = regressed or worse
+        print(f"{name:16} {old:>10} -> {value:<10} {change:+.1%}{'  退化' if worse else ''}", file=sys.stderr)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
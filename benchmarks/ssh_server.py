@@ -0,0 +1,279 @@
+"""
+基准测试用的本地SSH/SFTP服务器，基于paramiko的ServerInterface，在本进程内运行，不需要外部网络。
+
+任意用户名和密码都能登录；exec和shell请求交给本机的sh执行，SFTP直接读写本机文件系统。
+可以在客户端和服务器之间插入ThrottledLink，模拟网络往返延迟和带宽上限。
+"""
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface, SFTP_OK
+
+CHUNK_SIZE = 32768  # 转发和管道每次读取的字节数
+
+
+class LocalHandle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            if getattr(attr, "st_size", None) is not None:
+                os.ftruncate(self.writefile.fileno(), attr.st_size)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+
+class LocalSFTP(SFTPServerInterface):
+    """把SFTP请求映射到本机文件系统"""
+
+    def list_folder(self, path):
+        try:
+            entries = []
+            for name in os.listdir(path):
+                attr = SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+                attr.filename = name
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(path, flags, 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        handle = LocalHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def _call(self, operation, *args):
+        try:
+            operation(*args)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def remove(self, path):
+        return self._call(os.remove, path)
+
+    def rename(self, old_path, new_path):
+        return self._call(os.rename, old_path, new_path)
+
+    def posix_rename(self, old_path, new_path):
+        return self._call(os.replace, old_path, new_path)
+
+    def mkdir(self, path, attr):
+        return self._call(os.mkdir, path)
+
+    def rmdir(self, path):
+        return self._call(os.rmdir, path)
+
+    def chattr(self, path, attr):
+        try:
+            if getattr(attr, "st_mode", None) is not None:
+                os.chmod(path, attr.st_mode & 0o7777)
+            if getattr(attr, "st_atime", None) is not None:
+                os.utime(path, (attr.st_atime, attr.st_mtime))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def canonicalize(self, path):
+        return os.path.normpath(os.path.join(os.getcwd(), path))
+
+
+class LocalServerInterface(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=run_process, args=(channel, command), daemon=True).start()
+        return True
+
+    def check_channel_shell_request(self, channel):
+        threading.Thread(target=run_process, args=(channel, b"sh"), daemon=True).start()
+        return True
+
+    def check_global_request(self, kind, msg):
+        # keepalive@openssh.com等全局请求直接回复成功
+        return True
+
+
+def run_process(channel, command):
+    """在本机执行命令，把通道和进程的标准输入输出连接起来"""
+    process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, start_new_session=True)
+
+    def feed_stdin():
+        try:
+            for data in iter(lambda: channel.recv(CHUNK_SIZE), b""):
+                process.stdin.write(data)
+                process.stdin.flush()
+        except (OSError, EOFError):
+            pass
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+    def send_stderr():
+        for data in iter(lambda: process.stderr.read1(CHUNK_SIZE), b""):
+            channel.sendall_stderr(data)
+
+    threading.Thread(target=feed_stdin, daemon=True).start()
+    stderr_thread = threading.Thread(target=send_stderr, daemon=True)
+    stderr_thread.start()
+    try:
+        for data in iter(lambda: process.stdout.read1(CHUNK_SIZE), b""):
+            channel.sendall(data)
+        stderr_thread.join()
+        channel.send_exit_status(process.wait())
+    except (OSError, EOFError):
+        process.kill()
+    finally:
+        channel.close()
+
+
+class ThrottledLink:
+    """
+    本地TCP转发：每个方向的数据延迟rtt/2秒后才送达，并按bandwidth（字节/秒）限速，
+    用来模拟远程服务器的网络条件。
+    """
+
+    def __init__(self, target_port, rtt=0.0, bandwidth=None):
+        self.target_port = target_port
+        self.delay = rtt / 2
+        self.bandwidth = bandwidth
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.closed = False
+        threading.Thread(target=self._accept, name="throttled-link", daemon=True).start()
+
+    def _accept(self):
+        while not self.closed:
+            try:
+                client, _ = self.listener.accept()
+            except OSError:
+                break
+            upstream = socket.create_connection(("127.0.0.1", self.target_port))
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._forward(client, upstream)
+            self._forward(upstream, client)
+
+    def _forward(self, source, target):
+        pending = queue.Queue()
+
+        def read():
+            try:
+                for data in iter(lambda: source.recv(CHUNK_SIZE), b""):
+                    pending.put((time.monotonic() + self.delay, data))
+            except OSError:
+                pass
+            pending.put((time.monotonic() + self.delay, b""))
+
+        def write():
+            next_free = 0.0
+            while True:
+                due, data = pending.get()
+                if not data:
+                    break
+                start = max(due, next_free)
+                wait = start - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    target.sendall(data)
+                except OSError:
+                    break
+                if self.bandwidth:
+                    next_free = start + len(data) / self.bandwidth
+            try:
+                target.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+        threading.Thread(target=read, daemon=True).start()
+        threading.Thread(target=write, daemon=True).start()
+
+    def close(self):
+        self.closed = True
+        self.listener.close()
+
+
+class LocalSSHServer:
+    """
+    本进程内的SSH/SFTP服务器。rtt（秒）和bandwidth（字节/秒）不为空时，
+    port指向一个ThrottledLink，连接它就等于连接一台有相应网络条件的远程主机。
+    """
+
+    def __init__(self, rtt=0.0, bandwidth=None):
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.listener = socket.create_server(("127.0.0.1", 0), backlog=128)
+        self.server_port = self.listener.getsockname()[1]
+        self.transports = []
+        self.link = None
+        if rtt or bandwidth:
+            self.link = ThrottledLink(self.server_port, rtt, bandwidth)
+        self.port = self.link.port if self.link else self.server_port
+        threading.Thread(target=self._accept, name="local-ssh-server", daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                break
+            transport = paramiko.Transport(sock)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, LocalSFTP)
+            self.transports.append(transport)
+            try:
+                transport.start_server(server=LocalServerInterface())
+            except (paramiko.SSHException, EOFError, OSError):
+                pass
+
+    def close(self):
+        if self.link is not None:
+            self.link.close()
+        self.listener.close()
+        for transport in self.transports:
+            transport.close()
@@ -0,0 +1,106 @@
+"""
+启动时间检查：用 -X importtime 统计导入主窗口模块的耗时，并测量从进程启动到窗口第一次绘制的时间，
+超出预算或启动时导入了不该导入的重量级模块时以退出码1结束。
+
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET_MS = 200  # 导入src.shell_ui的累计耗时预算（毫秒）
+FIRST_PAINT_BUDGET_MS = 400  # 从解释器开始执行到主窗口第一次绘制的预算（毫秒）
+# 这些模块只应在第一次连接时导入
+DEFERRED_MODULES = ("paramiko", "cryptography", "connection", "broadcast")
+
+IMPORT_SCRIPT = "import sys; sys.path.insert(0, 'src'); import src.shell_ui"
+
+FIRST_PAINT_SCRIPT = r"""
+import os, sys, time
+start = time.perf_counter()
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path[:0] = [sys.argv[1], os.path.join(sys.argv[1], "src")]
+from PyQt5 import QtCore, QtWidgets
+app = QtWidgets.QApplication(sys.argv)
+from src.shell_ui import Mainwindow
+window = Mainwindow()
+
+class FirstPaint(QtCore.QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Paint:
+            print((time.perf_counter() - start) * 1000)
+            print(",".join(name for name in sys.modules if name.split(".")[0] in sys.argv[2:]))
+            app.quit()
+        return False
+
+paint_filter = FirstPaint()
+window.installEventFilter(paint_filter)
+window.show()
+QtCore.QTimer.singleShot(10000, app.quit)
+app.exec_()
+"""
+
+
+def measure_import():
+    """返回(导入src.shell_ui的累计微秒数, 导入过程中出现的延迟加载模块)"""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    total = None
+    loaded = set()
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name == "src.shell_ui":
+            total = int(cumulative)
+        if name.split(".")[0] in DEFERRED_MODULES:
+            loaded.add(name.split(".")[0])
+    return total, sorted(loaded)
+
+
+def measure_first_paint(workdir):
+    """返回(到第一次绘制的毫秒数, 绘制时已导入的延迟加载模块)"""
+    output = subprocess.run([sys.executable, "-c", FIRST_PAINT_SCRIPT, ROOT, *DEFERRED_MODULES], cwd=workdir,
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    loaded = sorted({name.split(".")[0] for name in output[1].split(",") if name}) if len(output) > 1 else []
+    return float(output[0]), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查程序启动时间是否在预算内")
+    parser.add_argument("--runs", type=int, default=5, help="重复测量的次数，取中位数")
+    parser.add_argument("--workdir", default=None, help="运行主窗口的目录（数据库和日志写在该目录下），默认使用临时目录")
+    args = parser.parse_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="shell-startup-")
+
+    import_times = []
+    paint_times = []
+    deferred = set()
+    for _ in range(args.runs):
+        total, loaded = measure_import()
+        import_times.append(total / 1000)
+        deferred.update(loaded)
+        elapsed, loaded = measure_first_paint(workdir)
+        paint_times.append(elapsed)
+        deferred.update(loaded)
+
+    result = {
+        "import_ms": round(sorted(import_times)[len(import_times) // 2], 1),
+        "import_budget_ms": IMPORT_BUDGET_MS,
+        "first_paint_ms": round(sorted(paint_times)[len(paint_times) // 2], 1),
+        "first_paint_budget_ms": FIRST_PAINT_BUDGET_MS,
+        "deferred_modules_loaded": sorted(deferred),
+    }
+    result["ok"] = (result["import_ms"] <= IMPORT_BUDGET_MS and result["first_paint_ms"] <= FIRST_PAINT_BUDGET_MS
+                    and not deferred)
+    print(json.dumps(result, ensure_ascii=False))
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+#! /usr/bin/python3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from headless import main
+
+if __name__ == '__main__':
+    sys.exit(main())
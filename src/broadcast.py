@@ -0,0 +1,169 @@
+import json
+import os
+import posixpath
+import socket
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from connection import ConnectionManager
+
+MAX_CONCURRENCY = 32  # 同时连接和执行的主机数量上限
+HOST_TIMEOUT = 30  # 每台主机从连接到命令结束的时限（秒）
+
+
+class HostResult:
+    """一台主机的执行结果，error不为None表示连接或执行失败"""
+
+    def __init__(self, host, username, exit_status=None, output="", error=None, elapsed=0.0):
+        self.host = host
+        self.username = username
+        self.exit_status = exit_status
+        self.output = output
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None and self.exit_status == 0
+
+    @property
+    def key(self):
+        """输出相同的主机归为一组"""
+        if self.error is not None:
+            return "error", self.error
+        return self.exit_status, self.output
+
+    def to_dict(self):
+        return {"host": self.host, "username": self.username, "exit_status": self.exit_status,
+                "output": self.output, "error": self.error, "elapsed": round(self.elapsed, 3)}
+
+
+class Broadcast:
+    """
+    在多台主机上并发执行同一条命令。最多同时处理concurrency台主机，
+    每台主机有独立的时限，总耗时接近最慢的一台而不是所有主机之和。
+    """
+
+    def __init__(self, log, hosts, command, concurrency=MAX_CONCURRENCY, timeout=HOST_TIMEOUT):
+        self.log = log
+        self.hosts = hosts  # [(ip, username, password[, port]), ...]
+        self.command = command
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def run(self, on_result=None, cancel_event=None):
+        """执行并返回所有主机的结果，每台主机完成时回调on_result(HostResult)"""
+        results = []
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(self.hosts))))
+        try:
+            futures = [executor.submit(self._run_host, host, cancel_event) for host in self.hosts]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    def _run_host(self, host, cancel_event=None):
+        ip, username, password = host[:3]
+        port = host[3] if len(host) > 3 else 22
+        start = time.monotonic()
+        if cancel_event is not None and cancel_event.is_set():
+            return HostResult(ip, username, error="已取消")
+
+        connection_manager = ConnectionManager(self.log, session_mode=False)
+        # 连接阶段的各项超时都不超过本主机的时限
+        connection_manager.connect_timeout = min(connection_manager.connect_timeout, self.timeout)
+        connection_manager.banner_timeout = min(connection_manager.banner_timeout, self.timeout)
+        connection_manager.auth_timeout = min(connection_manager.auth_timeout, self.timeout)
+        try:
+            if not connection_manager.connect(ip, username, password, port, cancel_event=cancel_event, monitor=False):
+                return HostResult(ip, username, error=connection_manager.last_error or "连接失败",
+                                  elapsed=time.monotonic() - start)
+            left = self.timeout - (time.monotonic() - start)
+            exit_status, output = self.execute(connection_manager, max(left, 0.01))
+            return HostResult(ip, username, exit_status, output, elapsed=time.monotonic() - start)
+        except socket.timeout:
+            self.log.warning(f"在{ip}上执行命令超时")
+            return HostResult(ip, username, error=f"超过{self.timeout}秒未完成", elapsed=time.monotonic() - start)
+        except Exception as e:
+            self.log.error(f"在{ip}上执行命令时出现错误：{str(e) or type(e).__name__}")
+            return HostResult(ip, username, error=str(e) or type(e).__name__, elapsed=time.monotonic() - start)
+        finally:
+            connection_manager.disconnect()
+
+    def execute(self, connection_manager, timeout):
+        """在已连接的主机上执行任务，返回(退出码, 输出)，超过timeout秒时抛出socket.timeout"""
+        return connection_manager.run_command(self.command, timeout=timeout)
+
+
+class BroadcastTransfer(Broadcast):
+    """
+    在多台主机上并发上传（put）或下载（get）同一个文件或目录。
+    下载到多台主机时每台主机的文件放在target下以主机名命名的子目录中，互不覆盖。
+    resume为True时上次中断留下的不完整文件从已有部分之后续传。
+    """
+
+    def __init__(self, log, hosts, direction, source, target, concurrency=MAX_CONCURRENCY, timeout=HOST_TIMEOUT,
+                 resume=False):
+        super().__init__(log, hosts, f"{direction} {source} {target}", concurrency, timeout)
+        self.direction = direction
+        self.source = source
+        self.target = target
+        self.resume = resume
+
+    def execute(self, connection_manager, timeout):
+        # 传输本身没有时限参数，到时间后通过取消事件中止
+        cancel_event = threading.Event()
+        timer = threading.Timer(timeout, cancel_event.set)
+        timer.daemon = True
+        timer.start()
+        try:
+            if self.direction == "put":
+                result = self._put(connection_manager, cancel_event)
+            else:
+                result = self._get(connection_manager, cancel_event)
+        finally:
+            timer.cancel()
+        if cancel_event.is_set():
+            raise socket.timeout(f"传输超时：{self.command}")
+        if not result:
+            raise RuntimeError("上传失败" if self.direction == "put" else "下载失败")
+        # 目录同步失败的文件也算失败
+        if isinstance(result, dict):
+            return (1 if result["failed"] else 0), json.dumps(result, ensure_ascii=False)
+        return 0, ""
+
+    def _put(self, connection_manager, cancel_event):
+        if os.path.isdir(self.source):
+            return connection_manager.upload_directory(self.source, self.target, cancel_event=cancel_event,
+                                                       resume=self.resume)
+        return connection_manager.upload_file(self.source, self.target, cancel_event=cancel_event,
+                                              resume=self.resume)
+
+    def _get(self, connection_manager, cancel_event):
+        local_dir = self.target
+        if len(self.hosts) > 1:
+            local_dir = os.path.join(local_dir, connection_manager.credentials[0])
+        os.makedirs(local_dir, exist_ok=True)
+        attributes = connection_manager.with_sftp(lambda sftp: sftp.stat(self.source))
+        if stat.S_ISDIR(attributes.st_mode):
+            return connection_manager.download_directory(self.source, local_dir, cancel_event=cancel_event,
+                                                         resume=self.resume)
+        local_file = os.path.join(local_dir, posixpath.basename(self.source.rstrip("/")))
+        return connection_manager.download_file(self.source, local_file, cancel_event=cancel_event,
+                                                resume=self.resume)
+
+
+def group_results(results):
+    """把输出相同的结果归为一组，返回[(代表结果, [主机结果, ...]), ...]，主机多的组在前"""
+    groups = {}
+    for result in results:
+        groups.setdefault(result.key, []).append(result)
+    return sorted(((members[0], members) for members in groups.values()), key=lambda group: -len(group[1]))
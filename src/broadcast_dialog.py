@@ -0,0 +1,120 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from broadcast import Broadcast, HOST_TIMEOUT, MAX_CONCURRENCY, group_results
+from jobs import BroadcastJob
+from scheduler import get_scheduler
+
+
+class BroadcastDialog(QtWidgets.QDialog):
+    """
+    批量执行命令的对话框。结果按主机逐个返回，输出相同的主机合并显示为一组，
+    界面按固定间隔刷新，主机很多时也不会频繁重绘。
+    """
+
+    def __init__(self, parent, log, hosts):
+        super().__init__(parent)
+        self.log = log
+        self.hosts = hosts
+        self.results = []
+        self.task = None
+        self.setWindowTitle(f"批量执行命令（{len(hosts)}台主机）")
+        self.resize(640, 520)
+
+        self.command_edit = QtWidgets.QLineEdit(self)
+        self.command_edit.setPlaceholderText("要在所有选中主机上执行的命令")
+        self.command_edit.returnPressed.connect(self.start)
+        self.concurrency = QtWidgets.QSpinBox(self)
+        self.concurrency.setRange(1, 256)
+        self.concurrency.setValue(MAX_CONCURRENCY)
+        self.timeout = QtWidgets.QSpinBox(self)
+        self.timeout.setRange(1, 3600)
+        self.timeout.setValue(HOST_TIMEOUT)
+        self.timeout.setSuffix(" 秒")
+        self.run_button = QtWidgets.QPushButton("执行", self)
+        self.run_button.clicked.connect(self.start)
+        self.cancel_button = QtWidgets.QPushButton("停止", self)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel)
+
+        self.output = QtWidgets.QPlainTextEdit(self)
+        self.output.setReadOnly(True)
+        self.output.setUndoRedoEnabled(False)
+        font = QtGui.QFont()
+        font.setFamily("SimSun")
+        font.setPointSize(9)
+        self.output.setFont(font)
+        self.status = QtWidgets.QLabel(self)
+
+        options = QtWidgets.QHBoxLayout()
+        options.addWidget(QtWidgets.QLabel("并发数", self))
+        options.addWidget(self.concurrency)
+        options.addWidget(QtWidgets.QLabel("单台超时", self))
+        options.addWidget(self.timeout)
+        options.addStretch(1)
+        options.addWidget(self.run_button)
+        options.addWidget(self.cancel_button)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.command_edit)
+        layout.addLayout(options)
+        layout.addWidget(self.output)
+        layout.addWidget(self.status)
+
+        # 结果先累积，定时重新分组显示
+        self.render_timer = QtCore.QTimer(self)
+        self.render_timer.setInterval(200)
+        self.render_timer.timeout.connect(self.render)
+
+    def start(self):
+        command = self.command_edit.text().strip()
+        if not command or self.task is not None:
+            return
+        self.results = []
+        broadcast = Broadcast(self.log, self.hosts, command, self.concurrency.value(), self.timeout.value())
+        self.task = BroadcastJob(broadcast)
+        self.task.signals.batch.connect(self.results.append)
+        self.task.signals.finished.connect(self.finish)
+        self.run_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.render()
+        self.render_timer.start()
+        get_scheduler().submit(self.task)
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.cancel_button.setEnabled(False)
+
+    def finish(self, results):
+        self.render_timer.stop()
+        self.task = None
+        self.render()
+        self.run_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+    def render(self):
+        """按输出分组显示已返回的结果"""
+        failed = sum(1 for result in self.results if not result.ok)
+        state = "已完成" if self.task is None else "执行中"
+        self.status.setText(f"{state}：{len(self.results)}/{len(self.hosts)} 台，其中 {failed} 台失败或退出码非0")
+        lines = []
+        for first, members in group_results(self.results):
+            if first.error is not None:
+                title = f"失败：{first.error}"
+            else:
+                title = f"退出码 {first.exit_status}"
+            lines.append(f"===== {len(members)}台主机，{title} =====")
+            lines.append(", ".join(member.host for member in members))
+            if first.error is None:
+                lines.append("-" * 40)
+                lines.append(first.output.rstrip("\n"))
+            lines.append("")
+        scrollbar = self.output.verticalScrollBar()
+        position = scrollbar.value()
+        self.output.setPlainText("\n".join(lines))
+        scrollbar.setValue(position)
+
+    def done(self, result):
+        # 关闭对话框时停止尚未完成的执行
+        self.cancel()
+        self.render_timer.stop()
+        super().done(result)
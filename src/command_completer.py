@@ -0,0 +1,94 @@
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtCore import QStringListModel
+
+from completion import common_prefix
+from jobs import IndexJob
+from scheduler import PRIORITY_INTERACTIVE
+
+
+class CommandCompleter(QtCore.QObject):
+    """
+    命令输入框的Tab补全。候选来自当前会话连接的CompletionIndex，补全只查内存；
+    目录还没有索引时在后台读取，读取完成后如果输入没有变化就自动补全。
+    """
+
+    def __init__(self, line_edit, current_session):
+        super().__init__(line_edit)
+        self.line_edit = line_edit
+        self.current_session = current_session  # 返回当前会话的函数
+        self.model = QStringListModel(self)
+        self.popup = QtWidgets.QCompleter(self.model, self)
+        self.popup.setWidget(line_edit)
+        self.popup.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+        self.popup.activated[str].connect(self.insert)
+        self.word_start = 0
+        line_edit.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        # Tab默认用于切换焦点，在输入框处理之前拦截
+        if obj is self.line_edit and event.type() == QtCore.QEvent.KeyPress and event.key() == QtCore.Qt.Key_Tab:
+            self.complete()
+            return True
+        return False
+
+    def complete(self):
+        session = self.current_session()
+        if session is None or not session.connection_manager.connected:
+            return
+        connection_manager = session.connection_manager
+        self.popup.popup().hide()
+        line = self.line_edit.text()[:self.line_edit.cursorPosition()]
+        self.word_start, candidates, missing = connection_manager.completion.complete(
+            line, connection_manager.current_directory)
+        if missing is not None:
+            self.load(session, missing, lambda: self.retry(session, line))
+            return
+        if len(candidates) == 1:
+            self.insert(candidates[0])
+            return
+        prefix = common_prefix(candidates)
+        if len(prefix) > len(line) - self.word_start:
+            self.insert(prefix)
+        elif candidates:
+            self.model.setStringList(candidates)
+            self.popup.complete()
+
+    def retry(self, session, line):
+        if session is self.current_session() and self.line_edit.text()[:self.line_edit.cursorPosition()] == line:
+            self.complete()
+
+    def insert(self, text):
+        """用text替换光标前的单词"""
+        line = self.line_edit.text()
+        cursor = self.line_edit.cursorPosition()
+        self.line_edit.setText(line[:self.word_start] + text + line[cursor:])
+        self.line_edit.setCursorPosition(self.word_start + len(text))
+
+    def load(self, session, path, callback=None):
+        """在后台读取目录条目，已经在读取时不重复提交"""
+        completion = session.connection_manager.completion
+        if not completion.start_loading(path):
+            return
+        job = IndexJob(completion, path)
+        job.priority = PRIORITY_INTERACTIVE  # 用户正在等待补全结果
+        if callback is not None:
+            job.signals.finished.connect(lambda _: callback())
+        session.start(job)
+
+    def prefetch(self, session):
+        """
+        连接后和每条命令执行后调用：读取命令列表（只读一次），工作目录改变时读取新目录的条目。
+        命令执行后当前目录的条目会失效，工作目录没变时不重新读取，等按Tab时再读。
+        """
+        connection_manager = session.connection_manager
+        if not connection_manager.connected:
+            return
+        completion = connection_manager.completion
+        if not completion.commands_loaded and completion.start_loading(None):
+            session.start(IndexJob(completion))
+        cwd = connection_manager.current_directory
+        if not cwd or cwd == completion.prefetched_directory:
+            return
+        completion.prefetched_directory = cwd
+        if completion.entries(cwd) is None:
+            self.load(session, cwd)
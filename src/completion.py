@@ -0,0 +1,199 @@
+import bisect
+import posixpath
+import re
+import stat
+import threading
+from collections import OrderedDict
+
+MAX_DIRECTORIES = 64  # 每台主机保留条目的目录数，超出时丢弃最久未用的目录
+MAX_CANDIDATES = 200  # 一次最多返回的候选数
+COMMANDS_TIMEOUT = 20  # 读取$PATH中命令的时限（秒）
+# 先输出$HOME，再输出$PATH各目录中可执行文件的名称
+COMMANDS_SCRIPT = (
+    "printf '%s\\n' \"$HOME\"; IFS=:; for d in $PATH; do for f in \"$d\"/*; do "
+    "[ -f \"$f\" ] && [ -x \"$f\" ] && printf '%s\\n' \"${f##*/}\"; done; done 2>/dev/null"
+)
+BUILTINS = ("alias", "bg", "cd", "command", "echo", "eval", "exec", "exit", "export", "fg", "history", "jobs",
+            "kill", "pwd", "read", "set", "source", "type", "ulimit", "umask", "unalias", "unset", "wait")
+# 命令行中最后一个参数：反斜杠转义的字符、引号括起的部分（可以还没有输入结尾的引号）或其他非空白字符
+LAST_WORD = re.compile(r"""(?:\\.|'[^']*'?|"(?:\\.|[^"\\])*"?|[^\s\\'"])*$""")
+# 参数中的各部分：单引号、双引号、反斜杠转义和普通字符
+WORD_PARTS = re.compile(r"""'([^']*)'?|"((?:\\.|[^"\\])*)"?|\\(.)|([^'"\\]+)""")
+SPECIAL_CHARS = re.compile(r"([\s'\"\\$&;|<>()*?!`#])")
+
+
+class PrefixList:
+    """排好序的字符串，用二分查找定位前缀匹配的区间"""
+
+    def __init__(self, words):
+        self.words = sorted(set(words))
+
+    def match(self, prefix, limit=MAX_CANDIDATES):
+        start = bisect.bisect_left(self.words, prefix)
+        end = bisect.bisect_left(self.words, prefix + "\U0010ffff", start)
+        return self.words[start:min(end, start + limit)]
+
+    def __len__(self):
+        return len(self.words)
+
+
+def escape(name):
+    return SPECIAL_CHARS.sub(r"\\\1", name)
+
+
+def unquote(word):
+    """去掉参数中的引号和转义，得到实际的路径；含有变量或命令替换等无法在本地展开的内容时返回None"""
+    parts = []
+    for single, double, escaped, plain in WORD_PARTS.findall(word):
+        if double:
+            if "$" in double or "`" in double:
+                return None
+            parts.append(re.sub(r'\\([$`"\\])', r"\1", double))
+        elif plain:
+            if "$" in plain or "`" in plain:
+                return None
+            parts.append(plain)
+        else:
+            parts.append(single or escaped)
+    return "".join(parts)
+
+
+class CompletionIndex:
+    """
+    一台主机的补全索引：$PATH中的命令和最近访问过的目录的条目，都保存为PrefixList，补全时只查内存，不访问网络。
+    目录条目随连接的目录缓存更新：列出目录时写入，cd、上传、保存等使目录缓存失效时同时失效。
+    """
+
+    def __init__(self, connection_manager):
+        self.connection_manager = connection_manager
+        self.commands = PrefixList(BUILTINS)
+        self.commands_loaded = False
+        self.home = None
+        self.directories = OrderedDict()  # 绝对路径 -> PrefixList(条目名，目录以/结尾)
+        self.loading = set()  # 正在后台读取的目录，避免重复提交
+        self.prefetched_directory = None  # 上次预先读取条目的工作目录
+        self.lock = threading.Lock()
+
+    def load_commands(self):
+        """读取远程$HOME和$PATH中的可执行文件，在后台线程中调用"""
+        try:
+            _, output = self.connection_manager.run_command(COMMANDS_SCRIPT, timeout=COMMANDS_TIMEOUT)
+        except Exception as e:
+            self.connection_manager.log.warning(f"读取远程命令列表失败：{str(e)}")
+            return False
+        finally:
+            with self.lock:
+                self.loading.discard(None)
+        lines = output.splitlines()
+        if lines:
+            self.home = lines[0] or None
+        self.commands = PrefixList(BUILTINS + tuple(lines[1:]))
+        self.commands_loaded = True
+        return True
+
+    def load_directory(self, path):
+        """读取目录条目（优先使用连接的目录缓存），在后台线程中调用"""
+        try:
+            self.put(path, self.connection_manager.list_files_attr(path))
+        finally:
+            with self.lock:
+                self.loading.discard(path)
+        return path
+
+    def start_loading(self, path):
+        """标记目录（None表示命令列表）开始读取，已经在读取时返回False"""
+        with self.lock:
+            if path in self.loading:
+                return False
+            self.loading.add(path)
+            return True
+
+    # 以下三个方法由DirectoryCache在列出目录、目录内容变化和断开连接时调用
+
+    def put(self, path, attrs):
+        names = [attr.filename + "/" if attr.st_mode is not None and stat.S_ISDIR(attr.st_mode) else attr.filename
+                 for attr in attrs]
+        entries = PrefixList(names)
+        key = posixpath.normpath(path)
+        with self.lock:
+            self.directories[key] = entries
+            self.directories.move_to_end(key)
+            while len(self.directories) > MAX_DIRECTORIES:
+                self.directories.popitem(last=False)
+
+    def invalidate(self, path, recursive=False):
+        key = posixpath.normpath(path)
+        with self.lock:
+            self.directories.pop(key, None)
+            if recursive:
+                prefix = key.rstrip("/") + "/"
+                for cached in [k for k in self.directories if k.startswith(prefix)]:
+                    del self.directories[cached]
+
+    def clear(self):
+        with self.lock:
+            self.directories.clear()
+
+    def entries(self, path):
+        key = posixpath.normpath(path)
+        with self.lock:
+            entries = self.directories.get(key)
+            if entries is not None:
+                self.directories.move_to_end(key)
+            return entries
+
+    def resolve(self, directory, cwd):
+        """把命令行中的目录部分解析为远程绝对路径，无法解析时返回None"""
+        if directory.startswith("~"):
+            if self.home is None or not (directory == "~" or directory.startswith("~/")):
+                return None
+            directory = self.home + directory[1:]
+        if not directory.startswith("/"):
+            if not cwd:
+                return None
+            directory = posixpath.join(cwd, directory)
+        return posixpath.normpath(directory)
+
+    def complete(self, line, cwd):
+        """
+        补全line末尾的单词，返回(单词起始位置, 候选列表, 需要先读取的目录)。
+        候选是替换该单词（包括其中的引号）的完整文本，特殊字符用反斜杠转义；
+        目录还没有索引时候选为空，第三项为该目录的绝对路径。
+        """
+        word_start = LAST_WORD.search(line).start()
+        word = unquote(line[word_start:])
+        if word is None:
+            return word_start, [], None
+        first_word = not line[:word_start].strip()
+        if first_word and "/" not in word:
+            return word_start, [escape(name) + " " for name in self.commands.match(word)], None
+
+        directory, _, base = word.rpartition("/")
+        if word.startswith("/") and not directory:
+            directory = "/"
+        path = self.resolve(directory or ".", cwd)
+        if path is None:
+            return word_start, [], None
+        entries = self.entries(path)
+        if entries is None:
+            return word_start, [], path
+        prefix = directory.rstrip("/") + "/" if directory else ""
+        if directory == "/":
+            prefix = "/"
+        candidates = []
+        for name in entries.match(base):
+            # 以.开头的条目只在输入了.时补全
+            if name.startswith(".") and not base.startswith("."):
+                continue
+            candidates.append(escape(prefix + name) + ("" if name.endswith("/") else " "))
+        return word_start, candidates, None
+
+
+def common_prefix(candidates):
+    if not candidates:
+        return ""
+    first, last = min(candidates), max(candidates)
+    size = 0
+    while size < len(first) and size < len(last) and first[size] == last[size]:
+        size += 1
+    return first[:size]
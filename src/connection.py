@@ -4,67 +4,563 @@
 # Author    :       摸鱼呀阿凡
 # Contact   :       f2095522823@gmail.com
 # License   :       MIT LICENSE
+import logging
 import os
+import posixpath
+import shlex
+import queue
+import socket
+import threading
+import time
+import weakref
 import paramiko
-import uuid
+
+from completion import CompletionIndex
+from keepalive import ConnectionMonitor, STATE_LOST, STATE_RECONNECTED, STATE_RECONNECTING
+from known_hosts import TrustOnFirstUsePolicy, default_known_hosts
+from metrics import BYTES_RECEIVED, BYTES_SENT, CONNECT_FAILURES, CONNECT_SECONDS, EXEC_SECONDS, FIRST_BYTE_SECONDS, \
+    registry
+from remote_cache import DirectoryCache
+from remote_shell import RemoteShell
+from sync import DirectorySync
+from transfer import SFTPTransfer, TransferCancelled, block_hashes
+
+SFTP_POOL_SIZE = 4  # 最多保留的空闲SFTP客户端数量
+LISTING_BATCH = 500  # 列目录时每批回调的条目数
+CONNECT_TIMEOUT = 10  # 建立TCP连接的超时时间（秒）
+BANNER_TIMEOUT = 15  # 等待SSH欢迎信息的超时时间（秒）
+AUTH_TIMEOUT = 15  # 身份验证的超时时间（秒）
+ATTEMPT_DELAY = 0.25  # 并行尝试多个地址时，相邻两次尝试的启动间隔（秒）
+KEEPALIVE_INTERVAL = 15  # SSH传输层keepalive的发送间隔（秒）
+PROBE_TIMEOUT = 5  # 连接探测等待回复的超时时间（秒）
+RECONNECT_DELAYS = (0.5, 1, 2, 4, 8)  # 自动重连每次尝试前的等待时间（秒）
+# 只读命令，执行中连接断开时可以在重连后安全地重新执行
+SAFE_REPLAY_COMMANDS = {"ls", "pwd", "cat", "head", "tail", "grep", "find", "du", "df", "free", "ps", "uptime",
+                        "whoami", "id", "hostname", "uname", "date", "stat", "file", "wc", "which",
+                        "echo", "md5sum", "sha256sum", "tree", "netstat", "ss"}
+# 上面的命令带这些参数时会修改文件、执行其他命令或者修改系统设置，不能重新执行
+UNSAFE_REPLAY_ARGUMENTS = {
+    "find": {"-delete", "-exec", "-execdir", "-ok", "-okdir", "-fprint", "-fprint0", "-fprintf", "-fls"},
+    "date": {"-s", "--set"},
+    "hostname": {"-F", "--file", "-b", "--boot"},
+    "tree": {"-o"},
+}
+# 出现这些字符时命令可能包含多条命令、重定向或替换，不按只读命令处理
+SHELL_METACHARACTERS = ";&|<>`$"
+
+_managers = weakref.WeakSet()  # 所有连接管理器，用于统计活动通道数
+
+
+def active_channels():
+    """各连接管理器自己打开（shell、SFTP、单独执行的命令、跟踪文件）且还没有关闭的通道数"""
+    return sum(manager.open_channels() for manager in list(_managers))
+
+
+ACTIVE_CHANNELS = registry.gauge("shell_active_channels", "所有连接上打开的SSH通道数", function=active_channels)
 
 
 class ConnectionManager:
-    def __init__(self, log):
+    def __init__(self, log, session_mode=True, known_hosts=None, record_transcript=True):
         self.log = log
         self.connected = False
         self.ssh = None
+        self.last_error = None
+        self.connect_timeout = CONNECT_TIMEOUT
+        self.banner_timeout = BANNER_TIMEOUT
+        self.auth_timeout = AUTH_TIMEOUT
+        self.known_hosts = known_hosts or default_known_hosts
+        # 上次连接成功的地址，重连时优先尝试：(主机, 端口) -> 地址
+        self.address_cache = {}
+        self.connecting_sock = None
+        self.credentials = None
+        self.monitor = None
+        # 连接中断后自动重连，on_state_change(状态)在后台线程中回调
+        self.on_state_change = None
+        self.reconnect_lock = threading.Lock()
+        self.closing = threading.Event()
         self.current_directory = None
+        # 会话模式下所有命令复用同一个shell通道
+        self.session_mode = session_mode
+        self.shell = None
+        # 复用的SFTP客户端池，每个客户端同一时间只借给一个操作使用
+        self.sftp_idle = []
+        self.sftp_lock = threading.Lock()
+        # 各线程正在使用的SFTP客户端和命令通道，abort()关闭它们使阻塞的操作立即返回：线程标识 -> [客户端或通道]
+        self.in_use = {}
+        self.aborted = set()  # 已被abort()中断、操作还没有结束的线程
+        self.channels = weakref.WeakSet()  # 本连接打开的通道，用于统计活动通道数，关闭后的通道被回收时自动移除
+        self.listing_cache = DirectoryCache()
+        # 命令和路径补全的索引，随目录缓存增量更新
+        self.completion = CompletionIndex(self)
+        self.listing_cache.observer = self.completion
+        # 编辑器加载的文件版本：路径 -> (各块的摘要, 大小, 修改时间)，不保存文件内容
+        self.loaded_versions = {}
+        # 可选的会话记录，保存命令的完整输出，主日志中只有截断后的内容。只取记录器，不在这里初始化日志，
+        # 由程序入口调用logger.get()配置；界面中的会话有自己的记录（transcript.py），此时record_transcript为False
+        self.transcript = logging.getLogger("transcript")
+        self.record_transcript = record_transcript
+        _managers.add(self)
 
-    def connect(self, ip, username, password):
-        """连接远程服务器"""
+    def connect(self, ip, username, password, port=22, cancel_event=None, monitor=True):
+        """
+        连接远程服务器。TCP连接、欢迎信息和身份验证分别有超时，
+        cancel_event被设置或调用cancel_connect后尽快放弃连接。
+        monitor为False时不启动连接探测和自动重连（用于只执行一条命令的短连接）。
+        """
         self.log.info("正在连接中%s%s%s", ip, username, password)
-        # 实现连接的具体逻辑
+        self.last_error = None
         try:
-            # 实例化远程连接的客户端
-            self.ssh = paramiko.SSHClient()
-            # 设置know_hosts文件添加策略为自动添加（自动输入yes）
-            self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy)
-            # 连接远程服务器
-            self.ssh.connect(hostname=ip, port=22, username=username, password=password)
+            start = time.perf_counter()
+            ssh = self._open_client(ip, username, password, port, cancel_event)
+            if ssh is None:
+                self.last_error = "连接已取消"
+                return False
+            CONNECT_SECONDS.observe(time.perf_counter() - start)
+            self.ssh = ssh
             self.connected = True  # 连接成功后设置为True
+            # 记住连接参数，连接中断后用于自动重连
+            self.credentials = (ip, username, password, port)
+            self.closing.clear()
+            if monitor:
+                self.monitor = ConnectionMonitor(self)
+                self.monitor.start()
 
+        except paramiko.BadHostKeyException as e:
+            self.last_error = "主机密钥与已保存的不一致，可能存在中间人攻击"
+            self.log.error(f"{self.last_error}：{str(e)}")
         except paramiko.AuthenticationException:
-            self.log.error("身份验证失败，请检查用户名和密码是否正确")
+            self.last_error = "身份验证失败，请检查用户名和密码是否正确"
+            self.log.error(self.last_error)
         except paramiko.SSHException as e:
-            self.log.error(f"SSH连接错误：{str(e)}")
+            self.last_error = f"SSH连接错误：{str(e)}"
+            self.log.error(self.last_error)
         except Exception as e:
-            self.log.error(f"连接错误：{str(e)}")
+            self.last_error = f"连接错误：{str(e) or type(e).__name__}"
+            self.log.error(self.last_error)
+        finally:
+            if not self.connected and cancel_event is not None and cancel_event.is_set():
+                self.last_error = "连接已取消"
+            if not self.connected and self.last_error != "连接已取消":
+                CONNECT_FAILURES.inc()
         return self.connected
 
-    def execute_remote_command(self, command):
-        """执行远程指令并返回结果"""
+    def _open_client(self, ip, username, password, port=22, cancel_event=None):
+        """建立SSH连接并完成身份验证，返回SSHClient，取消时返回None，失败时抛出异常"""
+        sock = self._open_socket(ip, port, cancel_event)
+        if sock is None:
+            return None
+        self.connecting_sock = sock
+        # 实例化远程连接的客户端
+        ssh = paramiko.SSHClient()
+        try:
+            # 已验证过的主机密钥直接从缓存加载，新主机首次连接时保存其密钥
+            host_key_name = ip if port == 22 else f"[{ip}]:{port}"
+            for key_type, key in self.known_hosts.lookup(host_key_name).items():
+                ssh.get_host_keys().add(host_key_name, key_type, key)
+            ssh.set_missing_host_key_policy(TrustOnFirstUsePolicy(self.known_hosts, self.log))
+            # 连接远程服务器
+            ssh.connect(hostname=ip, port=port, username=username, password=password, sock=sock,
+                        timeout=self.connect_timeout, banner_timeout=self.banner_timeout,
+                        auth_timeout=self.auth_timeout, look_for_keys=False, allow_agent=False)
+            if cancel_event is not None and cancel_event.is_set():
+                ssh.close()
+                return None
+            # 定时发送keepalive，避免空闲连接被防火墙或NAT断开
+            ssh.get_transport().set_keepalive(KEEPALIVE_INTERVAL)
+            return ssh
+        except Exception:
+            ssh.close()
+            raise
+        finally:
+            self.connecting_sock = None
+
+    def cancel_connect(self):
+        """取消正在进行的连接：关闭已建立的socket，使握手或验证立即失败"""
+        sock = self.connecting_sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def probe(self, timeout=PROBE_TIMEOUT):
+        """
+        探测连接是否仍然可用：发送keepalive全局请求并等待服务器回复。
+        超时未回复时关闭传输层，使阻塞在该连接上的操作立即返回。
+        """
+        transport = self.ssh.get_transport() if self.ssh is not None else None
+        if transport is None or not transport.is_active():
+            return False
+        replied = threading.Event()
+
+        def request():
+            # 服务器不支持该请求时也会回复失败消息，同样说明连接可用
+            transport.global_request("keepalive@openssh.com", wait=True)
+            replied.set()
+
+        threading.Thread(target=request, daemon=True).start()
+        if replied.wait(timeout) and transport.is_active():
+            return True
+        self.log.warning(f"连接探测{timeout}秒内没有收到回复，关闭失效的连接")
+        transport.close()
+        return False
+
+    def _connection_lost(self):
+        transport = self.ssh.get_transport() if self.ssh is not None else None
+        return self.connected and (transport is None or not transport.is_active())
+
+    def _notify(self, state):
+        if self.on_state_change is not None:
+            self.on_state_change(state)
+
+    def reconnect(self):
+        """
+        连接中断后按退避间隔重连，并恢复会话状态（工作目录、shell会话、SFTP会话）。
+        多个线程同时发现连接中断时只重连一次；返回连接是否可用。
+        """
+        with self.reconnect_lock:
+            if not self.connected or self.credentials is None:
+                return False
+            if not self._connection_lost():
+                return True  # 其他线程已经重连成功
+            self.log.warning("连接已中断，正在自动重连")
+            self._notify(STATE_RECONNECTING)
+            had_shell = self.shell is not None
+            had_sftp = bool(self.sftp_idle)
+            self.close_shell()
+            self.close_sftp()
+            try:
+                self.ssh.close()
+            except Exception as e:
+                self.log.warning(f"关闭失效连接时出现错误：{str(e)}")
+
+            for attempt, delay in enumerate(RECONNECT_DELAYS, 1):
+                if self.closing.wait(delay):
+                    return False  # 用户已断开连接
+                try:
+                    ssh = self._open_client(*self.credentials, cancel_event=self.closing)
+                except Exception as e:
+                    self.log.warning(f"第{attempt}次重连失败：{str(e) or type(e).__name__}")
+                    continue
+                if ssh is None:
+                    return False
+                self.ssh = ssh
+                try:
+                    if had_shell and self.session_mode:
+                        self.shell = RemoteShell(self.ssh, self.log)
+                        self.shell.open(self.current_directory)
+                        self.register_channel(self.shell.channel)
+                    if had_sftp:
+                        self.release_sftp(self._open_sftp())
+                except Exception as e:
+                    self.log.warning(f"恢复会话状态时出现错误：{str(e)}")
+                self.log.info(f"第{attempt}次重连成功，工作目录：{self.current_directory}")
+                self._notify(STATE_RECONNECTED)
+                return True
+
+            self.log.error("自动重连失败，连接已断开")
+            self.connected = False
+            self.last_error = "连接已中断，自动重连失败"
+            self._notify(STATE_LOST)
+            return False
+
+    @staticmethod
+    def _can_replay(command, sent, received):
+        """命令还没有发送到服务器，或者是只读命令且没有输出过内容时，才在重连后重新执行"""
+        if not sent:
+            return True
+        return not received and ConnectionManager._is_read_only(command)
+
+    @staticmethod
+    def _is_read_only(command):
+        """命令是SAFE_REPLAY_COMMANDS中的只读命令，且没有带修改文件或执行其他命令的参数"""
+        if any(char in command for char in SHELL_METACHARACTERS):
+            return False
+        try:
+            words = shlex.split(command)
+        except ValueError:
+            return False
+        if not words or words[0] not in SAFE_REPLAY_COMMANDS:
+            return False
+        unsafe = UNSAFE_REPLAY_ARGUMENTS.get(words[0], ())
+        # hostname带非选项参数时是设置主机名
+        if words[0] == "hostname" and any(not word.startswith("-") for word in words[1:]):
+            return False
+        return not any(word.split("=", 1)[0] in unsafe for word in words[1:])
+
+    def _resolve(self, host, port):
+        """解析出所有地址，IPv6和IPv4交替排列，上次成功的地址排在最前"""
+        infos = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+        addresses = []
+        for info in infos:
+            if (info[0], info[4]) not in addresses:
+                addresses.append((info[0], info[4]))
+        first_family = addresses[0][0] if addresses else None
+        preferred = [a for a in addresses if a[0] == first_family]
+        others = [a for a in addresses if a[0] != first_family]
+        ordered = []
+        for i in range(max(len(preferred), len(others))):
+            ordered.extend(group[i] for group in (preferred, others) if i < len(group))
+        cached = self.address_cache.get((host, port))
+        if cached in ordered:
+            ordered.remove(cached)
+            ordered.insert(0, cached)
+        return ordered
+
+    def _open_socket(self, host, port, cancel_event=None):
+        """
+        按happy eyeballs方式建立TCP连接：每隔ATTEMPT_DELAY启动下一个地址的尝试（前一个失败时立即启动），
+        采用最先连接成功的socket，其余的关闭。取消时返回None，全部失败或超时时抛出最后的错误。
+        """
+        addresses = self._resolve(host, port)
+        if not addresses:
+            raise socket.gaierror(f"无法解析主机：{host}")
+
+        results = queue.Queue()
+        lock = threading.Lock()
+        state = {"done": False}
+
+        def attempt(family, address):
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.connect_timeout)
+            try:
+                sock.connect(address)
+            except OSError as e:
+                sock.close()
+                results.put((None, address, e))
+                return
+            with lock:
+                if state["done"]:
+                    sock.close()  # 已有其他地址连接成功或已放弃
+                else:
+                    results.put((sock, address, None))
+
+        deadline = time.monotonic() + self.connect_timeout
+        started = finished = 0
+        next_start = 0
+        error = None
+        try:
+            while finished < len(addresses):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                now = time.monotonic()
+                if now >= deadline:
+                    raise socket.timeout(f"连接{host}:{port}超时")
+                if started < len(addresses) and now >= next_start:
+                    threading.Thread(target=attempt, args=addresses[started], daemon=True).start()
+                    started += 1
+                    next_start = now + ATTEMPT_DELAY
+                wait = min(deadline, next_start) if started < len(addresses) else deadline
+                try:
+                    # 定时醒来检查取消
+                    sock, address, e = results.get(timeout=min(max(wait - now, 0.01), 0.1))
+                except queue.Empty:
+                    continue
+                finished += 1
+                if sock is not None:
+                    with lock:
+                        state["done"] = True
+                    sock.settimeout(None)
+                    self.address_cache[(host, port)] = (sock.family, address)
+                    return sock
+                error = e
+                next_start = 0  # 失败后立即尝试下一个地址
+            raise error
+        finally:
+            with lock:
+                state["done"] = True
+            # 关闭已连接但未被采用的socket
+            while not results.empty():
+                sock = results.get_nowait()[0]
+                if sock is not None:
+                    sock.close()
+
+    def execute_remote_command(self, command, on_output=None):
+        """
+        执行远程指令并返回结果。
+
+        传入on_output时输出按块回调（先回调提示符和命令本身），返回值不再包含输出。
+        """
         if not self.connected:
             return None
 
+        with EXEC_SECONDS.time():
+            if self.session_mode:
+                return self._execute_in_shell(command, on_output)
+            return self._execute_with_exec(command, on_output)
+
+    def run_command(self, command, timeout=None):
+        """
+        在单独的通道中执行一条命令（不经过shell会话），返回(退出码, 输出)，标准错误合并到输出。
+        timeout为整条命令的时限（秒），超时抛出socket.timeout。
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+
+        def remaining():
+            if deadline is None:
+                return None
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise socket.timeout(f"命令执行超时：{command}")
+            return left
+
+        start = time.perf_counter()
+        channel = self.register_channel(self.ssh.get_transport().open_session(timeout=remaining()))
+        self._track(channel)
+        try:
+            channel.set_combine_stderr(True)
+            channel.exec_command(command)
+            BYTES_SENT.inc(len(command.encode("utf-8")))
+            chunks = []
+            while True:
+                channel.settimeout(remaining())
+                data = channel.recv(32768)
+                if not data:
+                    break
+                if not chunks:
+                    FIRST_BYTE_SECONDS.observe(time.perf_counter() - start)
+                BYTES_RECEIVED.inc(len(data))
+                chunks.append(data)
+            if not channel.status_event.wait(remaining()):
+                raise socket.timeout(f"命令执行超时：{command}")
+            EXEC_SECONDS.observe(time.perf_counter() - start)
+            return channel.recv_exit_status(), b"".join(chunks).decode("utf-8", errors="replace")
+        finally:
+            self._untrack(channel)
+            channel.close()
+
+    def interrupt_command(self):
+        """中断正在执行的命令"""
+        if self.shell is not None:
+            self.shell.interrupt()
+
+    def _execute_in_shell(self, command, on_output=None, replayed=False):
+        """在长连接shell通道中执行命令，用户、主机名和工作目录均由该通道跟踪"""
+        if command == "clear":
+            return command
+        try:
+            if self.shell is None:
+                self.shell = RemoteShell(self.ssh, self.log)
+            if not self.shell.is_open:
+                self.shell.open(self.current_directory)
+                self.register_channel(self.shell.channel)
+                self.current_directory = self.shell.cwd
+        except Exception as e:
+            if self._connection_lost():
+                # 命令还没有发送，重连成功后直接执行
+                self.log.warning(f"打开shell会话时连接已中断：{str(e)}")
+                if not replayed and self.reconnect():
+                    return self._execute_in_shell(command, on_output, replayed=True)
+                return None
+            # 服务器不允许打开shell通道时退回到逐条命令执行
+            self.log.error(f"打开shell会话失败，改用单独通道执行：{str(e)}")
+            self.close_shell()
+            return self._execute_with_exec(command, on_output)
+
+        shell = self.shell
+        result = None
+        try:
+            prompt = self._build_prompt(shell.user, shell.hostname)
+            if on_output is not None:
+                if not replayed:
+                    on_output(prompt + command + "\n")
+                if self._recording_enabled():
+                    self._record(prompt, command, "\n")
+                    on_output = self._recording(on_output)
+                shell.run(command, on_output)
+                if shell.interrupted:
+                    self.log.info(f"命令已中断: {prompt}{command}")
+                elif shell.exit_status is not None:
+                    self._update_directory(command)
+                    self.log.info(f"命令已执行: {prompt}{command} -- 退出码: {shell.exit_status}")
+                result = ""
+            else:
+                output = shell.run(command)
+                if shell.exit_status is not None:
+                    self._update_directory(command)
+                self.log.info("命令已执行: %s%s -- 结果: %s", prompt, command, output)
+                self._record(prompt, command, "\n", output, "\n")
+                result = prompt + command + ("\n" + output if output else "")
+        except Exception as e:
+            self.log.error(f"执行远程指令时出现错误：{str(e)}")
+            if self.shell is shell:
+                self.close_shell()
+
+        if shell.interrupted or shell.exit_status is not None or not self._connection_lost():
+            return result
+
+        # 命令执行期间连接中断：重连后只在安全时重新执行
+        if not self.reconnect():
+            return None
+        if not replayed and self._can_replay(command, shell.sent, shell.received):
+            self.log.info(f"连接已恢复，重新执行命令：{command}")
+            return self._execute_in_shell(command, on_output, replayed=True)
+        self.log.warning(f"连接在命令执行期间中断，命令未重新执行：{command}")
+        if on_output is not None:
+            on_output("\n[连接曾中断，命令可能没有执行完成，未自动重新执行]\n")
+            return ""
+        return None
+
+    def _recording_enabled(self):
+        return self.record_transcript and self.transcript.isEnabledFor(logging.INFO)
+
+    def _record(self, *parts):
+        """写入会话记录，未启用会话记录时不做任何事，也不拼接输出"""
+        if self._recording_enabled():
+            self.transcript.info("".join(parts))
+
+    def _recording(self, on_output):
+        def record_output(data):
+            self._record(data)
+            on_output(data)
+        return record_output
+
+    def _update_directory(self, command):
+        # 只读命令和cd不会修改当前目录下的文件，缓存的目录列表继续用于补全和文件选择
+        plain_cd = command.split()[:1] == ["cd"] and not any(char in command for char in SHELL_METACHARACTERS)
+        if not plain_cd and not self._is_read_only(command):
+            self.listing_cache.invalidate(self.current_directory)
+        if self.shell.cwd and self.shell.cwd != self.current_directory:
+            self.current_directory = self.shell.cwd
+            self.log.info(f"新的工作目录为：{self.current_directory}")
+
+    def _build_prompt(self, current_user, hostname):
+        prompt = ""
+        if current_user and self.current_directory and hostname:
+            if current_user == "root":
+                prompt += f"[root@{hostname} {self.current_directory}]# "
+            else:
+                prompt += f"[{current_user}@{hostname} {self.current_directory}]$ "
+        else:
+            prompt += "$ "  # 默认提示符
+        return prompt
+
+    def _execute_with_exec(self, command, on_output=None):
+        """每条命令单独打开通道执行（非会话模式）"""
+        resp = self._execute_with_exec_blocking(command)
+        if on_output is None or resp is None or resp == "clear":
+            return resp
+        on_output(resp + "\n")
+        return ""
+
+    def _execute_with_exec_blocking(self, command):
         try:
             if self.current_directory is None:
                 # 第一次执行命令时获取当前工作目录
-                self.current_directory = self.ssh.exec_command("pwd")[1].read().decode("utf-8").strip()
+                self.current_directory = self.exec_command("pwd")[1].read().decode("utf-8").strip()
             # 获取当前用户和主机名
-            current_user = self.ssh.exec_command("whoami")[1].read().decode("utf-8").strip()
-            hostname = self.ssh.exec_command("hostname")[1].read().decode("utf-8").strip()
+            current_user = self.exec_command("whoami")[1].read().decode("utf-8").strip()
+            hostname = self.exec_command("hostname")[1].read().decode("utf-8").strip()
 
-            prompt = ""
-            if current_user and self.current_directory and hostname:
-                if current_user == "root":
-                    prompt += f"[root@{hostname} {self.current_directory}]# "
-                else:
-                    prompt += f"[{current_user}@{hostname} {self.current_directory}]$ "
-            else:
-                prompt += "$ "  # 默认提示符
+            prompt = self._build_prompt(current_user, hostname)
 
             if command.startswith("cd"):
                 # 处理cd命令
                 cd_directory = command[3:].strip()  # 提取cd命令中的目录部分
                 target_directory = os.path.join(self.current_directory, cd_directory).replace("\\", "/")
                 full_command = f"cd {target_directory} && pwd"
-                stdin, stdout, stderr = self.ssh.exec_command(full_command)
+                stdin, stdout, stderr = self.exec_command(full_command)
                 result = stdout.read().decode("utf-8").strip()
                 if result == target_directory:
                     # 目录切换成功，更新当前工作目录
@@ -81,18 +577,22 @@ class ConnectionManager:
             else:
                 # 在每个命令之前都添加cd命令以保持工作目录
                 full_command = f"cd {self.current_directory} && {command}"
-                stdin, stdout, stderr = self.ssh.exec_command(full_command)
-                result = stdout.read().decode("utf-8")
+                stdin, stdout, stderr = self.exec_command(full_command)
+                data = stdout.read()
+                BYTES_SENT.inc(len(full_command.encode("utf-8")))
+                BYTES_RECEIVED.inc(len(data))
+                result = data.decode("utf-8")
 
-                self.log.info(f"命令已执行: {prompt}{command} -- 结果: {result}")
+                self.log.info("命令已执行: %s%s -- 结果: %s", prompt, command, result)
+                self._record(prompt, command, "\n", result, "\n")
                 resp = prompt + command + "\n" + result
             return resp
         except Exception as e:
             self.log.error(f"执行远程指令时出现错误：{str(e)}")
             return None
 
-    def upload_file(self, local_file, remote_file):
-        """上传文件到远程服务器"""
+    def upload_file(self, local_file, remote_file, progress=None, cancel_event=None, resume=False):
+        """上传文件到远程服务器，支持进度回调、取消和断点续传（resume）"""
         remote_file += '/' + os.path.basename(local_file)  # 添加文件名称到路径中
         self.log.info(f"本地文件{local_file}:远程文件{remote_file}")
         if not self.connected:
@@ -100,95 +600,327 @@ class ConnectionManager:
             return
 
         try:
-            sftp = self.ssh.open_sftp()
-            sftp.put(local_file, remote_file)
-            sftp.close()
-            self.log.info(f"文件上传成功：{local_file} -> {remote_file}")
+            sent = self.with_sftp(
+                lambda sftp: SFTPTransfer(sftp, self.log, progress, cancel_event).upload(local_file, remote_file, resume))
+            self.listing_cache.invalidate_file(remote_file)
+            self.log.info(f"文件上传成功：{local_file} -> {remote_file}，本次传输{sent}字节")
             return True
+        except TransferCancelled:
+            self.log.info(f"文件上传已取消：{local_file}")
+            return False
         except Exception as e:
             self.log.error(f"文件上传失败：{str(e)}")
             return False
-            # # 打印详细的错误信息
-            # import traceback
-            # traceback.print_exc()
 
-    def download_file(self, remote_file, local_file):
-        """从远程服务器下载文件"""
+    def download_file(self, remote_file, local_file, progress=None, cancel_event=None, resume=False):
+        """从远程服务器下载文件，支持进度回调、取消和断点续传（resume）"""
         if not self.connected:
             self.log.warning("未连接到远程服务器")
             return
         self.log.info(f"本地文件{local_file}:远程文件{remote_file}")
         try:
-            sftp = self.ssh.open_sftp()
-            sftp.get(remote_file, local_file)
-            sftp.close()
-            self.log.info(f"文件下载成功：{remote_file} -> {local_file}")
+            received = self.with_sftp(
+                lambda sftp: SFTPTransfer(sftp, self.log, progress, cancel_event).download(remote_file, local_file, resume))
+            self.log.info(f"文件下载成功：{remote_file} -> {local_file}，本次传输{received}字节")
             return True
+        except TransferCancelled:
+            self.log.info(f"文件下载已取消：{remote_file}")
+            return False
         except Exception as e:
             self.log.error(f"文件下载失败：{str(e)}")
             return False
 
+    def upload_directory(self, local_dir, remote_dir, use_hash=False, progress=None, cancel_event=None,
+                         resume=False):
+        """把本地目录同步到远程服务器，只传输新增或变化的文件"""
+        remote_dir = remote_dir.rstrip('/') + '/' + os.path.basename(os.path.normpath(local_dir))
+        self.log.info(f"本地目录{local_dir}:远程目录{remote_dir}")
+        if not self.connected:
+            self.log.warning("未连接到远程服务器")
+            return None
+
+        try:
+            result = DirectorySync(self, self.log, use_hash, progress=progress,
+                                   cancel_event=cancel_event, resume=resume).upload(local_dir, remote_dir)
+            self.listing_cache.invalidate_file(remote_dir)
+            self.listing_cache.invalidate(remote_dir, recursive=True)
+            self.log.info(f"目录上传完成：{local_dir} -> {remote_dir} {result}")
+            return result
+        except TransferCancelled:
+            self.log.info(f"目录上传已取消：{local_dir}")
+            return None
+        except Exception as e:
+            self.log.error(f"目录上传失败：{str(e)}")
+            return None
+
+    def download_directory(self, remote_dir, local_dir, use_hash=False, progress=None, cancel_event=None,
+                           resume=False):
+        """把远程目录同步到本地，只传输新增或变化的文件"""
+        local_dir = os.path.join(local_dir, os.path.basename(remote_dir.rstrip('/')))
+        self.log.info(f"远程目录{remote_dir}:本地目录{local_dir}")
+        if not self.connected:
+            self.log.warning("未连接到远程服务器")
+            return None
+
+        try:
+            result = DirectorySync(self, self.log, use_hash, progress=progress,
+                                   cancel_event=cancel_event, resume=resume).download(remote_dir, local_dir)
+            self.log.info(f"目录下载完成：{remote_dir} -> {local_dir} {result}")
+            return result
+        except TransferCancelled:
+            self.log.info(f"目录下载已取消：{remote_dir}")
+            return None
+        except Exception as e:
+            self.log.error(f"目录下载失败：{str(e)}")
+            return None
+
     def list_files(self, remote_directory):
         """列出远程路径下的文件"""
         if not self.connected:
             self.log.warning("未连接到远程服务器")
             return []
 
+        return [attr.filename for attr in self.list_files_attr(remote_directory)]
+
+    def list_files_attr(self, remote_directory, on_batch=None, refresh=False):
+        """
+        列出远程路径下的文件及其属性（大小、类型、修改时间），优先使用缓存。
+
+        传入on_batch时条目按批回调，便于界面边读取边显示。
+        """
+        if not self.connected:
+            self.log.warning("未连接到远程服务器")
+            return []
+
+        attrs = None if refresh else self.listing_cache.get(remote_directory)
+        if attrs is not None:
+            if on_batch is not None:
+                on_batch(attrs)
+            return attrs
+
+        def read_listing(sftp):
+            entries = []
+            batch = []
+            for attr in sftp.listdir_iter(remote_directory):
+                batch.append(attr)
+                if len(batch) >= LISTING_BATCH:
+                    entries.extend(batch)
+                    if on_batch is not None:
+                        on_batch(batch)
+                    batch = []
+            entries.extend(batch)
+            if batch and on_batch is not None:
+                on_batch(batch)
+            return entries
+
         try:
-            sftp = self.ssh.open_sftp()
-            file_list = sftp.listdir(remote_directory)
-            sftp.close()
-            self.log.info(f"成功列出远程路径下的文件：{remote_directory}")
-            return file_list
+            attrs = self.with_sftp(read_listing)
+            self.listing_cache.put(remote_directory, attrs)
+            self.log.info(f"成功列出远程路径下的文件：{remote_directory}，共{len(attrs)}项")
+            return attrs
         except Exception as e:
             self.log.error(f"列出远程路径下的文件失败：{str(e)}")
             return []
 
     def get_file_content(self, remote_file):
-        """获取远程服务器上文件的内容"""
+        """获取远程服务器上文件的内容，同时记住加载时各块的摘要，原位修改的文件保存时只发送变化的块"""
         if not self.connected:
             self.log.warning("未连接到远程服务器")
             return None
 
+        def read(sftp):
+            with sftp.open(remote_file, "rb") as f:
+                attr = f.stat()
+                f.prefetch(attr.st_size)
+                return f.read(), attr
+
         try:
-            # 使用cat命令获取文件内容
-            stdin, stdout, stderr = self.ssh.exec_command(f"cat {remote_file}")
-            content = stdout.read().decode("utf-8")
+            data, attr = self.with_sftp(read)
+            content = data.decode("utf-8")
+            self.loaded_versions[remote_file] = (block_hashes(data), attr.st_size, attr.st_mtime)
             return content
         except Exception as e:
             self.log.error(f"获取文件内容时出现错误：{str(e)}")
             return None
 
     def save_file_content(self, content, remote_file):
-        """保存编辑后的文件内容到远程服务器"""
-
-        try:
-            # 将文件内容写入到临时文件
-            temp_file = f"{uuid.uuid4().hex}"
-            with open(temp_file, "w",encoding='utf-8') as f:
-                f.write(content)
+        """保存编辑后的文件内容到远程服务器：普通文件写入临时文件后原子重命名覆盖，链接等特殊情况直接写入"""
+        data = content.encode("utf-8")
+        loaded = self.loaded_versions.pop(remote_file, None)
 
-            # 将临时文件复制到远程服务器上的目标文件
-            sftp = self.ssh.open_sftp()
-            self.log.info(f"保存{temp_file}文件内容到远程服务器时将复制到{remote_file}")
-            sftp.put(temp_file, remote_file)
+        def save(sftp):
+            base = None
+            if loaded is not None:
+                # 远程文件自加载后没有被修改过，才能在其副本上只写入变化的块
+                attr = sftp.stat(remote_file)
+                if (attr.st_size, attr.st_mtime) == loaded[1:]:
+                    base = loaded[0]
+            sent = SFTPTransfer(sftp, self.log).save(data, remote_file, base, self._copy_remote_file, self._link_count)
+            attr = sftp.stat(remote_file)
+            self.loaded_versions[remote_file] = (block_hashes(data), attr.st_size, attr.st_mtime)
+            return sent
 
-            # 删除临时文件
-            os.remove(temp_file)
-
-            self.log.info(f"文件保存成功：{remote_file}")
+        try:
+            sent = self.with_sftp(save)
+            self.listing_cache.invalidate_file(remote_file)
+            self.log.info(f"文件保存成功：{remote_file}，发送{sent}/{len(data)}字节")
             return True
         except Exception as e:
             self.log.error(f"保存文件时出现错误：{str(e)}")
             return False
 
+    def _copy_remote_file(self, source, target):
+        """在服务器上复制文件，不经过本地传输"""
+        try:
+            stdin, stdout, stderr = self.exec_command(f"cp -p -- {shlex.quote(source)} {shlex.quote(target)}")
+            return stdout.channel.recv_exit_status() == 0
+        except Exception as e:
+            self.log.warning(f"远程复制文件失败：{str(e)}")
+            return False
+
+    def _link_count(self, remote_file):
+        """文件的硬链接数（SFTP的文件属性中没有），无法获取时返回None"""
+        path = shlex.quote(remote_file)
+        try:
+            status, output = self.run_command(f"stat -c %h -- {path} 2>/dev/null || stat -f %l -- {path}",
+                                              timeout=PROBE_TIMEOUT)
+        except Exception as e:
+            self.log.warning(f"读取文件链接数失败：{str(e)}")
+            return None
+        output = output.strip()
+        return int(output) if status == 0 and output.isdigit() else None
+
+    def acquire_sftp(self):
+        """从池中借出一个可用的SFTP客户端，没有空闲的客户端时新建"""
+        with self.sftp_lock:
+            while self.sftp_idle:
+                sftp = self.sftp_idle.pop()
+                if self._sftp_alive(sftp):
+                    return sftp
+                self.log.warning("SFTP通道已断开，正在重新创建")
+                self._close_sftp(sftp)
+        if not self.connected or (self._connection_lost() and not self.reconnect()):
+            raise paramiko.SSHException("未连接到远程服务器")
+        return self._open_sftp()
+
+    def _open_sftp(self):
+        sftp = self.ssh.open_sftp()
+        self.register_channel(sftp.get_channel())
+        return sftp
+
+    def exec_command(self, command):
+        """在单独的通道中执行命令，返回(stdin, stdout, stderr)，与SSHClient.exec_command相同，通道计入活动通道数"""
+        stdin, stdout, stderr = self.ssh.exec_command(command)
+        self.register_channel(stdout.channel)
+        return stdin, stdout, stderr
+
+    def register_channel(self, channel):
+        """记录本连接打开的通道，返回channel"""
+        with self.sftp_lock:
+            self.channels.add(channel)
+        return channel
+
+    def open_channels(self):
+        with self.sftp_lock:
+            return sum(1 for channel in self.channels if not channel.closed)
+
+    def release_sftp(self, sftp):
+        """归还SFTP客户端，已断开或池已满时直接关闭"""
+        with self.sftp_lock:
+            if self.connected and self._sftp_alive(sftp) and len(self.sftp_idle) < SFTP_POOL_SIZE:
+                self.sftp_idle.append(sftp)
+                return
+        self._close_sftp(sftp)
+
+    @staticmethod
+    def _sftp_alive(sftp):
+        channel = sftp.get_channel()
+        return channel is not None and not channel.closed and channel.get_transport().is_active()
+
+    def with_sftp(self, operation):
+        """借用SFTP客户端执行操作，通道或连接在操作中断开时重建并重试一次（被abort()中断时不重试）"""
+        sftp = self.acquire_sftp()
+        self._track(sftp)
+        try:
+            return operation(sftp)
+        except (EOFError, socket.error, paramiko.SSHException) as e:
+            if self._sftp_alive(sftp) or threading.get_ident() in self.aborted:
+                raise
+            self.log.warning(f"SFTP通道异常，重建后重试：{str(e)}")
+            self._untrack(sftp)
+            self._close_sftp(sftp)
+            sftp = self.acquire_sftp()
+            self._track(sftp)
+            return operation(sftp)
+        finally:
+            self._untrack(sftp)
+            self.release_sftp(sftp)
+
+    def _track(self, resource):
+        """记录当前线程正在使用的SFTP客户端或通道"""
+        with self.sftp_lock:
+            self.in_use.setdefault(threading.get_ident(), []).append(resource)
+
+    def _untrack(self, resource):
+        thread = threading.get_ident()
+        with self.sftp_lock:
+            resources = self.in_use.get(thread)
+            if resources is not None and resource in resources:
+                resources.remove(resource)
+                if not resources:
+                    del self.in_use[thread]
+                    self.aborted.discard(thread)
+
+    def abort(self, thread):
+        """
+        中断thread中正在进行的SFTP操作和命令：关闭它使用的SFTP通道和命令通道，阻塞的读写随即出错返回。
+        用于取消或超时的后台任务，被关闭的SFTP客户端不会放回池中。
+        """
+        with self.sftp_lock:
+            resources = list(self.in_use.get(thread, ()))
+            if resources:
+                self.aborted.add(thread)
+        for resource in resources:
+            try:
+                resource.close()
+            except Exception as e:
+                self.log.warning(f"中断后台操作时出现错误：{str(e)}")
+
+    def _close_sftp(self, sftp):
+        try:
+            sftp.close()
+        except Exception as e:
+            self.log.warning(f"关闭SFTP通道时出现错误：{str(e)}")
+
+    def close_sftp(self):
+        """关闭池中所有空闲的SFTP客户端"""
+        with self.sftp_lock:
+            idle, self.sftp_idle = self.sftp_idle, []
+        for sftp in idle:
+            self._close_sftp(sftp)
+
+    def close_shell(self):
+        """关闭shell会话通道"""
+        if self.shell is not None:
+            self.shell.close()
+            self.shell = None
+
     def disconnect(self):
         """断开连接"""
         self.log.info("正在断开连接")
 
         # 实现断开连接的具体逻辑
+        self.closing.set()  # 停止正在进行的自动重连
+        if self.monitor is not None:
+            self.monitor.stop()
+            self.monitor = None
         try:
             if self.connected:
+                self.close_shell()
+                self.connected = False
+                self.close_sftp()
+                self.listing_cache.clear()
+                self.loaded_versions.clear()
                 self.ssh.close()
                 self.log.info("连接已断开")
             else:
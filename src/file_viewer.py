@@ -0,0 +1,208 @@
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QTextCursor
+
+from jobs import PageJob, SearchJob
+from remote_picker import format_size
+
+WINDOW_SIZE = 128 * 1024  # 每次显示的字节数
+ROW_SIZE = 4096  # 位置滚动条每一格对应的字节数
+
+
+class PagedFileViewer(QtWidgets.QWidget):
+    """
+    大文件的只读分页查看器。右侧滚动条对应文件中的字节位置，
+    拖动后在后台按需读取该位置附近的页面；文本框滚动到窗口开头或末尾时窗口自动前后移动半个窗口。
+    查找在远程执行，找到后跳转到匹配处。
+    """
+
+    closed = pyqtSignal()
+
+    def __init__(self, parent, connection_manager, paged_file, session):
+        super().__init__(parent)
+        self.connection_manager = connection_manager
+        self.session = session
+        self.paged_file = paged_file
+        self.offset = 0
+        self.window_end = 0
+        self.request_id = 0
+        self.highlight = None
+        self.anchor = None  # 移动窗口后保持可见的字节位置
+        self.moving = False  # 窗口移动或刷新中，忽略文本框的滚动
+
+        self.info = QtWidgets.QLabel(self)
+        self.show_info()
+        self.search_edit = QtWidgets.QLineEdit(self)
+        self.search_edit.setPlaceholderText("查找内容")
+        self.search_edit.returnPressed.connect(self.find_next)
+        self.search_button = QtWidgets.QPushButton("查找下一个", self)
+        self.search_button.clicked.connect(self.find_next)
+
+        self.text = QtWidgets.QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.text.setUndoRedoEnabled(False)
+        self.text.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.text.verticalScrollBar().valueChanged.connect(self.follow_scroll)
+        # 已经在窗口开头或末尾时滚动条的值不再变化，滚轮和按键需要单独处理
+        self.text.installEventFilter(self)
+        self.text.viewport().installEventFilter(self)
+        self.position = QtWidgets.QScrollBar(QtCore.Qt.Vertical, self)
+        self.position.setRange(0, max(0, (paged_file.size - 1) // ROW_SIZE))
+        self.position.setPageStep(max(1, WINDOW_SIZE // ROW_SIZE // 2))
+        self.position.valueChanged.connect(lambda: self.schedule_load())
+
+        # 拖动滚动条时合并请求，停顿后才读取
+        self.load_timer = QtCore.QTimer(self)
+        self.load_timer.setSingleShot(True)
+        self.load_timer.setInterval(50)
+        self.load_timer.timeout.connect(lambda: self.load(self.position.value() * ROW_SIZE, anchor=self.anchor))
+
+        top = QtWidgets.QHBoxLayout()
+        top.addWidget(self.info, 1)
+        top.addWidget(self.search_edit)
+        top.addWidget(self.search_button)
+        body = QtWidgets.QHBoxLayout()
+        body.addWidget(self.text)
+        body.addWidget(self.position)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addLayout(body)
+
+        self.load(0)
+
+    def show_info(self, line=None):
+        text = f"{self.paged_file.remote_file}（{format_size(self.paged_file.size)}，只读）"
+        self.info.setText(text if line is None else f"{text} 第{line}行")
+
+    def schedule_load(self, anchor=None):
+        self.anchor = anchor
+        self.load_timer.start()
+
+    def follow_scroll(self, value):
+        """文本框滚动到窗口末尾或开头时读取后面或前面的内容"""
+        bar = self.text.verticalScrollBar()
+        if value >= bar.maximum():
+            self.next_window()
+        elif value <= bar.minimum():
+            self.previous_window()
+
+    def next_window(self):
+        if not self.moving and self.window_end < self.paged_file.size:
+            self.move_window(self.offset + WINDOW_SIZE // 2, self.window_end)
+
+    def previous_window(self):
+        if not self.moving and self.offset > 0:
+            self.move_window(self.offset - WINDOW_SIZE // 2, self.offset)
+
+    def move_window(self, offset, anchor):
+        """移动到offset处的窗口，显示后让anchor处（原来窗口的边界）保持在中间"""
+        # 窗口按ROW_SIZE对齐，最后一个窗口向上取整，保证能读到文件末尾
+        last_row = -(-max(0, self.paged_file.size - WINDOW_SIZE) // ROW_SIZE)
+        self.moving = True
+        self.position.blockSignals(True)
+        self.position.setValue(min(max(0, offset) // ROW_SIZE, last_row))
+        self.position.blockSignals(False)
+        self.schedule_load(anchor)
+
+    def eventFilter(self, watched, event):
+        if self.moving:
+            return super().eventFilter(watched, event)
+        bar = self.text.verticalScrollBar()
+        if event.type() == QtCore.QEvent.Wheel:
+            if event.angleDelta().y() < 0 and bar.value() >= bar.maximum():
+                self.next_window()
+            elif event.angleDelta().y() > 0 and bar.value() <= bar.minimum():
+                self.previous_window()
+        elif event.type() == QtCore.QEvent.KeyPress:
+            key = event.key()
+            if event.modifiers() & Qt.ControlModifier and key in (Qt.Key_Home, Qt.Key_End):
+                # Ctrl+Home/Ctrl+End跳到文件开头或末尾，而不是当前窗口的开头或末尾
+                target = 0 if key == Qt.Key_Home else self.paged_file.size
+                self.move_window(target, target)
+                return True
+            if key in (Qt.Key_Down, Qt.Key_PageDown) and bar.value() >= bar.maximum():
+                self.next_window()
+            elif key in (Qt.Key_Up, Qt.Key_PageUp) and bar.value() <= bar.minimum():
+                self.previous_window()
+        return super().eventFilter(watched, event)
+
+    def load(self, offset, highlight=None, anchor=None):
+        """在后台读取offset处开始的一个窗口，读取完成后显示"""
+        self.request_id += 1
+        request_id = self.request_id
+        self.highlight = highlight
+        self.anchor = anchor
+        job = PageJob(self.paged_file, offset, WINDOW_SIZE)
+        job.signals.finished.connect(lambda data: self.show_window(request_id, offset, data))
+        self.session.start(job)
+
+    def show_window(self, request_id, offset, data):
+        # 只显示最近一次请求的结果
+        if request_id != self.request_id:
+            return
+        if data is None:
+            self.moving = False
+            return
+        self.moving = True  # 替换文本和定位光标引起的滚动不触发窗口移动
+        self.offset = offset
+        self.window_end = offset + len(data)
+        skipped = 0
+        if offset > 0:
+            # 从下一行开始显示，避免半行和被截断的多字节字符
+            newline = data.find(b"\n", 0, 4096)
+            if newline != -1:
+                skipped = newline + 1
+        text = data[skipped:].decode("utf-8", errors="replace")
+        self.text.setPlainText(text)
+
+        if self.highlight is not None:
+            prefix = data[skipped:max(skipped, self.highlight - offset)].decode("utf-8", errors="replace")
+            cursor = self.text.textCursor()
+            cursor.setPosition(len(prefix))
+            cursor.movePosition(QTextCursor.Right, QTextCursor.KeepAnchor, len(self.search_edit.text()))
+            self.text.setTextCursor(cursor)
+            self.text.centerCursor()
+        elif self.anchor is not None:
+            prefix = data[skipped:max(skipped, self.anchor - offset)].decode("utf-8", errors="replace")
+            cursor = self.text.textCursor()
+            cursor.setPosition(len(prefix))
+            self.text.setTextCursor(cursor)
+            self.text.centerCursor()
+        self.moving = False
+
+    def find_next(self):
+        """从当前选中内容之后（或当前窗口开头）在远程查找下一个匹配"""
+        pattern = self.search_edit.text()
+        if not pattern:
+            return
+        start = self.highlight + 1 if self.highlight is not None else self.offset
+        self.search_button.setEnabled(False)
+        job = SearchJob(self.paged_file, pattern, start)
+
+        def found(position):
+            if self.request_id < 0:
+                return  # 查看器已关闭
+            self.search_button.setEnabled(True)
+            if position is None or position < 0:
+                QtWidgets.QMessageBox.information(self, "查找", "没有找到更多匹配内容", QtWidgets.QMessageBox.Ok)
+                return
+            # 让匹配处落在窗口中间
+            window_start = max(0, position - WINDOW_SIZE // 2)
+            self.position.blockSignals(True)
+            self.position.setMaximum(max(0, (self.paged_file.size - 1) // ROW_SIZE))  # 会话记录在查看时仍在增长
+            self.position.setValue(window_start // ROW_SIZE)
+            self.position.blockSignals(False)
+            self.load(window_start, highlight=position)
+            # 会话记录有行索引，显示匹配处的行号
+            line_number = getattr(self.paged_file, "line_number", None)
+            self.show_info(line_number(position) if line_number is not None else None)
+
+        job.signals.finished.connect(found)
+        self.session.start(job)
+
+    def close_viewer(self):
+        self.request_id = -1  # 丢弃尚未返回的读取结果
+        self.paged_file.close()
+        self.hide()
+        self.deleteLater()
+        self.closed.emit()
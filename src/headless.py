@@ -0,0 +1,160 @@
+"""
+不需要图形界面的命令行入口，用于定时任务和CI：在一台或多台主机上执行命令、命令文件或传输文件，
+每台主机完成时向标准输出写一行JSON结果。整个过程不导入Qt。
+
+    python cli.py -H root@10.0.0.1 -H 10.0.0.2:2222 run uptime
+    python cli.py --saved "prod web" -c 64 script deploy.sh
+    python cli.py --inventory hosts.csv put ./app.tar.gz /opt
+    python cli.py --saved db get /var/log/syslog ./logs
+    python cli.py --saved db get --resume /backup/db.dump ./dumps
+
+密码从环境变量读取（默认SHELL_PASSWORD），保存的主机和主机清单使用其中的密码。
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+
+from broadcast import Broadcast, BroadcastTransfer, HOST_TIMEOUT, MAX_CONCURRENCY
+from host_index import HostIndex
+from logger import get
+from metrics import registry
+from saved_info import SavedInfoManager
+
+EXIT_OK = 0
+EXIT_COMMAND_FAILED = 1  # 至少一台主机上命令的退出码不为0
+EXIT_USAGE = 2  # 参数错误，与argparse一致
+EXIT_HOST_FAILED = 3  # 至少一台主机连接失败、超时或传输失败
+EXIT_INTERRUPTED = 130  # 被Ctrl-C中断
+PASSWORD_ENV = "SHELL_PASSWORD"  # 默认读取密码的环境变量
+
+
+class UsageError(Exception):
+    pass
+
+
+def parse_host(text, default_user, password):
+    """解析[user@]host[:port]，返回(ip, username, password, port)"""
+    username = default_user
+    if "@" in text:
+        username, text = text.rsplit("@", 1)
+    port = 22
+    # 不带方括号的IPv6地址中有多个冒号，不当作端口
+    if text.startswith("["):
+        host, _, rest = text[1:].partition("]")
+        if rest.startswith(":"):
+            port = int(rest[1:])
+        text = host
+    elif text.count(":") == 1:
+        text, port = text.split(":")
+        port = int(port)
+    if not username:
+        raise UsageError(f"没有指定{text}的用户名，请使用user@host或--user")
+    return text, username, password, port
+
+
+def select_hosts(args, log):
+    """按命令行参数收集目标主机[(ip, username, password, port), ...]，同一主机同一用户只保留一个"""
+    password = os.environ.get(args.password_env, "")
+    hosts = [parse_host(text, args.user, password) for text in args.host]
+    if args.inventory:
+        for ip, username, host_password, _ in SavedInfoManager.read_file(args.inventory):
+            hosts.append((ip, username, host_password or password, 22))
+    if args.saved is not None:
+        saved_info_manager = SavedInfoManager(log)
+        try:
+            index = HostIndex(saved_info_manager.get_index_rows())
+            for rowid in index.search(args.saved):
+                host = saved_info_manager.get_host(rowid)
+                if host is not None:
+                    hosts.append((host[0], host[1], host[2], 22))
+        finally:
+            saved_info_manager.close()
+    unique = {}
+    for host in hosts:
+        unique.setdefault((host[0], host[1], host[3]), host)
+    return list(unique.values())
+
+
+def build_task(args, hosts, log):
+    if args.action == "run":
+        return Broadcast(log, hosts, " ".join(args.command), args.concurrency, args.timeout)
+    if args.action == "script":
+        if args.file == "-":
+            command = sys.stdin.read()
+        else:
+            with open(args.file, encoding="utf-8") as f:
+                command = f.read()
+        return Broadcast(log, hosts, command, args.concurrency, args.timeout)
+    if args.action == "put" and not os.path.exists(args.source):
+        raise UsageError(f"本地路径不存在：{args.source}")
+    return BroadcastTransfer(log, hosts, args.action, args.source, args.target, args.concurrency, args.timeout,
+                             args.resume)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="在一台或多台主机上执行命令或传输文件，结果按行输出JSON")
+    targets = parser.add_argument_group("目标主机（可组合使用）")
+    targets.add_argument("-H", "--host", action="append", default=[], help="[user@]host[:port]，可重复")
+    targets.add_argument("--saved", metavar="QUERY", help="已保存的主机中按筛选条件匹配的主机，空字符串表示全部")
+    targets.add_argument("--inventory", metavar="FILE", help="CSV或JSON主机清单，格式与界面的导入相同")
+    parser.add_argument("-u", "--user", help="--host未指定用户时使用的用户名")
+    parser.add_argument("--password-env", default=PASSWORD_ENV, help=f"读取--host密码的环境变量，默认{PASSWORD_ENV}")
+    parser.add_argument("-c", "--concurrency", type=int, default=MAX_CONCURRENCY, help="同时处理的主机数")
+    parser.add_argument("-t", "--timeout", type=float, default=HOST_TIMEOUT, help="每台主机的时限（秒）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="在标准错误输出运行日志")
+    parser.add_argument("--metrics", metavar="FILE", help="结束时把耗时和流量指标写入该Prometheus文本文件")
+
+    actions = parser.add_subparsers(dest="action", required=True)
+    run = actions.add_parser("run", help="执行一条命令")
+    run.add_argument("command", nargs="+")
+    script = actions.add_parser("script", help="执行命令文件（整个文件交给远程shell执行），-表示标准输入")
+    script.add_argument("file")
+    put = actions.add_parser("put", help="上传文件或目录到远程目录")
+    fetch = actions.add_parser("get", help="下载远程文件或目录到本地目录")
+    for transfer in (put, fetch):
+        transfer.add_argument("--resume", action="store_true",
+                              help="目标文件比源文件短且开头部分一致时从已有部分之后续传")
+        transfer.add_argument("source")
+        transfer.add_argument("target")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.timeout <= 0:
+        parser.error("--concurrency和--timeout必须大于0")
+    log = get(console_level=logging.INFO if args.verbose else logging.CRITICAL + 1)
+
+    try:
+        hosts = select_hosts(args, log)
+        if not hosts:
+            raise UsageError("没有匹配的主机")
+        task = build_task(args, hosts, log)
+    except (UsageError, OSError, ValueError) as e:
+        print(f"{parser.prog}: 错误：{str(e)}", file=sys.stderr)
+        return EXIT_USAGE
+
+    def write(result):
+        # 回调在调用run的线程中执行，结果逐行写出，管道另一端可以边执行边处理
+        sys.stdout.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+    cancel_event = threading.Event()
+    try:
+        results = task.run(on_result=write, cancel_event=cancel_event)
+    except KeyboardInterrupt:
+        cancel_event.set()
+        return EXIT_INTERRUPTED
+    finally:
+        if args.metrics:
+            registry.write_prometheus(args.metrics)
+
+    if any(result.error is not None for result in results):
+        return EXIT_HOST_FAILED
+    if any(result.exit_status != 0 for result in results):
+        return EXIT_COMMAND_FAILED
+    return EXIT_OK
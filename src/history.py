@@ -0,0 +1,224 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+DB_FILE = 'dbs/saved_info.db'  # 与已保存的连接信息使用同一个数据库
+FLUSH_INTERVAL = 1.0  # 新命令最多在内存中停留的时间（秒），之后一次写入
+BATCH_SIZE = 200  # 攒够这么多条命令时立即写入
+RECALL_SIZE = 1000  # 上下键可以翻到的每台主机最近的命令数
+SEARCH_LIMIT = 200  # 查找时最多返回的条数
+SCAN_WINDOW = 20000  # 查找时先按时间倒序逐条匹配的条数，常见的内容在这里就能找够
+
+# 同一主机的同一条命令只保存一条，再次执行时更新时间和次数
+UPSERT_SQL = ("INSERT INTO command_history (host, command, last_used) VALUES (?, ?, ?) "
+              "ON CONFLICT(host, command) DO UPDATE SET last_used=excluded.last_used, count=count+1")
+FTS_SQL = (
+    # 外部内容的全文索引，trigram分词支持任意子串查找
+    "CREATE VIRTUAL TABLE IF NOT EXISTS command_history_fts USING fts5("
+    "command, content='command_history', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS command_history_ai AFTER INSERT ON command_history BEGIN "
+    "INSERT INTO command_history_fts (rowid, command) VALUES (new.id, new.command); END",
+    "CREATE TRIGGER IF NOT EXISTS command_history_ad AFTER DELETE ON command_history BEGIN "
+    "INSERT INTO command_history_fts (command_history_fts, rowid, command) VALUES ('delete', old.id, old.command); END",
+)
+FTS_MIN_LENGTH = 3  # trigram索引只能查找至少3个字符的内容，更短的按最近使用顺序扫描
+
+
+class CommandHistory:
+    """
+    按主机保存的命令历史，存放在dbs/saved_info.db的command_history表中。
+
+    add()只把命令放进内存队列，由后台线程按批写入，执行命令时从不等待磁盘；
+    尚未写入的命令在recent()和search()中同样可见。数据库无法打开时只在内存中保留上下键翻看的命令，
+    不再排队写入，也不再尝试读取。
+    """
+
+    def __init__(self, log, db_file=DB_FILE):
+        self.log = log
+        self.db_file = db_file
+        self.fts = False
+        self.ready = threading.Event()
+        self.available = True  # 数据库打开失败后为False
+        self.lock = threading.Lock()  # 保护pending和recall，不在持有时执行SQL
+        self.read_lock = threading.Lock()  # 读取用的连接同一时间只给一个线程使用
+        self.pending = deque()  # 还没有写入的(host, command, 时间)
+        self.recall = {}  # 主机 -> 最近的命令（旧的在前，不重复）
+        self.reader = None
+        self.writes = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self._write_loop, name="command-history", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def _open(self):
+        if os.path.dirname(self.db_file) and not os.path.exists(os.path.dirname(self.db_file)):
+            os.makedirs(os.path.dirname(self.db_file))
+        connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _create_tables(self, connection):
+        with connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS command_history
+                                  (id INTEGER PRIMARY KEY, host TEXT NOT NULL, command TEXT NOT NULL,
+                                   last_used REAL NOT NULL, count INTEGER NOT NULL DEFAULT 1)''')
+            connection.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_command_history_command
+                                  ON command_history (host, command)''')
+            connection.execute('''CREATE INDEX IF NOT EXISTS idx_command_history_recent
+                                  ON command_history (host, last_used)''')
+            connection.execute('''CREATE INDEX IF NOT EXISTS idx_command_history_last_used
+                                  ON command_history (last_used)''')
+        try:
+            with connection:
+                for sql in FTS_SQL:
+                    connection.execute(sql)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            # SQLite没有编译FTS5或版本太旧（trigram需要3.34），退回到逐条匹配
+            self.log.warning(f'命令历史的全文索引不可用，查找将逐条匹配：{str(e)}')
+
+    def _write_loop(self):
+        try:
+            connection = self._open()
+            self._create_tables(connection)
+        except Exception as e:
+            self.log.error(f'打开命令历史数据库错误，命令历史将不会保存：{str(e)}')
+            with self.lock:
+                self.available = False
+                self.pending.clear()
+            return
+        finally:
+            self.ready.set()
+
+        running = True
+        while running:
+            batch = [self.writes.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while batch[-1] is not None and len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.writes.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            if not batch:
+                continue
+            try:
+                with connection:
+                    connection.executemany(UPSERT_SQL, batch)
+            except Exception as e:
+                self.log.error(f'写入命令历史错误：{str(e)}')
+            with self.lock:
+                for _ in batch:
+                    self.pending.popleft()
+        connection.close()
+
+    def _read(self, sql, params):
+        """在读取用的连接上执行查询；数据库不可用时返回空列表，读取连接打开失败后不再重试"""
+        self.ready.wait()
+        if not self.available:
+            return []
+        with self.read_lock:
+            if self.reader is None:
+                try:
+                    self.reader = self._open()
+                except Exception:
+                    self.available = False
+                    raise
+            return self.reader.execute(sql, params).fetchall()
+
+    def add(self, host, command):
+        """记录一条执行过的命令，立即返回"""
+        command = command.strip()
+        if not command:
+            return
+        item = (host, command, time.time())
+        with self.lock:
+            # 写入线程已经因为数据库无法打开而退出时不再排队，否则队列会一直增长
+            available = self.available and self.writer.is_alive()
+            if available:
+                self.pending.append(item)
+            recall = self.recall.get(host)
+            if recall is None and not available:
+                recall = self.recall[host] = []  # 无法从数据库读取，只保留本次运行中执行的命令
+            if recall is not None:
+                if command in recall:
+                    recall.remove(command)
+                recall.append(command)
+                if len(recall) > RECALL_SIZE:
+                    del recall[0]
+        if available:
+            self.writes.put(item)
+
+    def recent(self, host):
+        """返回主机最近执行的命令（旧的在前），第一次调用时从数据库读取，之后只在内存中维护"""
+        with self.lock:
+            recall = self.recall.get(host)
+        if recall is not None:
+            return recall
+        try:
+            rows = self._read("SELECT command FROM command_history WHERE host=? ORDER BY last_used DESC LIMIT ?",
+                              (host, RECALL_SIZE))
+        except Exception as e:
+            self.log.error(f'读取命令历史错误：{str(e)}')
+            rows = []
+        recall = [row[0] for row in reversed(rows)]
+        with self.lock:
+            for pending_host, command, _ in self.pending:
+                if pending_host == host:
+                    if command in recall:
+                        recall.remove(command)
+                    recall.append(command)
+            return self.recall.setdefault(host, recall)
+
+    def search(self, text, host=None, limit=SEARCH_LIMIT):
+        """
+        查找包含text的命令，最近使用的在前；host为None时查找所有主机，返回[(host, command), ...]。
+
+        先按时间倒序逐条匹配最近的SCAN_WINDOW条，常见的内容在这里就能找够；
+        不够时再用全文索引查找更早的命令，少见的内容只需读取少量匹配的记录。
+        """
+        with self.lock:
+            results = [(pending_host, command) for pending_host, command, _ in reversed(self.pending)
+                       if text in command and (host is None or pending_host == host)]
+        where, params = ("WHERE host = ? ", [host]) if host is not None else ("", [])
+        queries = [(f"SELECT host, command FROM (SELECT host, command FROM command_history {where}"
+                    f"ORDER BY last_used DESC LIMIT ?) WHERE instr(command, ?) > 0 LIMIT ?",
+                    params + [SCAN_WINDOW, text, limit])]
+        if self.fts and len(text) >= FTS_MIN_LENGTH:
+            # host前的+使查询不使用host上的索引，先由全文索引找出匹配的少量记录
+            queries.append(("SELECT h.host, h.command FROM command_history_fts f "
+                            "JOIN command_history h ON h.id = f.rowid WHERE command_history_fts MATCH ? "
+                            + ("AND +h.host = ? " if host is not None else "") + "ORDER BY h.last_used DESC LIMIT ?",
+                            ['"' + text.replace('"', '""') + '"'] + params + [limit]))
+        else:
+            queries.append((f"SELECT host, command FROM command_history {where}"
+                            f"{'AND' if where else 'WHERE'} instr(command, ?) > 0 ORDER BY last_used DESC LIMIT ?",
+                            params + [text, limit]))
+        seen = set(results)
+        try:
+            for sql, query_params in queries:
+                if len(results) >= limit:
+                    break
+                for row in self._read(sql, query_params):
+                    if row not in seen:
+                        seen.add(row)
+                        results.append(row)
+        except Exception as e:
+            self.log.error(f'查找命令历史错误：{str(e)}')
+        return results[:limit]
+
+    def close(self):
+        """写入队列中剩余的命令并停止后台线程，可以重复调用"""
+        if self.writer.is_alive():
+            self.writes.put(None)
+            self.writer.join()
+        with self.read_lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
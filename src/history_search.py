@@ -0,0 +1,125 @@
+from PyQt5 import QtCore, QtWidgets
+
+SEARCH_DELAY = 50  # 输入停顿多久后查找（毫秒）
+
+
+class HistoryRecall(QtCore.QObject):
+    """
+    命令输入框中用上下键翻看当前主机执行过的命令，翻看前输入的内容在翻回最下面时恢复。
+    """
+
+    def __init__(self, line_edit, history, current_session):
+        super().__init__(line_edit)
+        self.line_edit = line_edit
+        self.history = history
+        self.current_session = current_session  # 返回当前会话的函数
+        self.session = None
+        self.position = None  # 正在显示的命令在recent()中的位置，None表示没有在翻看
+        self.draft = ""
+        line_edit.textEdited.connect(self.reset)
+        line_edit.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if obj is self.line_edit and event.type() == QtCore.QEvent.KeyPress \
+                and event.key() in (QtCore.Qt.Key_Up, QtCore.Qt.Key_Down):
+            self.move(-1 if event.key() == QtCore.Qt.Key_Up else 1)
+            return True
+        return False
+
+    def reset(self):
+        """输入框被编辑或命令已执行，下次从最近的命令开始翻"""
+        self.position = None
+
+    def move(self, step):
+        session = self.current_session()
+        if session is None:
+            return
+        if session is not self.session:
+            self.session = session
+            self.position = None
+        commands = self.history.recent(session.title)
+        if self.position is None:
+            if step > 0 or not commands:
+                return
+            self.draft = self.line_edit.text()
+            self.position = len(commands)
+        self.position = max(0, self.position + step)
+        if self.position >= len(commands):
+            self.position = None
+            self.line_edit.setText(self.draft)
+        else:
+            self.line_edit.setText(commands[self.position])
+
+
+class HistorySearchDialog(QtWidgets.QDialog):
+    """
+    Ctrl-R查找执行过的命令：边输入边查找，默认只查当前主机，选中后填入命令输入框。
+    """
+
+    def __init__(self, parent, history, host, text=""):
+        super().__init__(parent)
+        self.history = history
+        self.host = host
+        self.selected = None
+        self.setWindowTitle(f"查找命令历史 - {host}")
+        self.resize(640, 420)
+
+        self.search_edit = QtWidgets.QLineEdit(self)
+        self.search_edit.setPlaceholderText("输入命令中的任意内容")
+        self.search_edit.setText(text)
+        self.all_hosts = QtWidgets.QCheckBox("所有主机", self)
+        self.result_list = QtWidgets.QListWidget(self)
+        self.status = QtWidgets.QLabel(self)
+
+        top = QtWidgets.QHBoxLayout()
+        top.addWidget(self.search_edit)
+        top.addWidget(self.all_hosts)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addWidget(self.result_list)
+        layout.addWidget(self.status)
+
+        # 输入停顿后再查找，连续输入时不重复查询
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        self.all_hosts.toggled.connect(self.search)
+        self.search_edit.returnPressed.connect(self.accept_current)
+        self.result_list.itemActivated.connect(self.accept_current)
+        self.search_edit.installEventFilter(self)
+        self.search()
+
+    def eventFilter(self, obj, event):
+        # 在查找框中用上下键选择结果，Ctrl-R选择下一条
+        if obj is self.search_edit and event.type() == QtCore.QEvent.KeyPress:
+            key = event.key()
+            step = {QtCore.Qt.Key_Up: -1, QtCore.Qt.Key_Down: 1}.get(key)
+            if key == QtCore.Qt.Key_R and event.modifiers() & QtCore.Qt.ControlModifier:
+                step = 1
+            if step is not None and self.result_list.count():
+                row = min(max(self.result_list.currentRow() + step, 0), self.result_list.count() - 1)
+                self.result_list.setCurrentRow(row)
+                return True
+        return False
+
+    def search(self):
+        self.search_timer.stop()
+        all_hosts = self.all_hosts.isChecked()
+        results = self.history.search(self.search_edit.text(), None if all_hosts else self.host)
+        self.result_list.clear()
+        for host, command in results:
+            item = QtWidgets.QListWidgetItem(f"{command}    [{host}]" if all_hosts else command)
+            item.setData(QtCore.Qt.UserRole, command)
+            self.result_list.addItem(item)
+        if results:
+            self.result_list.setCurrentRow(0)
+        self.status.setText(f"{len(results)} 条" if results else "没有找到")
+
+    def accept_current(self):
+        item = self.result_list.currentItem()
+        if item is None:
+            return
+        self.selected = item.data(QtCore.Qt.UserRole)
+        self.accept()
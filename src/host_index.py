@@ -0,0 +1,103 @@
+import bisect
+import re
+
+CACHE_WORDS = 32  # 缓存最近查询过的关键词的匹配结果
+
+
+class HostIndex:
+    """
+    保存的主机的筛选索引，只保存rowid和"ip 用户名 标签"，不保存密码。
+
+    每个关键词先按前缀匹配（在排好序的词表上二分查找），再按子序列模糊匹配
+    （所有记录拼成一个字符串后用一个正则扫描），多个关键词之间是"并且"的关系，
+    完全相同和前缀匹配的结果排在前面。
+    """
+
+    def __init__(self, rows=()):
+        self.rowids = []
+        self.keys = []
+        self.removed = set()
+        self.cache = {}  # 关键词 -> (前缀匹配, 模糊匹配)，边输入边筛选时前面的关键词不用重新计算
+        self.built = False  # 第一次按关键词查询时才建立索引，不筛选时不占用启动时间
+        self.add_rows(rows)
+
+    def add_rows(self, rows):
+        """添加[(rowid, ip, username, tags), ...]"""
+        for rowid, ip, username, tags in rows:
+            self.rowids.append(rowid)
+            self.keys.append(f"{ip} {username} {tags or ''}".lower())
+        self.built = False
+
+    def remove_rows(self, rowids):
+        self.removed.update(rowids)
+        # 删除的记录较多时才重建，少量删除只在查询时过滤
+        if len(self.removed) > len(self.rowids) // 4:
+            keep = [i for i, rowid in enumerate(self.rowids) if rowid not in self.removed]
+            self.rowids = [self.rowids[i] for i in keep]
+            self.keys = [self.keys[i] for i in keep]
+            self.removed = set()
+            self.built = False
+
+    def _build(self):
+        # 前缀索引：(词, 位置)按词排序；ip按"."拆开后的每一段也作为一个词
+        split = re.compile(r"[^\s.@:_-]+").findall
+        words = []
+        positions = []
+        for position, key in enumerate(self.keys):
+            tokens = set(split(key) + key.split())
+            words.extend(tokens)
+            positions.extend([position] * len(tokens))
+        order = sorted(range(len(words)), key=words.__getitem__)
+        self.words = [words[i] for i in order]
+        self.positions = [positions[i] for i in order]
+        # 模糊匹配在拼接后的文本上进行
+        self.text = "\n".join(f"{key}\t{position}" for position, key in enumerate(self.keys))
+        self.cache = {}
+        self.built = True
+
+    def __len__(self):
+        return len(self.rowids) - len(self.removed)
+
+    def _prefix(self, word):
+        """返回(词完全相同的位置, 词以word开头的位置)"""
+        start = bisect.bisect_left(self.words, word)
+        equal = bisect.bisect_right(self.words, word, start)
+        end = bisect.bisect_left(self.words, word + "\uffff", equal)
+        return set(self.positions[start:equal]), set(self.positions[start:end])
+
+    def _fuzzy(self, word):
+        # 每行末尾是"\t位置"，关键词的字符只能在制表符之前匹配，一次匹配吃掉整行，findall直接返回位置。
+        # 之后的每个字符匹配到它第一次出现的地方（最左匹配对子序列总是最优的）：字符类排除了后面要匹配的字符，
+        # 两者不重叠，回溯时较短的匹配立即失败，不会出现指数级的回溯（不使用Python 3.11才支持的占有量词）
+        chars = [re.escape(char) for char in word]
+        pattern = chars[0] + "".join(f"[^\\n\\t{char}]*{char}" for char in chars[1:]) + "[^\\n\\t]*\\t(\\d+)"
+        return set(map(int, re.findall(pattern, self.text)))
+
+    def search(self, query):
+        """返回匹配的rowid列表，query为空时返回全部"""
+        words = query.lower().split()
+        if not words:
+            return [rowid for rowid in self.rowids if rowid not in self.removed] if self.removed else list(self.rowids)
+        if not self.built:
+            self._build()
+        tiers = None
+        for word in words:
+            if word not in self.cache:
+                if len(self.cache) >= CACHE_WORDS:
+                    self.cache.pop(next(iter(self.cache)))
+                self.cache[word] = self._prefix(word) + (self._fuzzy(word),)
+            if tiers is None:
+                tiers = self.cache[word]
+            else:
+                tiers = tuple(tier & matched for tier, matched in zip(tiers, self.cache[word]))
+            if not tiers[2]:
+                return []
+        # 排序：所有关键词都与某个词完全相同 > 都是某个词的开头 > 模糊匹配
+        equal, prefix, fuzzy = tiers
+        rowids = self.rowids
+        ordered = [rowids[position] for position in sorted(equal)]
+        ordered += [rowids[position] for position in sorted(prefix - equal)]
+        ordered += [rowids[position] for position in sorted(fuzzy - prefix)]
+        if self.removed:
+            ordered = [rowid for rowid in ordered if rowid not in self.removed]
+        return ordered
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from host_index import HostIndex
+
+PAGE_ROWS = 200  # 每次从数据库读取的行数
+CACHED_PAGES = 20  # 最多缓存的页数，只有滚动到的页面才会被读取
+HostRole = Qt.UserRole  # 返回(ip, username, password)，只在需要时读取密码
+
+
+class HostListModel(QAbstractListModel):
+    """
+    已保存主机的列表模型。模型只保存当前筛选结果的rowid，显示的内容按页从数据库中读取，
+    列表里不出现密码；筛选由HostIndex完成，主机很多时输入筛选条件也不会卡顿。
+    """
+
+    def __init__(self, saved_info_manager, parent=None):
+        super().__init__(parent)
+        self.saved_info_manager = saved_info_manager
+        self.host_index = HostIndex()
+        self.filter_text = ""
+        self.rowids = []
+        self.pages = OrderedDict()  # 页号 -> {rowid: (ip, username, tags)}
+
+    def reload(self, rows=None):
+        """重新读取数据库，保存或导入连接信息后调用；rows为已读取的[(rowid, ip, username, tags), ...]"""
+        if rows is None:
+            rows = self.saved_info_manager.get_index_rows()
+        self.beginResetModel()
+        self.host_index = HostIndex(rows)
+        self.rowids = self.host_index.search(self.filter_text)
+        self.pages.clear()
+        self.endResetModel()
+
+    def set_filter(self, text):
+        self.beginResetModel()
+        self.filter_text = text
+        self.rowids = self.host_index.search(text)
+        self.pages.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rowids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rowids):
+            return None
+        rowid = self.rowids[index.row()]
+        if role == Qt.DisplayRole:
+            row = self._page(index.row() // PAGE_ROWS).get(rowid)
+            if row is None:
+                return None
+            ip, username, tags = row
+            return f"{ip} {username} [{tags}]" if tags else f"{ip} {username}"
+        if role == HostRole:
+            return self.saved_info_manager.get_host(rowid)
+        return None
+
+    def _page(self, number):
+        page = self.pages.get(number)
+        if page is None:
+            start = number * PAGE_ROWS
+            page = self.saved_info_manager.get_rows(self.rowids[start:start + PAGE_ROWS])
+            self.pages[number] = page
+            if len(self.pages) > CACHED_PAGES:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(number)
+        return page
+
+    def hosts(self, indexes):
+        """返回选中行的[(ip, username, password), ...]"""
+        hosts = []
+        for index in sorted(indexes, key=lambda index: index.row()):
+            host = self.data(index, HostRole)
+            if host is not None:
+                hosts.append(tuple(host))
+        return hosts
+
+    def remove_rows(self, indexes):
+        """从数据库和列表中删除选中的行，只移除这些行，不重新加载整个列表"""
+        rows = sorted({index.row() for index in indexes}, reverse=True)
+        rowids = [self.rowids[row] for row in rows]
+        if not rowids:
+            return rowids
+        self.saved_info_manager.remove_rows(rowids)
+        self.host_index.remove_rows(rowids)
+        # 连续的行一次移除，从后往前移除时前面的行号不变
+        last = first = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and row == first - 1:
+                first = row
+                continue
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rowids[first:last + 1]
+            self.endRemoveRows()
+            last = first = row
+        # 行号变化后页面对应的rowid也变了
+        self.pages.clear()
+        return rowids
@@ -0,0 +1,192 @@
+"""界面提交给JobScheduler的各类后台任务"""
+from saved_info import SavedInfoManager
+from scheduler import INTERACTIVE_TIMEOUT, Job, PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+
+
+def interrupt_read(paged_file):
+    """中断远程文件的读取和查找；会话记录在本地读取，没有interrupt()"""
+    interrupt = getattr(paged_file, "interrupt", None)
+    if interrupt is not None:
+        interrupt()
+
+
+class ConnectJob(Job):
+    priority = PRIORITY_INTERACTIVE
+    serial = True
+
+    def __init__(self, connection_manager, ip, username, password, timeout=None):
+        super().__init__(connection_manager, timeout)
+        self.ip = ip
+        self.username = username
+        self.password = password
+
+    def execute(self):
+        return self.connection_manager.connect(self.ip, self.username, self.password, cancel_event=self.cancel_event)
+
+    def interrupt(self):
+        self.connection_manager.cancel_connect()
+
+
+class CommandJob(Job):
+    """在会话的shell中执行命令，输出按块通过output信号发送；同一会话的命令逐条执行"""
+    priority = PRIORITY_INTERACTIVE
+    serial = True
+
+    def __init__(self, connection_manager, command, timeout=None):
+        super().__init__(connection_manager, timeout)
+        self.command = command
+
+    def execute(self):
+        return self.connection_manager.execute_remote_command(self.command, on_output=self.signals.output.emit)
+
+    def interrupt(self):
+        self.connection_manager.interrupt_command()
+
+
+class ListJob(Job):
+    """读取目录列表，条目按批通过batch信号发送"""
+    priority = PRIORITY_INTERACTIVE
+    default_timeout = INTERACTIVE_TIMEOUT
+
+    def __init__(self, connection_manager, remote_directory, timeout=None):
+        super().__init__(connection_manager, timeout)
+        self.remote_directory = remote_directory
+
+    def execute(self):
+        return self.connection_manager.list_files_attr(self.remote_directory, on_batch=self.signals.batch.emit)
+
+
+class IndexJob(Job):
+    """为补全读取$PATH中的命令（directory为None时）或一个目录的条目"""
+    priority = PRIORITY_NORMAL
+    default_timeout = INTERACTIVE_TIMEOUT
+
+    def __init__(self, completion, directory=None, timeout=None):
+        super().__init__(completion.connection_manager, timeout)
+        self.completion = completion
+        self.directory = directory
+
+    def execute(self):
+        if self.directory is None:
+            return self.completion.load_commands()
+        return self.completion.load_directory(self.directory)
+
+
+class PageJob(Job):
+    """分页读取远程文件的一个窗口"""
+    priority = PRIORITY_INTERACTIVE
+    default_timeout = INTERACTIVE_TIMEOUT
+
+    def __init__(self, paged_file, offset, length, timeout=None):
+        super().__init__(None, timeout)
+        self.paged_file = paged_file
+        self.offset = offset
+        self.length = length
+
+    def execute(self):
+        return self.paged_file.read(self.offset, self.length)
+
+    def interrupt(self):
+        interrupt_read(self.paged_file)
+
+
+class SearchJob(Job):
+    """在远程文件中从start处查找pattern"""
+    priority = PRIORITY_INTERACTIVE
+    default_timeout = INTERACTIVE_TIMEOUT
+
+    def __init__(self, paged_file, pattern, start, timeout=None):
+        super().__init__(None, timeout)
+        self.paged_file = paged_file
+        self.pattern = pattern
+        self.start = start
+
+    def execute(self):
+        return self.paged_file.search(self.pattern, self.start)
+
+    def interrupt(self):
+        interrupt_read(self.paged_file)
+
+
+class ReadJob(Job):
+    """读取要编辑的文件的全部内容"""
+    priority = PRIORITY_INTERACTIVE
+    default_timeout = INTERACTIVE_TIMEOUT
+
+    def __init__(self, connection_manager, remote_file, timeout=None):
+        super().__init__(connection_manager, timeout)
+        self.remote_file = remote_file
+
+    def execute(self):
+        return self.connection_manager.get_file_content(self.remote_file)
+
+
+class SaveJob(Job):
+    """保存编辑后的文件内容到远程服务器"""
+    priority = PRIORITY_NORMAL
+
+    def __init__(self, connection_manager, content, remote_file, timeout=None):
+        super().__init__(connection_manager, timeout)
+        self.content = content
+        self.remote_file = remote_file
+
+    def execute(self):
+        return self.connection_manager.save_file_content(self.content, self.remote_file)
+
+
+class LoadHostsJob(Job):
+    """启动时在后台打开数据库并读取主机列表，返回(SavedInfoManager, 主机列表)"""
+    priority = PRIORITY_NORMAL
+
+    def __init__(self, log):
+        super().__init__()
+        self.log = log
+
+    def execute(self):
+        saved_info_manager = SavedInfoManager(self.log)
+        return saved_info_manager, saved_info_manager.get_index_rows()
+
+
+class TransferJob(Job):
+    """
+    文件或目录传输，进度通过progress信号发送，可以取消。
+    direction为"put"（上传）或"get"（下载），directory为True时同步整个目录，use_hash为同步时是否按内容比较，
+    resume为True时目标文件比源文件短且开头部分一致则从已有部分之后续传。
+    """
+    priority = PRIORITY_BULK
+
+    def __init__(self, connection_manager, direction, source, target, directory=False, use_hash=False,
+                 resume=False, timeout=None):
+        super().__init__(connection_manager, timeout)
+        self.direction = direction
+        self.source = source
+        self.target = target
+        self.directory = directory
+        self.use_hash = use_hash
+        self.resume = resume
+
+    def execute(self):
+        options = {"progress": self.signals.progress.emit, "cancel_event": self.cancel_event,
+                   "resume": self.resume}
+        if self.directory:
+            transfer = (self.connection_manager.upload_directory if self.direction == "put"
+                        else self.connection_manager.download_directory)
+            return transfer(self.source, self.target, self.use_hash, **options)
+        transfer = (self.connection_manager.upload_file if self.direction == "put"
+                    else self.connection_manager.download_file)
+        return transfer(self.source, self.target, **options)
+
+    def interrupt(self):
+        """传输在每块之间检查cancel_event，不关闭通道，已传输的部分保持完整"""
+
+
+class BroadcastJob(Job):
+    """批量执行命令，每台主机的结果按批发送"""
+    priority = PRIORITY_BULK
+
+    def __init__(self, broadcast):
+        super().__init__()
+        self.broadcast = broadcast
+
+    def execute(self):
+        return self.broadcast.run(on_result=self.signals.batch.emit, cancel_event=self.cancel_event)
@@ -0,0 +1,31 @@
+import threading
+
+PROBE_INTERVAL = 10  # 连接探测的间隔（秒）
+
+# 自动重连时通过on_state_change回调通知的状态
+STATE_RECONNECTING = "reconnecting"
+STATE_RECONNECTED = "reconnected"
+STATE_LOST = "lost"
+
+
+class ConnectionMonitor(threading.Thread):
+    """后台定时探测连接是否可用，发现连接失效时触发自动重连"""
+
+    def __init__(self, connection_manager, interval=PROBE_INTERVAL):
+        super().__init__(name="connection-monitor", daemon=True)
+        self.connection_manager = connection_manager
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.connection_manager.connected:
+                break
+            if self.connection_manager.probe() or self.stopped.is_set():
+                continue
+            self.connection_manager.log.warning("连接探测失败，开始自动重连")
+            if not self.connection_manager.reconnect():
+                break
+
+    def stop(self):
+        self.stopped.set()
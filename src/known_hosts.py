@@ -0,0 +1,64 @@
+import os
+import threading
+
+import paramiko
+
+KNOWN_HOSTS_FILE = 'dbs/known_hosts'  # 已验证的主机密钥，OpenSSH known_hosts格式
+
+
+class KnownHosts:
+    """
+    已验证主机密钥的缓存。文件只在第一次使用时读取一次，之后的连接直接使用内存中的密钥，
+    新主机的密钥在首次连接时保存（与原来自动添加的行为一致），密钥变化时拒绝连接。
+    """
+
+    def __init__(self, filename=KNOWN_HOSTS_FILE):
+        self.filename = filename
+        self.keys = paramiko.HostKeys()
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if not self.loaded:
+            if os.path.exists(self.filename):
+                self.keys.load(self.filename)
+            self.loaded = True
+
+    def lookup(self, hostname):
+        """返回主机的{密钥类型: 密钥}，没有保存过时返回空字典"""
+        with self.lock:
+            self._load()
+            return dict(self.keys.lookup(hostname) or {})
+
+    def add(self, hostname, key):
+        with self.lock:
+            self._load()
+            self.keys.add(hostname, key.get_name(), key)
+            directory = os.path.dirname(self.filename)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            # 只在文件末尾追加新主机的一行，不重写整个文件
+            line = paramiko.hostkeys.HostKeyEntry([hostname], key).to_line()
+            with open(self.filename, "a+b") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+                f.write(line.encode("utf-8"))
+
+
+class TrustOnFirstUsePolicy(paramiko.MissingHostKeyPolicy):
+    """首次连接的主机自动信任并把密钥写入缓存"""
+
+    def __init__(self, known_hosts, log):
+        self.known_hosts = known_hosts
+        self.log = log
+
+    def missing_host_key(self, client, hostname, key):
+        self.known_hosts.add(hostname, key)
+        self.log.info(f"首次连接{hostname}，已保存主机密钥：{key.get_name()}")
+
+
+# 同一进程中的所有连接共用一份缓存
+default_known_hosts = KnownHosts()
@@ -4,19 +4,66 @@
 # Author    :       摸鱼呀阿凡
 # Contact   :       f2095522823@gmail.com
 # License   :       MIT LICENSE
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import datetime
 
+MAX_MESSAGE_SIZE = 4096  # 每条日志消息最多保留的字符数，超出部分截断
+TRANSCRIPT_ENV = "SHELL_TRANSCRIPT"  # 设置该环境变量为1时把命令的完整输出另外记录到会话记录文件（默认关闭）
 
-def setup_logger():
+_lock = threading.Lock()
+_listener = None
+
+
+def truncate(text, limit=MAX_MESSAGE_SIZE):
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...（共{len(text)}字符，已截断）"
+
+
+class TruncatingQueueHandler(QueueHandler):
+    """
+    把日志记录放入队列，由后台线程写入控制台和文件，调用日志的线程不做任何IO。
+    放入队列前截断过长的消息：字符串参数先截断再格式化，巨大的命令输出不会被完整格式化。
+    """
+
+    def __init__(self, log_queue, limit=MAX_MESSAGE_SIZE):
+        super().__init__(log_queue)
+        self.limit = limit
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        if self.limit and isinstance(record.args, tuple) and record.args:
+            # 每个参数各自截断，截断提示里保留参数原本的长度
+            record.args = tuple(truncate(arg, self.limit) if isinstance(arg, str) else arg for arg in record.args)
+            message = record.getMessage()
+        elif self.limit:
+            message = truncate(record.getMessage(), self.limit)
+        else:
+            message = record.getMessage()
+        if record.exc_info:
+            message += "\n" + logging.Formatter().formatException(record.exc_info)
+        # 队列另一端的处理器只需要已格式化好的消息，不再引用参数和异常对象
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+
+def setup_logger(console_level=logging.INFO):
     # 创建日志记录器
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
 
     # 创建控制台处理器
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(console_level)
     console_formatter = logging.Formatter('[%(asctime)s] [%(levelname)s] %(message)s')
     console_handler.setFormatter(console_formatter)
 
@@ -24,20 +71,51 @@ def setup_logger():
     date_suffix = datetime.datetime.now().strftime("%Y-%m-%d")
     max_file_size = 5 * 1024 * 1024  # 5 MB
     backup_count = 5
-    size_file_handler = RotatingFileHandler(f'log/app.log_{date_suffix}.log', maxBytes=max_file_size, backupCount=backup_count)
+    size_file_handler = RotatingFileHandler(f'log/app.log_{date_suffix}.log', maxBytes=max_file_size,
+                                            backupCount=backup_count, encoding='utf-8')
     size_file_handler.setLevel(logging.DEBUG)
     file_formatter = logging.Formatter('[%(asctime)s] [%(levelname)s] [%(filename)s:%(lineno)d] %(message)s')
     size_file_handler.setFormatter(file_formatter)
+    handlers = [console_handler, size_file_handler]
 
-    # 将处理器添加到记录器
-    logger.addHandler(console_handler)
-    logger.addHandler(size_file_handler)
+    # 会话记录（可选）：完整的命令输出单独写入，不截断，也不进入主日志
+    transcript = logging.getLogger("transcript")
+    transcript.propagate = False
+    transcript.setLevel(logging.DEBUG)
+    log_queue = queue.SimpleQueue()
+    if transcript_enabled():
+        transcript_handler = logging.FileHandler(f'log/transcript_{date_suffix}.log', encoding='utf-8')
+        transcript_handler.terminator = ""  # 记录的是原样的输出片段，不额外换行
+        transcript_handler.setFormatter(logging.Formatter('%(message)s'))
+        # 只处理会话记录，主日志的记录由其他处理器按级别处理
+        transcript_handler.addFilter(lambda record: record.name == "transcript")
+        handlers.append(transcript_handler)
+        transcript.addHandler(TruncatingQueueHandler(log_queue, limit=0))
+    else:
+        transcript.disabled = True
 
+    # 主日志和会话记录共用一个队列和后台线程
+    for handler in (console_handler, size_file_handler):
+        handler.addFilter(lambda record: record.name != "transcript")
+    logger.addHandler(TruncatingQueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # 退出时写完队列中剩余的日志
+    atexit.register(listener.stop)
+    return listener
 
-def get():
-    import os
-    if not os.path.exists('log'):
-        os.makedirs('log')
-    setup_logger()
-    logger = logging.getLogger()
-    return logger
+
+def get(console_level=logging.INFO):
+    """返回根日志记录器，第一次调用时初始化（console_level只在第一次调用时生效），之后重复调用不会重复添加处理器"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            if not os.path.exists('log'):
+                os.makedirs('log')
+            _listener = setup_logger(console_level)
+    return logging.getLogger()
+
+
+def transcript_enabled():
+    """是否启用了会话记录，命令行的文本记录和界面的会话记录都由同一个开关控制"""
+    return os.environ.get(TRANSCRIPT_ENV) == "1"
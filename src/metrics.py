@@ -0,0 +1,186 @@
+"""
+进程内的轻量指标：计数器、仪表和直方图。记录一次只是在锁内做几次加法，可以放在命令执行和文件传输的路径上；
+统计面板定期读取，也可以导出为Prometheus的文本格式（node_exporter的textfile收集器可以直接读取）。
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # 耗时（秒）
+RATE_BUCKETS = tuple(1024 * 4 ** i for i in range(3, 11))  # 传输速度（字节/秒），64KB/s到1GB/s
+
+
+class Counter:
+    """只增不减的计数"""
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+    def samples(self):
+        return [(self.name, self.get())]
+
+
+class Gauge(Counter):
+    """可增可减的当前值；传入function时每次读取都调用它，不需要在别处维护"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, function=None):
+        super().__init__(name, help_text)
+        self.function = function
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def get(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class Histogram:
+    """按桶统计的分布，另外记录总数和总和，分位数按桶内线性插值估算"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为+Inf
+        self.sum = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """记录with代码块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        """返回(各桶计数, 总和, 总数)"""
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q, snapshot=None):
+        counts, _, count = snapshot or self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0
+                if index == len(self.buckets):
+                    # 超出最大的桶，只能返回桶的下限
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def samples(self):
+        counts, total, count = self.snapshot()
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            samples.append((f'{self.name}_bucket{{le="{format_value(bound)}"}}', cumulative))
+        samples.append((f"{self.name}_sum", total))
+        samples.append((f"{self.name}_count", count))
+        return samples
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        """同名指标只创建一次，重复导入或多个实例共用同一个指标"""
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text, function=None):
+        return self._get(Gauge, name, help_text, function=function)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def collect(self):
+        with self._lock:
+            return sorted(self.metrics.values(), key=lambda metric: metric.name)
+
+    def to_prometheus(self):
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """写入Prometheus文本文件，先写临时文件再替换，读取方不会读到写了一半的文件"""
+        temp_file = f"{path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_file, path)
+
+
+registry = Registry()  # 整个进程共用的指标
+
+# 连接和命令
+CONNECT_SECONDS = registry.histogram("shell_connect_seconds", "建立SSH连接（含身份验证）的耗时（秒）")
+CONNECT_FAILURES = registry.counter("shell_connect_failures_total", "连接失败的次数")
+EXEC_SECONDS = registry.histogram("shell_exec_seconds", "执行一条远程命令从发送到结束的耗时（秒）")
+FIRST_BYTE_SECONDS = registry.histogram("shell_exec_first_byte_seconds", "发送命令到收到第一个字节的耗时（秒）")
+# 数据量：命令和输出、SFTP传输的内容，不含SSH协议本身的开销
+BYTES_SENT = registry.counter("shell_bytes_sent_total", "发送到远程的字节数")
+BYTES_RECEIVED = registry.counter("shell_bytes_received_total", "从远程收到的字节数")
+SFTP_RATE = registry.histogram("shell_sftp_transfer_bytes_per_second", "单个文件的SFTP传输速度（字节/秒）",
+                               buckets=RATE_BUCKETS)
+# 后台任务
+JOBS_QUEUED = registry.gauge("shell_job_queue_depth", "已提交但还未开始执行的后台任务数")
+JOBS_RUNNING = registry.gauge("shell_job_running", "正在执行的后台任务数")
+JOB_WAIT_SECONDS = registry.histogram("shell_job_wait_seconds", "后台任务从提交到开始执行的等待时间（秒）")
+JOB_TIMEOUTS = registry.counter("shell_job_timeouts_total", "因超时被取消的后台任务数")
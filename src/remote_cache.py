@@ -0,0 +1,63 @@
+import posixpath
+import threading
+import time
+
+LISTING_TTL = 30  # 目录列表缓存的有效期（秒）
+
+
+class DirectoryCache:
+    """
+    远程目录列表缓存，以目录路径为键，保存listdir_attr形式的条目（带大小、类型、修改时间）。
+    超过有效期的条目视为失效，上传、保存等操作后可按目录主动失效。
+    observer（如补全索引）会收到put、invalidate和clear的通知，据此增量更新自己的数据。
+    """
+
+    def __init__(self, ttl=LISTING_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.observer = None
+
+    @staticmethod
+    def _key(path):
+        return posixpath.normpath(path) if path else path
+
+    def get(self, path):
+        """返回未过期的目录条目，没有缓存时返回None"""
+        with self.lock:
+            cached = self.entries.get(self._key(path))
+            if cached is None:
+                return None
+            stored_at, attrs = cached
+            if time.monotonic() - stored_at > self.ttl:
+                del self.entries[self._key(path)]
+                return None
+            return attrs
+
+    def put(self, path, attrs):
+        with self.lock:
+            self.entries[self._key(path)] = (time.monotonic(), attrs)
+        if self.observer is not None:
+            self.observer.put(path, attrs)
+
+    def invalidate(self, path, recursive=False):
+        """使目录的缓存失效，recursive为True时同时失效其下所有子目录"""
+        key = self._key(path)
+        with self.lock:
+            self.entries.pop(key, None)
+            if recursive:
+                prefix = key.rstrip("/") + "/"
+                for cached in [k for k in self.entries if k.startswith(prefix)]:
+                    del self.entries[cached]
+        if self.observer is not None:
+            self.observer.invalidate(path, recursive)
+
+    def invalidate_file(self, remote_file):
+        """文件变化后使其所在目录的缓存失效"""
+        self.invalidate(posixpath.dirname(remote_file) or ".")
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.observer is not None:
+            self.observer.clear()
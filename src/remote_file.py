@@ -0,0 +1,121 @@
+import shlex
+import threading
+from collections import OrderedDict
+
+PAGE_SIZE = 64 * 1024  # 每页的字节数
+MAX_PAGES = 32  # 内存中最多缓存的页数，32 * 64KB = 2MB
+
+
+class PagedRemoteFile:
+    """
+    按页读取的远程文件。通过SFTP按字节范围读取，只在内存中保留最近使用的若干页，
+    内存占用与文件大小无关；查找在远程执行grep，不需要下载文件。
+    """
+
+    def __init__(self, connection_manager, remote_file, page_size=PAGE_SIZE, max_pages=MAX_PAGES):
+        self.connection_manager = connection_manager
+        self.remote_file = remote_file
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        self.size = 0
+        self.sftp = None
+        self.file = None
+        self.search_channel = None  # 正在执行查找命令的通道
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def open(self):
+        """借用一个SFTP客户端并打开文件，查看期间一直保持打开"""
+        self.sftp = self.connection_manager.acquire_sftp()
+        self.file = self.sftp.open(self.remote_file, "rb")
+        self.size = self.file.stat().st_size
+        return self
+
+    def read(self, offset, size):
+        """读取[offset, offset + size)范围的数据，读取失败时返回None"""
+        try:
+            return self._read(offset, size)
+        except Exception as e:
+            self.connection_manager.log.error(f"读取远程文件{self.remote_file}时出现错误：{str(e)}")
+            self._reset()
+            return None
+
+    def interrupt(self):
+        """中断正在进行的读取和查找（关闭SFTP通道和查找命令的通道），之后的读取重新打开文件"""
+        for channel in (self.sftp, self.search_channel):
+            if channel is not None:
+                try:
+                    channel.close()
+                except Exception as e:
+                    self.connection_manager.log.warning(f"中断读取远程文件时出现错误：{str(e)}")
+
+    def _reset(self):
+        """读取出错（通道断开或被中断）后关闭文件并归还SFTP客户端，下次读取时重新打开"""
+        with self.lock:
+            self._close_file()
+
+    def _read(self, offset, size):
+        # 缺少的页一次性并发请求
+        with self.lock:
+            if self.closed:
+                return None
+            if self.file is None:
+                self.sftp = self.connection_manager.acquire_sftp()
+                self.file = self.sftp.open(self.remote_file, "rb")
+            offset = max(0, min(offset, self.size))
+            end = min(offset + size, self.size)
+            if end <= offset:
+                return b""
+            first, last = offset // self.page_size, (end - 1) // self.page_size
+            missing = [index for index in range(first, last + 1) if index not in self.pages]
+            if missing:
+                chunks = [(index * self.page_size, min(self.page_size, self.size - index * self.page_size))
+                          for index in missing]
+                for index, data in zip(missing, self.file.readv(chunks)):
+                    self.pages[index] = data
+            for index in range(first, last + 1):
+                self.pages.move_to_end(index)
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+
+            data = b"".join(self.pages[index] for index in range(first, last + 1))
+            start = offset - first * self.page_size
+            return data[start:start + end - offset]
+
+    def search(self, pattern, start=0):
+        """从start之后查找固定字符串，返回匹配处的字节偏移，没有找到或出错时返回-1"""
+        command = (f"tail -c +{start + 1} {shlex.quote(self.remote_file)} | "
+                   f"LC_ALL=C grep -b -o -m1 -F -e {shlex.quote(pattern)} | head -n 1")
+        try:
+            stdin, stdout, stderr = self.connection_manager.exec_command(command)
+            self.search_channel = stdout.channel
+            try:
+                line = stdout.read().decode("utf-8", errors="replace")
+            finally:
+                self.search_channel = None
+                stdout.channel.close()
+        except Exception as e:
+            self.connection_manager.log.error(f"查找远程文件{self.remote_file}时出现错误：{str(e)}")
+            return -1
+        position, _, _ = line.partition(":")
+        if not position.strip().isdigit():
+            return -1
+        return start + int(position)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.pages.clear()
+            self._close_file()
+
+    def _close_file(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except Exception as e:
+                self.connection_manager.log.warning(f"关闭远程文件时出现错误：{str(e)}")
+            self.file = None
+        if self.sftp is not None:
+            self.connection_manager.release_sftp(self.sftp)
+            self.sftp = None
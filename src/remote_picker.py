@@ -0,0 +1,77 @@
+import posixpath
+import stat
+
+from PyQt5 import QtCore, QtWidgets
+
+
+def format_size(size):
+    """把字节数格式化为便于阅读的大小"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class RemoteFilePicker(QtWidgets.QDialog):
+    """
+    远程文件选择框。目录列表在后台读取，每读到一批条目就追加到列表中，
+    目录显示在前且不可选，文件显示大小。
+    """
+
+    def __init__(self, parent, title, label, remote_directory):
+        super().__init__(parent)
+        self.remote_directory = remote_directory
+        self.setWindowTitle(title)
+        self.resize(420, 480)
+
+        self.label = QtWidgets.QLabel(f"{label}（{remote_directory}）", self)
+        self.list_widget = QtWidgets.QListWidget(self)
+        self.list_widget.setUniformItemSizes(True)
+        self.list_widget.itemDoubleClicked.connect(self.accept)
+        self.status = QtWidgets.QLabel("正在读取目录…", self)
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel, self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.label)
+        layout.addWidget(self.list_widget)
+        layout.addWidget(self.status)
+        layout.addWidget(buttons)
+        self.count = 0
+        self.directory_count = 0
+
+    def add_entries(self, attrs):
+        """追加一批listdir_attr条目"""
+        self.list_widget.setUpdatesEnabled(False)
+        for attr in attrs:
+            if stat.S_ISDIR(attr.st_mode or 0):
+                item = QtWidgets.QListWidgetItem(f"{attr.filename}/")
+                item.setFlags(QtCore.Qt.ItemIsEnabled)
+                self.list_widget.insertItem(self.directory_count, item)
+                self.directory_count += 1
+            else:
+                item = QtWidgets.QListWidgetItem(f"{attr.filename}    {format_size(attr.st_size or 0)}")
+                item.setData(QtCore.Qt.UserRole, attr.filename)
+                item.setData(QtCore.Qt.UserRole + 1, attr.st_size or 0)
+                self.list_widget.addItem(item)
+        self.list_widget.setUpdatesEnabled(True)
+        self.count += len(attrs)
+        self.status.setText(f"已读取 {self.count} 项…")
+
+    def finish(self, attrs):
+        self.status.setText(f"共 {len(attrs) if attrs else self.count} 项")
+
+    def selected_file(self):
+        """返回选中文件的完整远程路径，没有选中文件时返回None"""
+        item = self.list_widget.currentItem()
+        name = item.data(QtCore.Qt.UserRole) if item is not None else None
+        if not name:
+            return None
+        return posixpath.join(self.remote_directory, name)
+
+    def selected_size(self):
+        """返回选中文件的大小（字节）"""
+        item = self.list_widget.currentItem()
+        return item.data(QtCore.Qt.UserRole + 1) or 0 if item is not None else 0
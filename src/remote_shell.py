@@ -0,0 +1,164 @@
+import codecs
+import shlex
+import threading
+import time
+import uuid
+
+from metrics import BYTES_RECEIVED, BYTES_SENT, FIRST_BYTE_SECONDS
+
+# 远程优先使用bash，没有bash时退回到sh
+SHELL_COMMAND = "command -v bash >/dev/null 2>&1 && exec bash --noprofile --norc || exec sh"
+
+
+class RemoteShell:
+    """
+    基于单个长连接shell通道的命令会话。
+
+    每条命令后追加一行带有唯一标记的哨兵输出（序号、退出码、当前目录），
+    读到哨兵即表示命令结束，因此每条命令只需要一次往返，也不再为每条命令新建通道。
+    """
+
+    def __init__(self, ssh, log):
+        self.ssh = ssh
+        self.log = log
+        self.channel = None
+        self.user = None
+        self.hostname = None
+        self.cwd = None
+        self.exit_status = None
+        self.interrupted = False
+        # 最近一条命令是否已发送到服务器、是否收到过输出，连接中断后据此判断能否重新执行
+        self.sent = False
+        self.received = False
+        self._sent_at = None  # 最近一条命令的发送时间，收到第一个字节后清空
+        self._marker = f"__SHELL_{uuid.uuid4().hex}__".encode("ascii")
+        self._seq = 0
+        self._buffer = b""
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.channel is not None and not self.channel.closed
+
+    def open(self, cwd=None):
+        """打开shell通道，并在同一次往返中获取用户名、主机名和工作目录"""
+        self.close()
+        channel = self.ssh.get_transport().open_session()
+        channel.set_combine_stderr(True)
+        channel.exec_command(SHELL_COMMAND)
+        self.channel = channel
+        self._buffer = b""
+
+        bootstrap = "whoami; hostname"
+        if cwd:
+            bootstrap = f"cd {shlex.quote(cwd)}; {bootstrap}"
+        output = self._run(bootstrap)
+        lines = output.splitlines()
+        if len(lines) >= 2:
+            self.user = lines[-2].strip()
+            self.hostname = lines[-1].strip()
+        self.log.info(f"shell会话已建立：{self.user}@{self.hostname} {self.cwd}")
+
+    def run(self, command, on_output=None):
+        """
+        在shell会话中执行一条命令（标准错误已合并）。
+
+        未传入on_output时返回完整输出；传入时输出按块解码后逐块回调，不在内存中累积，返回空字符串。
+        """
+        with self._lock:
+            if not self.is_open:
+                self.open(self.cwd)
+            self.interrupted = False
+            return self._run(command, on_output)
+
+    def interrupt(self):
+        """中断正在执行的命令：关闭当前通道，下次执行命令时在原工作目录重新打开"""
+        channel = self.channel
+        if channel is not None:
+            self.interrupted = True
+            self.log.info("正在中断当前命令")
+            channel.close()
+
+    def _run(self, command, on_output=None):
+        self._seq += 1
+        seq = self._seq
+        # 命令通过eval执行，避免未闭合的引号吞掉后面的哨兵；标准输入重定向，避免命令读走哨兵
+        script = (
+            f"eval {shlex.quote(command)} </dev/null\n"
+            f"printf '\\n%s %d %d %s\\n' '{self._marker.decode()}' {seq} \"$?\" \"$PWD\"\n"
+        )
+        self.sent = False
+        self.received = False
+        self.exit_status = None
+        data = script.encode("utf-8")
+        self.channel.sendall(data)
+        self.sent = True
+        self._sent_at = time.perf_counter()
+        BYTES_SENT.inc(len(data))
+
+        chunks = []
+        emit = chunks.append if on_output is None else on_output
+        # 增量解码，避免多字节字符被拆在两个数据块之间
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        def feed(data):
+            text = decoder.decode(data)
+            if text:
+                self.received = True
+                emit(text)
+
+        self._read_until_sentinel(seq, feed)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            emit(tail)
+        return "".join(chunks)
+
+    def _read_until_sentinel(self, seq, feed):
+        """读取通道数据直到出现本条命令的哨兵行，哨兵之前的数据随读随交给feed"""
+        sentinel = b"\n" + self._marker + b" "
+        # 缓冲区末尾可能是被拆开的哨兵，保留这部分数据，其余立即输出
+        keep = len(sentinel) - 1
+        while True:
+            index = self._buffer.find(sentinel)
+            if index != -1:
+                end = self._buffer.find(b"\n", index + len(sentinel))
+                if end != -1:
+                    output = self._buffer[:index]
+                    line = self._buffer[index + len(sentinel):end].decode("utf-8", errors="replace")
+                    self._buffer = self._buffer[end + 1:]
+                    seq_text, status, cwd = line.split(" ", 2)
+                    if int(seq_text) != seq:
+                        # 之前被中断的命令留下的哨兵，丢弃后继续读取
+                        continue
+                    feed(output)
+                    self.exit_status = int(status)
+                    self.cwd = cwd
+                    return True
+                if index:
+                    feed(self._buffer[:index])
+                    self._buffer = self._buffer[index:]
+            elif len(self._buffer) > keep:
+                feed(self._buffer[:-keep])
+                self._buffer = self._buffer[-keep:]
+
+            channel = self.channel
+            data = channel.recv(32768) if channel is not None else b""
+            if not data:
+                # shell已退出（例如执行了exit）或命令被中断，下次执行命令时重新打开
+                feed(self._buffer)
+                self._buffer = b""
+                self.close()
+                return False
+            if self._sent_at is not None:
+                FIRST_BYTE_SECONDS.observe(time.perf_counter() - self._sent_at)
+                self._sent_at = None
+            BYTES_RECEIVED.inc(len(data))
+            self._buffer += data
+
+    def close(self):
+        if self.channel is not None:
+            try:
+                self.channel.close()
+            except Exception as e:
+                self.log.warning(f"关闭shell通道时出现错误：{str(e)}")
+        self.channel = None
@@ -4,67 +4,209 @@
 # Author    :       摸鱼呀阿凡
 # Contact   :       f2095522823@gmail.com
 # License   :       MIT LICENSE
+import csv
+import json
 import sqlite3
 import os
+import threading
+
+# 同一主机同一用户只保存一条，已存在时更新密码；tags为None时保留原有标签
+UPSERT_SQL = ("INSERT INTO saved_info (ip, username, password, tags) "
+              "VALUES (:ip, :username, :password, COALESCE(:tags, '')) "
+              "ON CONFLICT(ip, username) DO UPDATE SET password=excluded.password, "
+              "tags=COALESCE(:tags, saved_info.tags) "
+              "WHERE saved_info.password IS NOT excluded.password "
+              "OR saved_info.tags IS NOT COALESCE(:tags, saved_info.tags)")
+QUERY_CHUNK = 500  # 按rowid批量查询时每条语句的参数个数
 
 
 class SavedInfoManager:
     def __init__(self,log):
         self.log = log
         self.db_file = 'dbs/saved_info.db'
+        self.connection = None
+        # 连接在多个线程间共用，每次访问都需要加锁
+        self.lock = threading.Lock()
         #如果不存在dbs文件夹就创建一个
         if not os.path.exists('dbs'):
             os.makedirs('dbs')
-        if not os.path.exists(self.db_file):
-            # 如果数据库文件不存在，则创建一个新的数据库文件
-            try:
-                conn = sqlite3.connect(self.db_file)
-                conn.close()
-                self.add_table()
-            except Exception as e:
-                self.log.error(f'创建数据库文件错误：{str(e)}')
+        try:
+            # 整个程序运行期间只打开一次数据库连接，WAL模式下读写互不阻塞
+            self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.add_table()
+        except Exception as e:
+            self.log.error(f'打开数据库文件错误：{str(e)}')
 
     def add_table(self):
-        # 连接到数据库
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            # 创建 saved_info 表
-            cursor.execute('''CREATE TABLE IF NOT EXISTS saved_info
-                              (ip TEXT, username TEXT, password TEXT)''')
-            # 提交更改并关闭连接
-            conn.commit()
-            conn.close()
+            with self.lock, self.connection:
+                # 创建 saved_info 表
+                self.connection.execute('''CREATE TABLE IF NOT EXISTS saved_info
+                                           (ip TEXT, username TEXT, password TEXT)''')
+                indexes = [row[1] for row in self.connection.execute("PRAGMA index_list(saved_info)")]
+                if 'idx_saved_info_host' not in indexes:
+                    # 旧版本的表没有唯一约束，可能有重复的记录，只保留最后保存的一条；建立唯一索引后不会再有重复，只需执行一次
+                    self.connection.execute('''DELETE FROM saved_info WHERE rowid NOT IN
+                                               (SELECT MAX(rowid) FROM saved_info GROUP BY ip, username)''')
+                    self.connection.execute('''CREATE UNIQUE INDEX idx_saved_info_host ON saved_info (ip, username)''')
+                # 标签用于筛选主机，空格分隔
+                columns = [row[1] for row in self.connection.execute("PRAGMA table_info(saved_info)")]
+                if 'tags' not in columns:
+                    self.connection.execute("ALTER TABLE saved_info ADD COLUMN tags TEXT NOT NULL DEFAULT ''")
         except Exception as e:
             self.log.error(f'创建数据库表错误：{str(e)}')
+
     def get_saved_info(self):
         saved_info = []
         try:
-            connection = sqlite3.connect(self.db_file)
-            cursor = connection.cursor()
-            cursor.execute("SELECT * FROM saved_info")
-            saved_info = cursor.fetchall()
-            connection.close()
+            with self.lock:
+                saved_info = self.connection.execute(
+                    "SELECT ip, username, password FROM saved_info ORDER BY rowid").fetchall()
         except Exception as e:
             self.log.error(f'获取保存的信息错误：{str(e)}')
         return saved_info
 
-    def add_saved_info(self, ip, username, password):
+    def add_saved_info(self, ip, username, password, tags=None):
+        """保存连接信息，返回是否有变化（新增或更新了密码、标签），完全相同的记录已存在时返回False"""
         try:
-            connection = sqlite3.connect(self.db_file)
-            cursor = connection.cursor()
-            cursor.execute("INSERT INTO saved_info (ip, username, password) VALUES (?, ?, ?)", (ip, username, password))
-            connection.commit()
-            connection.close()
+            with self.lock, self.connection:
+                return self.connection.execute(UPSERT_SQL, self._row_params((ip, username, password, tags))).rowcount > 0
         except Exception as e:
             self.log.error(f'添加保存的信息错误：{str(e)}')
+            return False
 
-    def remove_saved_info(self, ip, username, password):
+    def remove_saved_info(self, ip, username):
         try:
-            connection = sqlite3.connect(self.db_file)
-            cursor = connection.cursor()
-            cursor.execute("DELETE FROM saved_info WHERE ip=? AND username=? AND password=?", (ip, username, password))
-            connection.commit()
-            connection.close()
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM saved_info WHERE ip=? AND username=?", (ip, username))
         except Exception as e:
             self.log.error(f'移除保存的信息错误：{str(e)}')
+
+    def get_index_rows(self):
+        """返回建立筛选索引所需的[(rowid, ip, username, tags), ...]，不读取密码"""
+        try:
+            with self.lock:
+                return self.connection.execute(
+                    "SELECT rowid, ip, username, tags FROM saved_info ORDER BY rowid").fetchall()
+        except Exception as e:
+            self.log.error(f'获取保存的信息错误：{str(e)}')
+            return []
+
+    def get_rows(self, rowids):
+        """按rowid读取一批用于显示的记录，返回{rowid: (ip, username, tags)}"""
+        rows = {}
+        try:
+            with self.lock:
+                for start in range(0, len(rowids), QUERY_CHUNK):
+                    chunk = list(rowids[start:start + QUERY_CHUNK])
+                    placeholders = ",".join("?" * len(chunk))
+                    for rowid, ip, username, tags in self.connection.execute(
+                            f"SELECT rowid, ip, username, tags FROM saved_info WHERE rowid IN ({placeholders})", chunk):
+                        rows[rowid] = (ip, username, tags)
+        except Exception as e:
+            self.log.error(f'获取保存的信息错误：{str(e)}')
+        return rows
+
+    def get_host(self, rowid):
+        """返回(ip, username, password)，记录不存在时返回None"""
+        try:
+            with self.lock:
+                return self.connection.execute(
+                    "SELECT ip, username, password FROM saved_info WHERE rowid=?", (rowid,)).fetchone()
+        except Exception as e:
+            self.log.error(f'获取保存的信息错误：{str(e)}')
+            return None
+
+    def remove_rows(self, rowids):
+        """在一个事务中按rowid删除多条记录"""
+        try:
+            with self.lock, self.connection:
+                self.connection.executemany("DELETE FROM saved_info WHERE rowid=?", [(rowid,) for rowid in rowids])
+        except Exception as e:
+            self.log.error(f'移除保存的信息错误：{str(e)}')
+
+    def set_tags(self, rowids, tags):
+        try:
+            with self.lock, self.connection:
+                self.connection.executemany("UPDATE saved_info SET tags=? WHERE rowid=?",
+                                            [(tags, rowid) for rowid in rowids])
+        except Exception as e:
+            self.log.error(f'设置标签错误：{str(e)}')
+
+    @staticmethod
+    def _row_params(row):
+        ip, username, password, tags = (tuple(row) + (None,))[:4]
+        return {"ip": ip, "username": username, "password": password, "tags": tags}
+
+    def import_rows(self, rows):
+        """在一个事务中批量保存[(ip, username, password[, tags]), ...]，返回新增或更新的条数"""
+        try:
+            with self.lock, self.connection:
+                before = self.connection.total_changes
+                self.connection.executemany(UPSERT_SQL, map(self._row_params, rows))
+                return self.connection.total_changes - before
+        except Exception as e:
+            self.log.error(f'批量导入保存的信息错误：{str(e)}')
+            return 0
+
+    def import_file(self, path):
+        """
+        从CSV或JSON主机清单导入连接信息，返回导入的条数。
+
+        CSV每行为ip,username,password[,tags]（可以有表头）；JSON为对象列表（ip/host、username/user、password、
+        tags）或[ip, username, password]列表。
+        """
+        try:
+            rows = self.read_file(path)
+        except Exception as e:
+            self.log.error(f'读取主机清单错误：{str(e)}')
+            return 0
+        count = self.import_rows(rows)
+        self.log.info(f'从{path}导入{count}条连接信息（共{len(rows)}条）')
+        return count
+
+    @staticmethod
+    def read_file(path):
+        """读取CSV或JSON主机清单，返回[(ip, username, password, tags), ...]，格式见import_file"""
+        if path.lower().endswith(".json"):
+            return SavedInfoManager._read_json(path)
+        return SavedInfoManager._read_csv(path)
+
+    @staticmethod
+    def _read_csv(path):
+        rows = []
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for record in csv.reader(f):
+                if len(record) < 2 or not record[0].strip() or record[0].strip().lower() in ('ip', 'host'):
+                    continue
+                rows.append((record[0].strip(), record[1].strip(), record[2] if len(record) > 2 else '',
+                             record[3].strip() if len(record) > 3 else None))
+        return rows
+
+    @staticmethod
+    def _read_json(path):
+        rows = []
+        with open(path, encoding='utf-8') as f:
+            records = json.load(f)
+        for record in records:
+            if isinstance(record, dict):
+                ip = record.get('ip') or record.get('host')
+                username = record.get('username') or record.get('user')
+                password = record.get('password', '')
+                tags = record.get('tags')
+                if isinstance(tags, list):
+                    tags = ' '.join(str(tag) for tag in tags)
+            else:
+                ip, username, password = (list(record) + ['', '', ''])[:3]
+                tags = None
+            if ip and username:
+                rows.append((str(ip), str(username), str(password or ''), tags))
+        return rows
+
+    def close(self):
+        if self.connection is not None:
+            with self.lock:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,254 @@
+"""
+后台任务调度：所有会话的任务按优先级排队，交互操作（命令、连接、目录列表）排在文件传输等大批量任务前面。
+
+- 同一会话中标记为serial的任务（连接、命令）按提交顺序逐个执行，不会同时修改工作目录和shell会话；
+- 大批量任务在全局和每个会话中都有并发上限，总有线程留给交互操作；
+- 任务可以取消（排队中的直接移除，执行中的由interrupt()关闭正在使用的通道），可以设置超时，超时后按取消处理，
+  交互任务默认有超时；被取消或超时的任务结果总是None；
+- depth()返回各优先级排队中的任务数，同时记录到指标中。
+"""
+import threading
+import time
+from collections import deque
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from logger import get
+from metrics import JOBS_QUEUED, JOBS_RUNNING, JOB_TIMEOUTS, JOB_WAIT_SECONDS
+
+PRIORITY_INTERACTIVE = 0  # 用户正在等待结果的操作：命令、连接、目录列表、文件分页和查找
+PRIORITY_NORMAL = 1  # 保存文件、加载主机列表
+PRIORITY_BULK = 2  # 文件和目录传输、批量执行
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_NORMAL: "normal", PRIORITY_BULK: "bulk"}
+
+MAX_THREADS = 16  # 同时执行的任务总数
+CLASS_LIMITS = {PRIORITY_NORMAL: 4, PRIORITY_BULK: 4}  # 各优先级同时执行的上限，其余线程留给交互操作
+SESSION_BULK_LIMIT = 2  # 每个会话同时执行的大批量任务数
+THREAD_EXPIRY = 10000  # 空闲线程的回收时间（毫秒）
+INTERACTIVE_TIMEOUT = 30  # 目录列表、文件分页和查找等交互任务默认的时限（秒）
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+
+
+class JobSignals(QObject):
+    finished = pyqtSignal(object)
+    output = pyqtSignal(str)  # 命令输出按块发送
+    progress = pyqtSignal(object, object)  # 已传输字节数, 总字节数
+    batch = pyqtSignal(object)  # 目录列表或批量执行的结果按批发送
+
+
+class Job:
+    """
+    后台任务的基类，子类实现execute()。
+    任务结束（完成、失败、取消）时finished信号发出一次；被取消（包括超时）的任务结果为None，
+    即使execute()已经返回了结果，timed_out区分是否因超时取消。
+    """
+    priority = PRIORITY_NORMAL
+    serial = False  # 为True时同一会话中的这类任务逐个执行
+    default_timeout = None  # 没有指定timeout时使用的时限（秒）
+
+    def __init__(self, connection_manager=None, timeout=None):
+        self.connection_manager = connection_manager
+        # 从开始执行算起的时限（秒），超时后按取消处理
+        self.timeout = timeout if timeout is not None else self.default_timeout
+        self.signals = JobSignals()
+        self.cancel_event = threading.Event()
+        self.timed_out = False
+        self.state = JOB_PENDING
+        self.session = None
+        self.scheduler = None
+        self.submitted = None
+        self.thread = None  # 执行任务的线程标识，interrupt()据此中断该线程正在进行的操作
+
+    def execute(self):
+        raise NotImplementedError
+
+    def cancel(self):
+        """请求取消任务：排队中的直接移除，执行中的由interrupt()尽快停止"""
+        self.cancel_event.set()
+        if self.scheduler is not None and self.scheduler.discard(self):
+            self.signals.finished.emit(None)
+        elif self.state == JOB_RUNNING:
+            self.interrupt()
+
+    def interrupt(self):
+        """
+        执行中被取消时调用，默认关闭执行线程正在使用的SFTP通道和命令通道（ConnectionManager.abort()），
+        子类按需改为其他停止方式（文件传输通过cancel_event取消）
+        """
+        if self.connection_manager is not None and self.thread is not None:
+            self.connection_manager.abort(self.thread)
+
+    def expire(self):
+        self.timed_out = True
+        JOB_TIMEOUTS.inc()
+        self.cancel()
+
+
+class JobRunner(QRunnable):
+    def __init__(self, scheduler, job):
+        super().__init__()
+        self.scheduler = scheduler
+        self.job = job
+
+    def run(self):
+        job = self.job
+        result = None
+        timer = None
+        job.thread = threading.get_ident()
+        if job.timeout:
+            timer = threading.Timer(job.timeout, job.expire)
+            timer.daemon = True
+            timer.start()
+        try:
+            result = job.execute()
+        except Exception as e:
+            self.scheduler.log.error(f"后台任务{type(job).__name__}执行失败：{str(e)}")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self.scheduler.finish(job)
+        if job.cancel_event.is_set():
+            if job.timed_out:
+                self.scheduler.log.warning(f"后台任务{type(job).__name__}超过{job.timeout}秒，已中断")
+            result = None
+        job.signals.finished.emit(result)
+
+
+class JobScheduler:
+    def __init__(self, log, max_threads=MAX_THREADS, class_limits=None, session_bulk_limit=SESSION_BULK_LIMIT):
+        self.log = log
+        self.max_threads = max_threads
+        self.class_limits = CLASS_LIMITS if class_limits is None else class_limits
+        self.session_bulk_limit = session_bulk_limit
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self.pool.setExpiryTimeout(THREAD_EXPIRY)
+        self.queues = {priority: deque() for priority in PRIORITY_NAMES}
+        self.running = {priority: 0 for priority in PRIORITY_NAMES}
+        self.session_bulk = {}  # 会话 -> 正在执行的大批量任务数
+        self.serial_busy = set()  # 有serial任务正在执行的会话
+        self.lock = threading.Lock()
+
+    def submit(self, job, session=None):
+        """提交任务，session为任务所属的会话（按会话串行和限流），返回job"""
+        job.session = session
+        job.scheduler = self
+        job.submitted = time.perf_counter()
+        with self.lock:
+            self.queues[job.priority].append(job)
+            JOBS_QUEUED.inc()
+        self._dispatch()
+        return job
+
+    def discard(self, job):
+        """从队列中移除尚未开始的任务，移除成功时返回True"""
+        with self.lock:
+            if job.state != JOB_PENDING or job.scheduler is not self:
+                return False
+            try:
+                self.queues[job.priority].remove(job)
+            except ValueError:
+                return False
+            job.state = JOB_DONE
+            JOBS_QUEUED.dec()
+        return True
+
+    def cancel_session(self, session):
+        """丢弃会话中尚未开始的任务（关闭会话时调用），不再发出这些任务的finished信号"""
+        with self.lock:
+            for priority, queue in self.queues.items():
+                kept = deque(job for job in queue if job.session is not session)
+                for job in queue:
+                    if job.session is session:
+                        job.state = JOB_DONE
+                        job.cancel_event.set()
+                        JOBS_QUEUED.dec()
+                self.queues[priority] = kept
+
+    def depth(self):
+        """各优先级排队中的任务数：{"interactive": 0, "normal": 0, "bulk": 0}"""
+        with self.lock:
+            return {PRIORITY_NAMES[priority]: len(queue) for priority, queue in self.queues.items()}
+
+    def active(self):
+        """各优先级正在执行的任务数"""
+        with self.lock:
+            return {PRIORITY_NAMES[priority]: count for priority, count in self.running.items()}
+
+    def _can_start(self, job, blocked):
+        if sum(self.running.values()) >= self.max_threads:
+            return False
+        limit = self.class_limits.get(job.priority)
+        if limit is not None and self.running[job.priority] >= limit:
+            return False
+        if job.session is not None:
+            if job.serial and (job.session in self.serial_busy or job.session in blocked):
+                return False
+            if job.priority == PRIORITY_BULK and self.session_bulk.get(job.session, 0) >= self.session_bulk_limit:
+                return False
+        return True
+
+    def _dispatch(self):
+        """按优先级启动可以执行的任务，跳过暂时受限的任务"""
+        started = []
+        with self.lock:
+            # 本轮中排在前面、还没能启动的serial任务所属的会话，后面的serial任务不能越过它
+            blocked = set()
+            for priority in sorted(self.queues):
+                queue = self.queues[priority]
+                if not queue:
+                    continue
+                waiting = deque()
+                for job in queue:
+                    if self._can_start(job, blocked):
+                        self._mark_started(job)
+                        started.append(job)
+                    else:
+                        waiting.append(job)
+                        if job.serial and job.session is not None:
+                            blocked.add(job.session)
+                self.queues[priority] = waiting
+        for job in started:
+            JOB_WAIT_SECONDS.observe(time.perf_counter() - job.submitted)
+            self.pool.start(JobRunner(self, job))
+
+    def _mark_started(self, job):
+        job.state = JOB_RUNNING
+        self.running[job.priority] += 1
+        if job.session is not None:
+            if job.serial:
+                self.serial_busy.add(job.session)
+            if job.priority == PRIORITY_BULK:
+                self.session_bulk[job.session] = self.session_bulk.get(job.session, 0) + 1
+        JOBS_QUEUED.dec()
+        JOBS_RUNNING.inc()
+
+    def finish(self, job):
+        with self.lock:
+            job.state = JOB_DONE
+            self.running[job.priority] -= 1
+            if job.session is not None:
+                if job.serial:
+                    self.serial_busy.discard(job.session)
+                if job.priority == PRIORITY_BULK:
+                    count = self.session_bulk.pop(job.session) - 1
+                    if count:
+                        self.session_bulk[job.session] = count
+            JOBS_RUNNING.dec()
+        self._dispatch()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """整个程序共用的调度器，第一次调用时创建"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler(get())
+    return _scheduler
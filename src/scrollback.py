@@ -0,0 +1,161 @@
+from collections import deque
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtGui import QTextCursor
+
+DEFAULT_MAX_LINES = 10000  # 输出框最多保留的行数
+FRAME_INTERVAL = 16  # 刷新间隔（毫秒），约60帧每秒
+MAX_LINE_LENGTH = 64 * 1024  # 一行最多的字符数，没有换行的输出超出后强制换行，未结束的行不会无限增长
+
+
+class LineRingBuffer:
+    """
+    按行保存文本的环形缓冲区，最多保留max_lines行，更早的行自动丢弃。
+
+    各段用"\\n"连接即为缓冲的文本，最后一段是尚未结束的行（可能为空）。
+    """
+
+    def __init__(self, max_lines=DEFAULT_MAX_LINES):
+        self.segments = deque([""], maxlen=max_lines + 1)
+
+    @property
+    def line_count(self):
+        return len(self.segments)
+
+    def append(self, text):
+        parts = text.split("\n")
+        self.segments[-1] += parts[0]
+        self.segments.extend(parts[1:])
+
+    def trim(self, max_lines):
+        """只保留最后max_lines行"""
+        while len(self.segments) > max_lines:
+            self.segments.popleft()
+
+    def resize(self, max_lines):
+        self.segments = deque(self.segments, maxlen=max_lines + 1)
+
+    def text(self):
+        return "\n".join(self.segments)
+
+    def clear(self):
+        self.segments.clear()
+        self.segments.append("")
+
+
+class ConsoleView(QObject):
+    """
+    输出框的滚动缓冲。
+
+    输出先写入环形缓冲区并暂存，由定时器每帧批量以纯文本插入到文档末尾，超过MAX_LINE_LENGTH的行被强制换行。
+    逐行删除文档开头的旧行代价很高，所以允许文档超出上限slack行，
+    超出后直接用环形缓冲区中最后max_lines行重建文档，删除的开销按批分摊。
+    """
+
+    def __init__(self, editor, max_lines=DEFAULT_MAX_LINES, interval=FRAME_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.editor = editor
+        self.editor.clear()
+        self.transcript = None  # 设置后所有输出同时追加到磁盘上的会话记录，不受行数上限影响
+        self.pending = []
+        self.pending_lines = 0
+        self.line_length = 0  # 最后一行（尚未结束）已有的字符数
+        self.max_lines = max_lines
+        self.slack = max_lines // 2
+        self.scrollback = LineRingBuffer(max_lines + self.slack)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def set_max_lines(self, max_lines):
+        """设置保留的最大行数"""
+        self.max_lines = max_lines
+        self.slack = max_lines // 2
+        self.scrollback.resize(max_lines + self.slack)
+        self.flush()
+        if self.editor.document().blockCount() > max_lines:
+            self._rebuild(0)
+
+    def append(self, text):
+        """追加输出，实际写入在下一帧进行"""
+        if not text:
+            return
+        if self.transcript is not None:
+            self.transcript.append(text)
+        text = self._break_long_lines(text)
+        self.scrollback.append(text)
+        self.pending.append(text)
+        self.pending_lines += text.count("\n")
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def _break_long_lines(self, text):
+        """在超过MAX_LINE_LENGTH的行中插入换行，会话记录中保存的仍是原样的输出"""
+        if self.line_length + len(text) <= MAX_LINE_LENGTH:
+            # 常见情况：不可能超出，只更新最后一行的长度
+            last_newline = text.rfind("\n")
+            self.line_length = self.line_length + len(text) if last_newline == -1 else len(text) - last_newline - 1
+            return text
+        lines = []
+        length = self.line_length
+        for index, line in enumerate(text.split("\n")):
+            if index:
+                length = 0
+            pieces = []
+            while length + len(line) > MAX_LINE_LENGTH:
+                cut = MAX_LINE_LENGTH - length
+                pieces.append(line[:cut])
+                line = line[cut:]
+                length = 0
+            pieces.append(line)
+            length += len(line)
+            lines.append("\n".join(pieces))
+        self.line_length = length
+        return "\n".join(lines)
+
+    def flush(self):
+        """将暂存的文本一次性写入文档"""
+        if not self.pending:
+            self.timer.stop()
+            return
+        text = "".join(self.pending)
+        lines = self.pending_lines
+        self.pending.clear()
+        self.pending_lines = 0
+
+        document = self.editor.document()
+        if document.blockCount() + lines > self.max_lines + self.slack:
+            self._rebuild(lines)
+            return
+
+        scrollbar = self.editor.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def _rebuild(self, new_lines):
+        """用环形缓冲区中最后max_lines行重建文档"""
+        document = self.editor.document()
+        removed = document.blockCount() + new_lines - self.max_lines
+        scrollbar = self.editor.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        position = scrollbar.value()
+
+        self.scrollback.trim(self.max_lines)
+        self.editor.setPlainText(self.scrollback.text())
+        # 纯文本编辑框的滚动条以行为单位，用户向上翻看时保持其看到的内容不动
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+        else:
+            scrollbar.setValue(max(0, position - removed))
+
+    def clear(self):
+        self.pending.clear()
+        self.pending_lines = 0
+        self.line_length = 0
+        self.scrollback.clear()
+        self.editor.clear()
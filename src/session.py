@@ -0,0 +1,106 @@
+from PyQt5 import QtGui, QtWidgets
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from logger import transcript_enabled
+from scheduler import get_scheduler
+from scrollback import ConsoleView
+from transcript import Transcript
+
+SESSION_MAX_LINES = 5000  # 每个会话输出框保留的行数
+
+
+class Session(QObject):
+    """
+    一个远程主机的会话：独立的连接（工作目录、shell会话、SFTP池）和输出标签页。
+    任务交给共用的调度器，按会话串行执行命令、限制传输并发，某台主机很慢时不会占满其他会话的线程。
+    """
+
+    state_changed = pyqtSignal(str)  # 自动重连状态，从后台线程发往界面线程
+
+    def __init__(self, log, parent=None):
+        super().__init__(parent)
+        # paramiko导入较慢，第一次建立会话时才导入，不拖慢程序启动
+        from connection import ConnectionManager
+
+        self.title = ""
+        self.running_commands = 0  # 正在执行的命令数量
+        # 输出由会话自己的记录保存，连接不再另外写文本记录
+        self.connection_manager = ConnectionManager(log, record_transcript=False)
+        self.connection_manager.on_state_change = self.state_changed.emit
+
+        self.scheduler = get_scheduler()
+
+        self.view = QtWidgets.QPlainTextEdit()
+        font = QtGui.QFont()
+        font.setFamily("SimSun")
+        font.setPointSize(9)
+        self.view.setFont(font)
+        self.view.setUndoRedoEnabled(False)
+        self.view.setReadOnly(True)
+        self.console = ConsoleView(self.view, max_lines=SESSION_MAX_LINES, parent=self)
+        self.transcript = None
+        self.tail = None  # 正在跟踪的远程文件（RemoteTail）
+
+    def open_transcript(self):
+        """启用了会话记录（SHELL_TRANSCRIPT=1）时，开始把输出记录到磁盘（log/sessions下以会话标题命名的文件）"""
+        if not transcript_enabled():
+            return
+        try:
+            self.transcript = Transcript(self.connection_manager.log, self.title)
+        except Exception as e:
+            self.connection_manager.log.error(f"创建会话记录错误：{str(e)}")
+            return
+        self.console.transcript = self.transcript
+
+    def start(self, job):
+        """提交属于本会话的后台任务"""
+        return self.scheduler.submit(job, session=self)
+
+    def close(self):
+        """断开连接，丢弃尚未开始的任务"""
+        self.scheduler.cancel_session(self)
+        if self.tail is not None:
+            tail, self.tail = self.tail, None
+            tail.stop()
+        self.connection_manager.disconnect()
+        if self.transcript is not None:
+            self.console.transcript = None
+            self.transcript.close()
+        self.view.deleteLater()
+        self.deleteLater()
+
+
+class SessionTabs(QtWidgets.QTabWidget):
+    """以标签页管理多个会话，每个标签页是一个会话的输出框"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.sessions = {}  # 输出框 -> 会话
+        self.setTabsClosable(True)
+        self.setMovable(True)
+        self.setDocumentMode(True)
+
+    def add_session(self, session):
+        self.sessions[session.view] = session
+        self.setCurrentIndex(self.addTab(session.view, session.title))
+
+    def remove_session(self, session):
+        index = self.indexOf(session.view)
+        if index != -1:
+            self.removeTab(index)
+        self.sessions.pop(session.view, None)
+        session.close()
+
+    def session_at(self, index):
+        return self.sessions.get(self.widget(index))
+
+    def current_session(self):
+        return self.sessions.get(self.currentWidget())
+
+    def set_session_title(self, session, title):
+        index = self.indexOf(session.view)
+        if index != -1:
+            self.setTabText(index, title)
+
+    def all_sessions(self):
+        return [self.session_at(index) for index in range(self.count())]
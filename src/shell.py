@@ -15,8 +15,14 @@ class Ui_Form(object):
     def setupUi(self, Form):
         Form.setObjectName("Form")
         Form.resize(808, 607)
-        self.show = QtWidgets.QTextBrowser(Form)
+        self.show = QtWidgets.QPlainTextEdit(Form)
         self.show.setGeometry(QtCore.QRect(270, 10, 521, 471))
+        font = QtGui.QFont()
+        font.setFamily("SimSun")
+        font.setPointSize(9)
+        self.show.setFont(font)
+        self.show.setUndoRedoEnabled(False)
+        self.show.setReadOnly(True)
         self.show.setObjectName("show")
         self.command = QtWidgets.QLineEdit(Form)
         self.command.setGeometry(QtCore.QRect(270, 489, 521, 31))
@@ -73,9 +79,17 @@ class Ui_Form(object):
         self.username_edit = QtWidgets.QLineEdit(self.layoutWidget1)
         self.username_edit.setObjectName("username_edit")
         self.formLayout.setWidget(1, QtWidgets.QFormLayout.FieldRole, self.username_edit)
-        self.listWidget = QtWidgets.QListWidget(Form)
-        self.listWidget.setGeometry(QtCore.QRect(10, 260, 211, 211))
-        self.listWidget.setObjectName("listWidget")
+        self.host_filter = QtWidgets.QLineEdit(Form)
+        self.host_filter.setGeometry(QtCore.QRect(10, 260, 211, 22))
+        self.host_filter.setClearButtonEnabled(True)
+        self.host_filter.setObjectName("host_filter")
+        self.host_list = QtWidgets.QListView(Form)
+        self.host_list.setGeometry(QtCore.QRect(10, 286, 211, 185))
+        self.host_list.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.host_list.setLayoutMode(QtWidgets.QListView.Batched)
+        self.host_list.setUniformItemSizes(True)
+        self.host_list.setBatchSize(1000)
+        self.host_list.setObjectName("host_list")
         self.save_server = QtWidgets.QLabel(Form)
         self.save_server.setGeometry(QtCore.QRect(20, 230, 101, 21))
         self.save_server.setObjectName("save_server")
@@ -101,11 +115,6 @@ class Ui_Form(object):
     def retranslateUi(self, Form):
         _translate = QtCore.QCoreApplication.translate
         Form.setWindowTitle(_translate("Form", "尹爪豪远程管理工具"))
-        self.show.setHtml(_translate("Form", "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
-"<html><head><meta name=\"qrichtext\" content=\"1\" /><style type=\"text/css\">\n"
-"p, li { white-space: pre-wrap; }\n"
-"</style></head><body style=\" font-family:\'SimSun\'; font-size:9pt; font-weight:400; font-style:normal;\">\n"
-"<p style=\"-qt-paragraph-type:empty; margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><br /></p></body></html>"))
         self.mingling.setText(_translate("Form", "命令："))
         self.checkBox.setText(_translate("Form", "是否保存"))
         self.server.setText(_translate("Form", "服务器："))
@@ -117,6 +126,7 @@ class Ui_Form(object):
         self.pwd.setText(_translate("Form", "密码："))
         self.password_edit.setPlaceholderText(_translate("Form", "请输入密码"))
         self.username_edit.setPlaceholderText(_translate("Form", "请输入用户名"))
+        self.host_filter.setPlaceholderText(_translate("Form", "按主机、用户名或标签筛选"))
         self.save_server.setText(_translate("Form", "已保存的服务器："))
         self.uploadButton.setText(_translate("Form", "上传文件"))
         self.downloadButton.setText(_translate("Form", "下载文件"))
@@ -3,39 +3,31 @@
 #  -*-    coding: utf-8   -*-
 # Author    :       摸鱼呀阿凡
 # Contact   :       f2095522823@gmail.com
-from PyQt5 import QtWidgets, QtCore
-from PyQt5.QtCore import QRunnable, QThreadPool, QObject, pyqtSignal
-from PyQt5.QtWidgets import QMessageBox, QMenu, QFileDialog, QInputDialog
-from src.shell import Ui_Form
-from connection import ConnectionManager
-from saved_info import SavedInfoManager
-from logger import get
-
-
-class WorkerSignals(QObject):
-    finished = pyqtSignal(object)
-
-
-class Worker(QRunnable):
-    def __init__(self, command, connection_manager, *args):
-        super().__init__()
-        self.command = command
-        self.connection_manager = connection_manager
-        self.args = args
-        self.signals = WorkerSignals()
+import importlib
+import os
+import posixpath
+import threading
 
-    def run(self):
-        result = None
-        if self.command == 'shell':
-            result = self.connection_manager.execute_remote_command(*self.args)
-        elif self.command == 'save':
-            # 保存文件内容到远程服务器
-            result = self.connection_manager.save_file_content(*self.args)
-        elif self.command == 'put':
-            result = self.connection_manager.upload_file(*self.args)
-        elif self.command == 'push':
-            result = self.connection_manager.download_file(*self.args)
-        self.signals.finished.emit(result)
+from PyQt5 import QtWidgets, QtCore, QtGui
+from PyQt5.QtWidgets import QMessageBox, QMenu, QFileDialog, QInputDialog, QProgressDialog
+from src.shell import Ui_Form
+from keepalive import STATE_LOST, STATE_RECONNECTED, STATE_RECONNECTING
+from logger import TRANSCRIPT_ENV, get
+from command_completer import CommandCompleter
+from file_viewer import PagedFileViewer
+from history import CommandHistory
+from history_search import HistoryRecall, HistorySearchDialog
+from host_list import HostListModel, HostRole
+from jobs import CommandJob, ConnectJob, ListJob, LoadHostsJob, ReadJob, SaveJob, TransferJob
+from remote_file import PagedRemoteFile
+from remote_picker import RemoteFilePicker
+from scheduler import get_scheduler
+from session import Session, SessionTabs
+from tail import RemoteTail
+from transcript import TRANSCRIPT_DIR, Transcript
+
+LARGE_FILE_SIZE = 4 * 1024 * 1024  # 超过该大小的文件使用分页查看器只读打开
+PRELOAD_DELAY = 1000  # 启动后延迟多久在后台导入连接相关的模块（毫秒），不与窗口的第一次绘制争抢
 
 
 class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
@@ -62,23 +54,89 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         self.is_editing = False
         self.connected = False
         self.file_name = None
+        self.viewer = None  # 大文件分页查看器
+        self.edit_session = None  # 正在编辑的文件所属的会话
+
+        # 每个连接一个标签页，占据原输出框的位置
+        self.tabs = SessionTabs(self)
+        self.tabs.setGeometry(self.ui_start.show.geometry())
+        self.ui_start.show.hide()
+        self.tabs.tabCloseRequested.connect(lambda index: self.close_session(self.tabs.session_at(index)))
+        corner = QtWidgets.QWidget(self.tabs)
+        corner_layout = QtWidgets.QHBoxLayout(corner)
+        corner_layout.setContentsMargins(0, 0, 0, 0)
+        new_session_button = QtWidgets.QToolButton(corner)
+        new_session_button.setText("+")
+        new_session_button.setToolTip("新建会话")
+        new_session_button.clicked.connect(self.show_login_form)
+        stats_button = QtWidgets.QToolButton(corner)
+        stats_button.setText("统计")
+        stats_button.setToolTip("连接、命令和传输的耗时统计")
+        stats_button.clicked.connect(self.show_stats)
+        transcript_button = QtWidgets.QToolButton(corner)
+        transcript_button.setText("记录")
+        transcript_button.setToolTip("查看和查找会话的完整输出")
+        transcript_button.setPopupMode(QtWidgets.QToolButton.InstantPopup)
+        transcript_menu = QMenu(transcript_button)
+        transcript_menu.addAction("当前会话的记录", self.show_transcript)
+        transcript_menu.addAction("打开以前的记录…", self.open_saved_transcript)
+        transcript_button.setMenu(transcript_menu)
+        tail_button = QtWidgets.QToolButton(corner)
+        tail_button.setText("跟踪")
+        tail_button.setToolTip("持续显示远程文件新增的内容")
+        tail_button.setPopupMode(QtWidgets.QToolButton.InstantPopup)
+        tail_menu = QMenu(tail_button)
+        tail_menu.addAction("跟踪远程文件…", self.follow_file)
+        tail_menu.addAction("停止跟踪", self.stop_follow)
+        tail_button.setMenu(tail_menu)
+        corner_layout.addWidget(new_session_button)
+        corner_layout.addWidget(tail_button)
+        corner_layout.addWidget(transcript_button)
+        corner_layout.addWidget(stats_button)
+        self.tabs.setCornerWidget(corner)
+        self.stats_dialog = None
 
         self.ui_start.login_btn.clicked.connect(self.lianjie)
         self.ui_start.exit_btn.clicked.connect(self.tuichu)
-        self.ui_start.listWidget.itemClicked.connect(self.show_info)
-        self.ui_start.listWidget.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
-        self.ui_start.listWidget.customContextMenuRequested.connect(self.show_context_menu)
+        self.ui_start.host_list.clicked.connect(self.show_info)
+        self.ui_start.host_list.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.ui_start.host_list.customContextMenuRequested.connect(self.show_context_menu)
         self.ui_start.command.returnPressed.connect(self.execute_command)
+        self.completer = CommandCompleter(self.ui_start.command, lambda: self.session)
+        # 按主机保存执行过的命令：上下键翻看，Ctrl-R查找
+        self.history = CommandHistory(self.log)
+        self.recall = HistoryRecall(self.ui_start.command, self.history, lambda: self.session)
+        search_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+R"), self.ui_start.command)
+        search_shortcut.setContext(QtCore.Qt.WidgetShortcut)
+        search_shortcut.activated.connect(self.search_history)
         self.ui_start.ok.accepted.connect(self.execute_command)
         self.ui_start.ok.rejected.connect(self.clear_command)
 
-        self.connection_manager = ConnectionManager(self.log)
-        self.saved_info_manager = SavedInfoManager(self.log)
-        self.load_saved_info()  # 加载数据库中的连接信息
+        # 数据库在后台打开，主机列表加载完成前为None，窗口不必等待数据库就能显示
+        self.saved_info_manager = None
+        self.host_model = HostListModel(None, self)
+        self.ui_start.host_list.setModel(self.host_model)
+        # 输入停顿后再筛选，连续输入时不重复查询
+        self.filter_timer = QtCore.QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(80)
+        self.filter_timer.timeout.connect(lambda: self.host_model.set_filter(self.ui_start.host_filter.text()))
+        self.ui_start.host_filter.textChanged.connect(self.filter_timer.start)
+        # 在后台加载数据库中的连接信息
+        job = LoadHostsJob(self.log)
+        job.signals.finished.connect(self.saved_info_loaded)
+        get_scheduler().submit(job)
 
         # 绑定上传和下载按钮的点击事件
-        self.ui_start.uploadButton.clicked.connect(self.upload_file)
-        self.ui_start.downloadButton.clicked.connect(self.download_file)
+        # 上传和下载按钮弹出菜单，可选择单个文件或整个目录
+        upload_menu = QMenu(self)
+        upload_menu.addAction("上传文件", self.upload_file)
+        upload_menu.addAction("上传目录", self.upload_directory)
+        self.ui_start.uploadButton.setMenu(upload_menu)
+        download_menu = QMenu(self)
+        download_menu.addAction("下载文件", self.download_file)
+        download_menu.addAction("下载目录", self.download_directory)
+        self.ui_start.downloadButton.setMenu(download_menu)
 
         # 编辑和保存按钮
         self.ui_start.editButton.clicked.connect(self.show_file_content)
@@ -87,6 +145,16 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         self.ui_start.textEdit.hide()  # 隐藏编辑器页面
         self.ui_start.saveButton.hide()  # 隐藏保存按钮
 
+    @property
+    def session(self):
+        """当前标签页的会话，没有会话时为None"""
+        return self.tabs.current_session()
+
+    @property
+    def connection_manager(self):
+        session = self.session
+        return session.connection_manager if session is not None else None
+
     def show_file_content(self):
         if not self.connected:
             QMessageBox.warning(self, "错误", "请先连接！", QMessageBox.Ok)
@@ -95,6 +163,9 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
             self.to_edit()
         else:
             self.is_editing = False
+            if self.viewer is not None:
+                self.viewer.close_viewer()
+                self.viewer = None
             self.ui_start.textEdit.clear()
             self.ui_start.textEdit.hide()
             self.ui_start.editButton.setText("编辑")
@@ -103,39 +174,127 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         """
         编辑按钮点击事件，允许用户选择远程服务器上的文件并显示文件内容。
         """
-        current_remote_path = self.connection_manager.current_directory  # 获取当前远程路径
-
         # 显示当前路径的文件供选择
-        files_in_path = self.connection_manager.list_files(current_remote_path)
-        file, ok = QtWidgets.QInputDialog.getItem(self, "选择文件", "选择要编辑的文件", files_in_path,
-                                                  editable=False)
-        if file and ok:
+        file, size = self.choose_remote_file("选择文件", "选择要编辑的文件")
+        self.edit_session = self.session
+        if file and size > LARGE_FILE_SIZE:
+            self.open_viewer(file)
+        elif file:
             self.file_name = file
-            content = self.connection_manager.get_file_content(file)
-            if content:
-                self.is_editing = True
-                self.ui_start.textEdit.show()
-                self.ui_start.textEdit.setText(content)
-                self.ui_start.saveButton.show()
-                self.ui_start.editButton.setText("取消")
-            else:
-                try:
-                    reply = QMessageBox.question(
-                        self, "错误",
-                        f"无法获取文件内容，是否强制打开",
-                        QMessageBox.Yes | QMessageBox.No,
-                        QMessageBox.No
-                    )
-                    if reply == QMessageBox.Yes:
-                        self.ui_start.editButton.setText("取消")
-                        self.is_editing = True
-                        self.ui_start.textEdit.show()
-                        self.ui_start.textEdit.setText(content)
-                        self.ui_start.saveButton.show()
-                    else:
-                        QMessageBox.warning(self, "错误", "无法强制打开文件！", QMessageBox.Ok)
-                except Exception as e:
-                    self.log.error(f"打开文件出现错误: {e}")
+            task = ReadJob(self.connection_manager, file)
+            task.signals.finished.connect(lambda content: self.show_editor(task, content))
+            self.session.start(task)
+
+    def show_editor(self, task, content):
+        """
+        文件内容在后台读取完成后显示编辑框。
+        """
+        if task.cancel_event.is_set():
+            return
+        if content:
+            self.is_editing = True
+            self.ui_start.textEdit.show()
+            self.ui_start.textEdit.setText(content)
+            self.ui_start.saveButton.show()
+            self.ui_start.editButton.setText("取消")
+        else:
+            try:
+                reply = QMessageBox.question(
+                    self, "错误",
+                    f"无法获取文件内容，是否强制打开",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No
+                )
+                if reply == QMessageBox.Yes:
+                    self.ui_start.editButton.setText("取消")
+                    self.is_editing = True
+                    self.ui_start.textEdit.show()
+                    self.ui_start.textEdit.setText(content)
+                    self.ui_start.saveButton.show()
+                else:
+                    QMessageBox.warning(self, "错误", "无法强制打开文件！", QMessageBox.Ok)
+            except Exception as e:
+                self.log.error(f"打开文件出现错误: {e}")
+
+    def open_viewer(self, remote_file):
+        """
+        大文件以只读分页方式查看，只按需读取正在查看的部分。
+        """
+        try:
+            paged_file = PagedRemoteFile(self.connection_manager, remote_file).open()
+        except Exception as e:
+            self.log.error(f"打开文件出现错误: {e}")
+            QMessageBox.warning(self, "错误", "无法打开文件！", QMessageBox.Ok)
+            return
+        self.show_viewer(paged_file)
+
+    def show_viewer(self, paged_file):
+        """在编辑器的位置显示分页查看器，再次点击编辑按钮（取消）时关闭"""
+        self.viewer = PagedFileViewer(self, self.connection_manager, paged_file, self.session)
+        self.viewer.setGeometry(self.ui_start.textEdit.geometry())
+        self.viewer.show()
+        self.is_editing = True
+        self.ui_start.editButton.setText("取消")
+        self.ui_start.editButton.raise_()
+
+    def show_transcript(self):
+        """
+        查看当前会话的完整输出记录，按需从磁盘读取，不载入输出框。
+        """
+        session = self.session
+        if session is None:
+            return
+        if session.transcript is None:
+            QMessageBox.warning(self, "错误", f"当前会话没有输出记录！设置环境变量{TRANSCRIPT_ENV}=1后重新启动可以开启。",
+                                QMessageBox.Ok)
+            return
+        self.view_transcript(session.transcript)
+
+    def open_saved_transcript(self):
+        """
+        选择并查看以前保存的会话记录。
+        """
+        if self.session is None:
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "打开会话记录", TRANSCRIPT_DIR, "会话记录 (*.tsz)")
+        if not path:
+            return
+        try:
+            transcript = Transcript.load(self.log, path)
+        except Exception as e:
+            self.log.error(f"打开会话记录出现错误: {e}")
+            QMessageBox.warning(self, "错误", "无法打开会话记录！", QMessageBox.Ok)
+            return
+        self.view_transcript(transcript)
+
+    def view_transcript(self, transcript):
+        if self.is_editing:
+            self.show_file_content()  # 先关闭正在编辑或查看的文件
+        self.edit_session = self.session
+        self.show_viewer(transcript.reader())
+
+    def choose_remote_file(self, title, label):
+        """
+        弹出远程文件选择框，目录列表在后台读取并逐批显示，返回(选中文件的完整路径, 文件大小)。
+        """
+        current_remote_path = self.connection_manager.current_directory or "."  # 获取当前远程路径
+        picker = RemoteFilePicker(self, title, label, current_remote_path)
+        finished = []
+        task = ListJob(self.connection_manager, current_remote_path)
+        task.signals.batch.connect(picker.add_entries)
+        task.signals.finished.connect(picker.finish)
+        task.signals.finished.connect(finished.append)
+        self.session.start(task)
+
+        accepted = picker.exec_() == QtWidgets.QDialog.Accepted
+        remote_file = picker.selected_file() if accepted else None
+        size = picker.selected_size() if accepted else 0
+        # 后台列表读取结束后再释放对话框
+        if finished:
+            picker.deleteLater()
+        else:
+            task.signals.finished.connect(picker.deleteLater)
+        return remote_file, size
 
     def save_file_content(self):
         """
@@ -155,9 +314,9 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
             self.ui_start.textEdit.hide()
             self.ui_start.saveButton.hide()
 
-        task = Worker("save", self.connection_manager, file_content, self.file_name)
+        task = SaveJob(self.edit_session.connection_manager, file_content, self.file_name)
         task.signals.finished.connect(save_the_pop_up)  # 连接信号和槽函数
-        QThreadPool.globalInstance().start(task)
+        self.edit_session.start(task)
 
     def upload_file(self):
         """
@@ -173,15 +332,38 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
             remote_file, _ = QInputDialog.getText(self, "远程文件路径", "请输入远程服务器上保存文件的路径",
                                                   text=current_remote_path)
             if remote_file:
-                def upload_back(result):
-                    if result:
-                        QMessageBox.information(self, "成功!", "文件保存成功", QMessageBox.Ok)
-                    else:
-                        QMessageBox.warning(self, "错误", "文件保存失败！", QMessageBox.Ok)
+                # 先列出远程目录，同名文件比本地文件短时（上次上传中断）询问是否续传
+                listing = ListJob(self.connection_manager, remote_file)
+                name = os.path.basename(local_file)
+
+                def listed(entries):
+                    remote_size = next((attr.st_size for attr in entries or [] if attr.filename == name), 0)
+                    self.start_upload(local_file, remote_file,
+                                      self.ask_resume(remote_size, os.path.getsize(local_file)))
+
+                listing.signals.finished.connect(listed)
+                self.session.start(listing)
 
-                task = Worker("put", self.connection_manager, local_file, remote_file)
-                task.signals.finished.connect(upload_back)  # 连接信号和槽函数
-                QThreadPool.globalInstance().start(task)
+    def start_upload(self, local_file, remote_file, resume):
+        """
+        在后台上传文件，并在结束后提示结果。
+        """
+        task = TransferJob(self.connection_manager, "put", local_file, remote_file, resume=resume)
+        progress = self.transfer_progress(task, f"正在上传 {local_file}")
+
+        def upload_back(result):
+            cancelled = task.cancel_event.is_set()
+            progress.canceled.disconnect()
+            progress.close()
+            if cancelled:
+                QMessageBox.information(self, "提示", "已取消上传", QMessageBox.Ok)
+            elif result:
+                QMessageBox.information(self, "成功!", "文件保存成功", QMessageBox.Ok)
+            else:
+                QMessageBox.warning(self, "错误", "文件保存失败！", QMessageBox.Ok)
+
+        task.signals.finished.connect(upload_back)  # 连接信号和槽函数
+        self.session.start(task)
 
     def download_file(self):
         """
@@ -191,50 +373,220 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
             QMessageBox.warning(self, "错误", "请先连接！", QMessageBox.Ok)
             return
 
-        current_remote_path = self.connection_manager.current_directory  # 获取当前远程路径
-
         # 显示当前路径的文件供选择
-        files_in_path = self.connection_manager.list_files(current_remote_path)
-        remote_file, ok = QtWidgets.QInputDialog.getItem(self, "选择文件", "选择要下载的文件", files_in_path,
-                                                         editable=False)
-        if remote_file and ok:
-            local_file, _ = QFileDialog.getSaveFileName(self, "保存文件", remote_file)
+        remote_file, size = self.choose_remote_file("选择文件", "选择要下载的文件")
+        if remote_file:
+            local_file, _ = QFileDialog.getSaveFileName(self, "保存文件", posixpath.basename(remote_file))
             if local_file:
+                # 本地已有比远程文件短的同名文件（上次下载中断）时询问是否续传
+                local_size = os.path.getsize(local_file) if os.path.isfile(local_file) else 0
+                resume = self.ask_resume(local_size, size)
+                task = TransferJob(self.connection_manager, "get", remote_file, local_file, resume=resume)
+                progress = self.transfer_progress(task, f"正在下载 {remote_file}")
+
                 def download_back(result):
-                    if result:
+                    cancelled = task.cancel_event.is_set()
+                    progress.canceled.disconnect()
+                    progress.close()
+                    if cancelled:
+                        QMessageBox.information(self, "提示", "已取消下载", QMessageBox.Ok)
+                    elif result:
                         QMessageBox.information(self, "成功!", "文件下载成功", QMessageBox.Ok)
                     else:
                         QMessageBox.warning(self, "错误", "文件下载失败！", QMessageBox.Ok)
 
-                task = Worker("push", self.connection_manager, remote_file, local_file)
                 task.signals.finished.connect(download_back)  # 连接信号和槽函数
-                QThreadPool.globalInstance().start(task)
+                self.session.start(task)
+
+    def upload_directory(self):
+        """
+        将本地目录同步到远程服务器，只上传新增或变化的文件
+        """
+        if not self.connected:
+            QMessageBox.warning(self, "错误", "请先连接！", QMessageBox.Ok)
+            return
+
+        local_dir = QFileDialog.getExistingDirectory(self, "选择要上传的目录")
+        if local_dir:
+            current_remote_path = self.connection_manager.current_directory  # 获取当前远程路径
+            remote_dir, _ = QInputDialog.getText(self, "远程目录路径", "请输入远程服务器上保存目录的路径",
+                                                 text=current_remote_path)
+            if remote_dir:
+                self.start_directory_sync("put", local_dir, remote_dir, f"正在上传目录 {local_dir}")
+
+    def download_directory(self):
+        """
+        将远程目录同步到本地，只下载新增或变化的文件
+        """
+        if not self.connected:
+            QMessageBox.warning(self, "错误", "请先连接！", QMessageBox.Ok)
+            return
+
+        current_remote_path = self.connection_manager.current_directory  # 获取当前远程路径
+        remote_dir, ok = QInputDialog.getText(self, "远程目录路径", "请输入要下载的远程目录",
+                                              text=current_remote_path)
+        if remote_dir and ok:
+            local_dir = QFileDialog.getExistingDirectory(self, "选择保存到的本地目录")
+            if local_dir:
+                self.start_directory_sync("get", remote_dir, local_dir, f"正在下载目录 {remote_dir}")
+
+    def start_directory_sync(self, direction, source, target, label):
+        """
+        在后台执行目录同步，并在结束后提示传输和跳过的文件数量。
+        """
+        use_hash = QMessageBox.question(
+            self, "目录同步", "是否按文件内容(sha256)比较？\n选择否则只比较大小和修改时间。",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No) == QMessageBox.Yes
+        task = TransferJob(self.connection_manager, direction, source, target, directory=True, use_hash=use_hash)
+        progress = self.transfer_progress(task, label)
+
+        def sync_back(result):
+            cancelled = task.cancel_event.is_set()
+            progress.canceled.disconnect()
+            progress.close()
+            if cancelled:
+                QMessageBox.information(self, "提示", "已取消同步", QMessageBox.Ok)
+            elif result is None:
+                QMessageBox.warning(self, "错误", "目录同步失败！", QMessageBox.Ok)
+            elif result["failed"]:
+                QMessageBox.warning(self, "错误", f"传输{result['transferred']}个文件，跳过{result['skipped']}个，"
+                                                f"{len(result['failed'])}个失败", QMessageBox.Ok)
+            else:
+                QMessageBox.information(self, "成功!", f"传输{result['transferred']}个文件，"
+                                                     f"跳过{result['skipped']}个未变化的文件", QMessageBox.Ok)
+
+        task.signals.finished.connect(sync_back)  # 连接信号和槽函数
+        self.session.start(task)
+
+    def ask_resume(self, target_size, source_size):
+        """
+        目标文件已存在且比源文件短时询问是否续传，返回是否续传。
+        续传前会校验已有部分与源文件开头一致，不一致时仍然从头传输。
+        """
+        if not 0 < target_size < source_size:
+            return False
+        return QMessageBox.question(
+            self, "断点续传",
+            f"目标文件已存在（{target_size / 1048576:.1f} MB / {source_size / 1048576:.1f} MB），"
+            f"是否从已有部分之后继续传输？\n选择否则重新传输整个文件。",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes) == QMessageBox.Yes
+
+    def transfer_progress(self, task, label):
+        """
+        创建文件传输的进度对话框，取消按钮会取消传输任务。
+        """
+        progress = QProgressDialog(label, "取消", 0, 1000, self)
+        progress.setWindowTitle("文件传输")
+        progress.setMinimumDuration(500)  # 很快完成的传输不显示进度框
+        progress.setValue(0)
+
+        def update(transferred, total):
+            if total:
+                progress.setValue(int(transferred * 1000 / total))
+                progress.setLabelText(f"{label}\n{transferred / 1048576:.1f} MB / {total / 1048576:.1f} MB")
+
+        task.signals.progress.connect(update)
+        progress.canceled.connect(task.cancel)
+        return progress
 
     def execute_command(self):
         """
          执行命令，将命令发送到远程服务器执行，并显示执行结果。
         """
         command = self.ui_start.command.text()
+        session = self.session
+        if session is None:
+            return
         self.ui_start.command.clear()
+        self.history.add(session.title, command)
+        self.recall.reset()
 
-        # result = self.connection_manager.execute_remote_command(command)
         def update_result(result):
-            if result:
-                if result == 'clear':
-                    self.ui_start.show.clear()
-                    result = ''
-                self.ui_start.show.append(result)
-
-        task = Worker("shell", self.connection_manager, command)
+            session.running_commands -= 1
+            if result == 'clear':
+                session.console.clear()
+            # 命令可能切换了目录或修改了文件，在后台更新补全索引
+            self.completer.prefetch(session)
+
+        # 输出写入发出命令的会话的标签页，切换标签页不影响
+        session.running_commands += 1
+        task = CommandJob(session.connection_manager, command)
+        task.signals.output.connect(session.console.append)
         task.signals.finished.connect(update_result)
-        QThreadPool.globalInstance().start(task)
+        session.start(task)
+
+    def search_history(self):
+        """
+        查找当前主机执行过的命令，选中的命令填入命令输入框。
+        """
+        session = self.session
+        if session is None:
+            return
+        dialog = HistorySearchDialog(self, self.history, session.title, self.ui_start.command.text())
+        if dialog.exec_() == QtWidgets.QDialog.Accepted and dialog.selected is not None:
+            self.ui_start.command.setText(dialog.selected)
+            self.recall.reset()
 
     def clear_command(self):
         """
-        清空命令输入框。
+        有命令正在执行时中断该命令，否则清空命令输入框。
         """
+        session = self.session
+        if session is not None and session.running_commands > 0:
+            session.connection_manager.interrupt_command()
+            return
+        if session is not None and session.tail is not None:
+            self.stop_follow()
+            return
         self.ui_start.command.clear()
 
+    def follow_file(self):
+        """
+        选择远程文件并持续显示其新增的内容，可以只显示包含指定内容的行，过滤在远程完成。
+        """
+        session = self.session
+        if session is None:
+            return
+        if session.tail is not None:
+            QMessageBox.warning(self, "错误", f"正在跟踪 {session.tail.remote_file}，请先停止跟踪！", QMessageBox.Ok)
+            return
+        remote_file, _ = self.choose_remote_file("跟踪文件", "选择要跟踪的文件")
+        if not remote_file:
+            return
+        pattern, ok = QInputDialog.getText(self, "过滤", "只显示包含以下内容的行（留空显示全部，/…/表示正则表达式）：")
+        if not ok:
+            return
+        regex = len(pattern) > 2 and pattern.startswith("/") and pattern.endswith("/")
+        if regex:
+            pattern = pattern[1:-1]
+
+        tail = RemoteTail(session.connection_manager, remote_file, pattern, regex)
+
+        # 会话关闭时session.tail先被清空，之后才到达的输出不再显示
+        def show(text):
+            if session.tail is tail:
+                session.console.append(text)
+                tail.consumed(len(text))  # 归还额度，后台继续读取
+
+        def stopped(reason):
+            if session.tail is tail:
+                session.tail = None
+                session.console.append(f"\n[{reason}：{remote_file}]\n")
+
+        tail.output.connect(show)
+        tail.stopped.connect(stopped)
+        session.tail = tail
+        session.console.append(f"\n[开始跟踪 {remote_file}{'，过滤：' + pattern if pattern else ''}]\n")
+        tail.start()
+
+    def stop_follow(self):
+        """
+        停止跟踪当前会话中的远程文件。
+        """
+        session = self.session
+        if session is not None and session.tail is not None:
+            session.tail.stop()
+
     def lianjie(self):
         """
         连接按钮点击事件，尝试连接到远程服务器。
@@ -243,45 +595,92 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         username = self.ui_start.username_edit.text()
         password = self.ui_start.password_edit.text()
 
-        try:
-            if self.connection_manager.connect(ip, username, password):
-                success_message = "连接成功!"
-                QMessageBox.information(self, "成功!", success_message, QMessageBox.Ok)
-                if self.ui_start.checkBox.isChecked():
-                    self.ui_start.listWidget.addItem(f"{ip} {username} {password}")
-                    self.save_info(load_info=False)  # 只在勾选保存时保存连接信息
-                self.setup_after_connection()
-            else:
-                QMessageBox.warning(self, "错误", "连接失败！", QMessageBox.Ok)
-        except Exception as e:
-            self.log.error(e)
-            QMessageBox.warning(self, "错误", f"连接失败！请检查参数是否正确+{e}", QMessageBox.Ok)
+        # 每个连接是一个新的会话，在该会话自己的线程池中连接，界面不会因为主机不可达而卡住
+        self.ui_start.login_btn.setEnabled(False)
+        session = Session(self.log, self)
+        session.title = f"{username}@{ip}"
+        task = ConnectJob(session.connection_manager, ip, username, password)
+        progress = QProgressDialog(f"正在连接 {ip} …", "取消", 0, 0, self)
+        progress.setWindowTitle("连接")
+        progress.setMinimumDuration(300)  # 很快连上时不显示
+        progress.setValue(0)
+
+        def connect_back(result):
+            cancelled = task.cancel_event.is_set()
+            progress.canceled.disconnect()
+            progress.close()
+            self.ui_start.login_btn.setEnabled(True)
+            try:
+                if result:
+                    session.state_changed.connect(lambda state: self.show_connection_state(session, state))
+                    session.open_transcript()
+                    self.tabs.add_session(session)
+                    self.completer.prefetch(session)
+                    success_message = "连接成功!"
+                    QMessageBox.information(self, "成功!", success_message, QMessageBox.Ok)
+                    if self.ui_start.checkBox.isChecked():
+                        self.save_info()  # 只在勾选保存时保存连接信息
+                    self.setup_after_connection()
+                    return
+                session.close()
+                if not cancelled:
+                    reason = session.connection_manager.last_error or ""
+                    QMessageBox.warning(self, "错误", f"连接失败！{reason}", QMessageBox.Ok)
+            except Exception as e:
+                self.log.error(e)
+                QMessageBox.warning(self, "错误", f"连接失败！请检查参数是否正确+{e}", QMessageBox.Ok)
+
+        progress.canceled.connect(task.cancel)
+        task.signals.finished.connect(connect_back)  # 连接信号和槽函数
+        session.start(task)
+
+    def show_connection_state(self, session, state):
+        """
+        在会话的标签页中显示自动重连的状态，重连失败时标记该标签页。
+        """
+        if state == STATE_RECONNECTING:
+            session.console.append("\n[连接已中断，正在自动重连…]\n")
+        elif state == STATE_RECONNECTED:
+            session.console.append("[已重新连接]\n")
+        elif state == STATE_LOST:
+            session.console.append("[连接已中断，自动重连失败]\n")
+            self.tabs.set_session_title(session, f"{session.title}（已断开）")
+            QMessageBox.warning(self, "错误", f"{session.title} 连接已中断，自动重连失败，请重新连接！", QMessageBox.Ok)
+
+    def close_session(self, session):
+        """
+        关闭会话：断开其连接并移除标签页，没有会话时恢复到未连接的界面。
+        """
+        if session is None:
+            return
+        if session is self.edit_session:
+            if self.is_editing:
+                self.show_file_content()  # 关闭该会话打开的编辑器或查看器
+            self.ui_start.saveButton.hide()
+            self.edit_session = None
+        self.tabs.remove_session(session)
+        if not self.tabs.count():
+            self.setup_before_connection()
 
     def tuichu(self):
         """
-        退出按钮点击事件，断开与远程服务器的连接。
+        退出按钮点击事件，断开当前会话的连接。
         """
         if not self.connected:
             QMessageBox.warning(self, "错误", "请先连接！", QMessageBox.Ok)
             return
 
-        self.connection_manager.disconnect()
-        self.setup_before_connection()
-
+        self.close_session(self.session)
         QMessageBox.information(self, "成功!", "成功退出连接！", QMessageBox.Ok)
-        self.connected = False
 
-    @QtCore.pyqtSlot(QtWidgets.QListWidgetItem)
-    def show_info(self, item):
+    @QtCore.pyqtSlot(QtCore.QModelIndex)
+    def show_info(self, index):
         """
         展示已保存的服务器信息，并自动填充到对应的输入框中。
         """
-        selected_text = item.text()
-        parts = selected_text.split()
-        if len(parts) >= 3:
-            ip = parts[0]
-            username = parts[1]
-            password = parts[2]
+        host = self.host_model.data(index, HostRole)
+        if host is not None:
+            ip, username, password = host
             self.ui_start.ip_edit.setText(ip)
             self.ui_start.username_edit.setText(username)
             self.ui_start.password_edit.setText(password)
@@ -294,12 +693,14 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         username = self.ui_start.username_edit.text()
         password = self.ui_start.password_edit.text()
 
-        saved_info = self.saved_info_manager.get_saved_info()
-        if (ip, username, password) in saved_info:
+        if self.saved_info_manager is None:
+            QMessageBox.warning(self, "警告", "正在加载已保存的连接信息，请稍后再试！", QMessageBox.Ok)
+            return
+        # 同一主机和用户只保存一条，由数据库的唯一索引判断是否已存在
+        if not self.saved_info_manager.add_saved_info(ip, username, password):
             QMessageBox.warning(self, "警告", "该连接信息已存在！", QMessageBox.Ok)
             return
 
-        self.saved_info_manager.add_saved_info(ip, username, password)
         if load_info:
             self.load_saved_info()
 
@@ -307,15 +708,21 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         """
         加载保存的连接信息，并更新界面上的连接信息列表。
         """
-        try:
-            self.ui_start.listWidget.clear()
+        if self.saved_info_manager is not None:
+            self.host_model.reload()
+
+    def saved_info_loaded(self, result):
+        """
+        后台打开数据库并读取主机列表后，显示主机列表。
+        """
+        self.saved_info_manager, rows = result
+        self.host_model.saved_info_manager = self.saved_info_manager
+        self.host_model.reload(rows)
+        # 窗口显示后在后台预先导入paramiko，第一次连接时不用再等待
+        QtCore.QTimer.singleShot(PRELOAD_DELAY, self.preload_modules)
 
-            saved_info = self.saved_info_manager.get_saved_info()
-            for ip, username, password in saved_info:
-                info = f"{ip} {username} {password}"
-                self.ui_start.listWidget.addItem(info)
-        except FileNotFoundError:
-            self.log.error(f"没有找到saved_info.db文件，造成无法读取文件")
+    def preload_modules(self):
+        threading.Thread(target=importlib.import_module, args=("connection",), name="preload", daemon=True).start()
 
     @QtCore.pyqtSlot(QtCore.QPoint)
     def show_context_menu(self, pos):
@@ -323,50 +730,105 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         右键菜单事件，显示右键菜单，并处理相应的操作。
         """
         menu = QMenu(self)
+        broadcast_action = menu.addAction("批量执行命令")
+        import_action = menu.addAction("导入主机清单")
         delete_action = menu.addAction("删除")
-        action = menu.exec_(self.ui_start.listWidget.mapToGlobal(pos))
+        action = menu.exec_(self.ui_start.host_list.mapToGlobal(pos))
         if action == delete_action:
             self.delete_item()
+        elif action == broadcast_action:
+            self.broadcast_command()
+        elif action == import_action:
+            self.import_hosts()
+
+    def import_hosts(self):
+        """
+        从CSV或JSON主机清单批量导入连接信息。
+        """
+        if self.saved_info_manager is None:
+            QMessageBox.warning(self, "警告", "正在加载已保存的连接信息，请稍后再试！", QMessageBox.Ok)
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "选择主机清单", "", "主机清单 (*.csv *.json);;所有文件 (*)")
+        if not path:
+            return
+        count = self.saved_info_manager.import_file(path)
+        self.load_saved_info()
+        QMessageBox.information(self, "导入完成", f"导入或更新了{count}条连接信息", QMessageBox.Ok)
+
+    def broadcast_command(self):
+        """
+        在选中的已保存主机上并发执行同一条命令。
+        """
+        hosts = self.host_model.hosts(self.ui_start.host_list.selectionModel().selectedIndexes())
+        if not hosts:
+            QMessageBox.warning(self, "错误", "请先选择要执行命令的主机！", QMessageBox.Ok)
+            return
+        from broadcast_dialog import BroadcastDialog
+
+        dialog = BroadcastDialog(self, self.log, hosts)
+        dialog.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        dialog.show()
+
+    def show_stats(self):
+        """
+        打开运行统计面板，已打开时切换到前台。
+        """
+        if self.stats_dialog is None:
+            from stats_dialog import StatsDialog
+
+            self.stats_dialog = StatsDialog(self, self.log)
+            self.stats_dialog.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+            self.stats_dialog.destroyed.connect(lambda: setattr(self, "stats_dialog", None))
+        self.stats_dialog.show()
+        self.stats_dialog.raise_()
 
     def delete_item(self):
         """
         删除选择的项目，并从数据库中删除对应的连接信息。
         """
-        selected_items = self.ui_start.listWidget.selectedItems()
+        selected_indexes = self.ui_start.host_list.selectionModel().selectedIndexes()
         try:
-            if selected_items:
+            if selected_indexes:
                 reply = QMessageBox.question(
                     self, "删除选择的项目",
-                    f"确认要删除选择的项目吗？",
+                    f"确认要删除选择的{len(selected_indexes)}个项目吗？",
                     QMessageBox.Yes | QMessageBox.No,
                     QMessageBox.No
                 )
                 if reply == QMessageBox.Yes:
-                    for item in selected_items:
-                        info = item.text().split()
-                        if len(info) >= 3:
-                            ip = info[0]
-                            username = info[1]
-                            password = info[2]
-                            self.saved_info_manager.remove_saved_info(ip, username, password)
-                            self.log.info(f"删除选择的项目：{item.text()}")
-                        else:
-                            self.log.warning(f"无法删除项目：{item.text()}，部分信息缺失")
-            self.load_saved_info()
+                    for index in selected_indexes:
+                        self.log.info(f"删除选择的项目：{index.data()}")
+                    self.host_model.remove_rows(selected_indexes)
         except Exception as e:
             self.log.error(f"删除报错: {e}")
 
     def setup_after_connection(self):
         """
-        连接成功后的界面设置，禁用一些输入框和按钮，并记录原始的文本框内容。
+        连接成功后的界面设置。
         """
         self.connected = True
+        self.hide_login_form()
+
+    def setup_before_connection(self):
+        """
+        所有会话都断开后的界面设置。
+        """
+        self.connected = False
+        self.show_login_form()
+
+    def hide_login_form(self):
+        """
+        隐藏登录表单，禁用一些输入框和按钮，并记录原始的文本框内容。
+        """
+        if self.ui_start.username_edit.isHidden():
+            return
         self.ui_start.login_btn.setEnabled(False)
         self.ui_start.ip_edit.setDisabled(True)
         self.ui_start.username_edit.hide()
         self.ui_start.password_edit.hide()
         self.ui_start.checkBox.hide()
-        self.ui_start.listWidget.hide()
+        self.ui_start.host_filter.hide()
+        self.ui_start.host_list.hide()
 
         self.user_text = self.ui_start.user.text()
         self.pwd_text = self.ui_start.pwd.text()
@@ -375,11 +837,12 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         self.ui_start.pwd.clear()
         self.ui_start.save_server.clear()
 
-    def setup_before_connection(self):
+    def show_login_form(self):
         """
-        连接断开后的界面设置，恢复输入框和按钮的状态，并还原文本框内容。
+        显示登录表单（也用于新建会话），恢复输入框和按钮的状态，并还原文本框内容。
         """
-        self.connected = False
+        if not self.ui_start.username_edit.isHidden():
+            return
         self.ui_start.login_btn.setEnabled(True)
         self.ui_start.ip_edit.setDisabled(False)
         self.ui_start.ip_edit.clear()
@@ -388,8 +851,8 @@ class Mainwindow(Ui_Form, QtWidgets.QMainWindow):
         self.ui_start.password_edit.show()
         self.ui_start.password_edit.clear()
         self.ui_start.checkBox.show()
-        self.ui_start.listWidget.show()
-        self.ui_start.show.clear()
+        self.ui_start.host_filter.show()
+        self.ui_start.host_list.show()
 
         self.ui_start.user.setText(self.user_text)  # 还原用户文本框的内容
         self.ui_start.pwd.setText(self.pwd_text)  # 还原密码文本框的内容
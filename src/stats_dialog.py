@@ -0,0 +1,83 @@
+from PyQt5 import QtCore, QtWidgets
+
+from metrics import Histogram, registry
+
+REFRESH_INTERVAL = 1000  # 刷新间隔（毫秒）
+COLUMNS = ("指标", "次数/当前值", "平均", "p50", "p95", "p99")
+
+
+def format_metric(name, value):
+    """耗时显示为毫秒，速度显示为MB/s，字节数显示为MB"""
+    if value is None:
+        return ""
+    if name.endswith("_seconds"):
+        return f"{value * 1000:.1f} ms"
+    if name.endswith("_bytes_per_second"):
+        return f"{value / 1024 / 1024:.2f} MB/s"
+    if "bytes" in name:
+        return f"{value / 1024 / 1024:.2f} MB"
+    return str(value)
+
+
+class StatsDialog(QtWidgets.QDialog):
+    """实时显示进程内的指标，可以导出为Prometheus文本文件"""
+
+    def __init__(self, parent, log):
+        super().__init__(parent)
+        self.log = log
+        self.setWindowTitle("运行统计")
+        self.resize(720, 360)
+
+        self.table = QtWidgets.QTableWidget(0, len(COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        export_button = QtWidgets.QPushButton("导出Prometheus文本", self)
+        export_button.clicked.connect(self.export)
+
+        buttons = QtWidgets.QHBoxLayout()
+        buttons.addStretch(1)
+        buttons.addWidget(export_button)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+
+        # 只在面板打开时定时读取，关闭后不产生任何开销
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(REFRESH_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+        self.refresh()
+
+    def refresh(self):
+        metrics = registry.collect()
+        self.table.setRowCount(len(metrics))
+        for row, metric in enumerate(metrics):
+            if isinstance(metric, Histogram):
+                snapshot = metric.snapshot()
+                _, total, count = snapshot
+                values = [count, total / count if count else None]
+                values += [metric.quantile(q, snapshot) for q in (0.5, 0.95, 0.99)]
+                cells = [str(count)] + [format_metric(metric.name, value) for value in values[1:]]
+            else:
+                cells = [format_metric(metric.name, metric.get()), "", "", "", ""]
+            for column, text in enumerate([metric.name] + cells):
+                item = self.table.item(row, column)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem()
+                    self.table.setItem(row, column, item)
+                item.setText(text)
+                if column == 0:
+                    item.setToolTip(metric.help)
+
+    def export(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "导出指标", "shell.prom", "Prometheus文本 (*.prom);;所有文件 (*)")
+        if not path:
+            return
+        try:
+            registry.write_prometheus(path)
+            self.log.info(f"指标已导出到{path}")
+        except Exception as e:
+            self.log.error(f"导出指标失败：{str(e)}")
+            QtWidgets.QMessageBox.warning(self, "错误", f"导出指标失败：{str(e)}", QtWidgets.QMessageBox.Ok)
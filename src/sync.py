@@ -0,0 +1,218 @@
+import hashlib
+import os
+import posixpath
+import shlex
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from transfer import SFTPTransfer, Progress, TransferCancelled
+
+SYNC_WORKERS = 4  # 同时传输的文件数量
+HASH_BATCH = 200  # 每次远程sha256sum校验的文件数量
+
+
+class DirectorySync:
+    """
+    目录同步：遍历本地和远程目录树，按大小和修改时间（可选按sha256）找出新增或变化的文件，
+    再用有限数量的线程通过同一个SSH连接并发传输，未变化的文件直接跳过。
+    resume为True时，上次中断留下的比源文件短的目标文件校验开头部分一致后从已有部分之后续传。
+    """
+
+    def __init__(self, connection_manager, log, use_hash=False, workers=SYNC_WORKERS,
+                 progress=None, cancel_event=None, resume=False):
+        self.connection_manager = connection_manager
+        self.log = log
+        self.use_hash = use_hash
+        self.workers = workers
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.resume = resume
+        self._progress_lock = threading.Lock()
+
+    def upload(self, local_dir, remote_dir):
+        """把本地目录同步到远程目录，返回同步结果统计"""
+        local_files = self.walk_local(local_dir)
+        remote_files = self.walk_remote(remote_dir)
+        changed = [path for path, (size, mtime) in local_files.items()
+                   if path not in remote_files or remote_files[path] != (size, mtime)]
+        if self.use_hash:
+            changed, same = self._split_same_hash(local_dir, remote_dir, changed, local_files, remote_files)
+
+            def touch(sftp):
+                for path in same:
+                    mtime = local_files[path][1]
+                    sftp.utime(posixpath.join(remote_dir, path), (mtime, mtime))
+
+            self.connection_manager.with_sftp(touch)
+
+        self._make_remote_dirs(remote_dir, changed)
+
+        def send(sftp, path):
+            local_file = os.path.join(local_dir, *path.split("/"))
+            remote_file = posixpath.join(remote_dir, path)
+            SFTPTransfer(sftp, self.log, self._file_progress(), self.cancel_event).upload(
+                local_file, remote_file, resume=self.resume)
+            mtime = local_files[path][1]
+            # 远程修改时间与本地保持一致，下次同步时据此判断文件未变化
+            sftp.utime(remote_file, (mtime, mtime))
+
+        return self._run(changed, local_files, send, len(local_files))
+
+    def download(self, remote_dir, local_dir):
+        """把远程目录同步到本地目录，返回同步结果统计"""
+        remote_files = self.walk_remote(remote_dir)
+        local_files = self.walk_local(local_dir) if os.path.isdir(local_dir) else {}
+        changed = [path for path, (size, mtime) in remote_files.items()
+                   if path not in local_files or local_files[path] != (size, mtime)]
+        if self.use_hash:
+            changed, same = self._split_same_hash(local_dir, remote_dir, changed, local_files, remote_files)
+            for path in same:
+                mtime = remote_files[path][1]
+                os.utime(os.path.join(local_dir, *path.split("/")), (mtime, mtime))
+
+        for path in changed:
+            os.makedirs(os.path.dirname(os.path.join(local_dir, *path.split("/"))), exist_ok=True)
+
+        def receive(sftp, path):
+            local_file = os.path.join(local_dir, *path.split("/"))
+            remote_file = posixpath.join(remote_dir, path)
+            SFTPTransfer(sftp, self.log, self._file_progress(), self.cancel_event).download(
+                remote_file, local_file, resume=self.resume)
+            mtime = remote_files[path][1]
+            os.utime(local_file, (mtime, mtime))
+
+        return self._run(changed, remote_files, receive, len(remote_files))
+
+    def walk_local(self, local_dir):
+        """返回 {相对路径: (大小, 修改时间)}，相对路径统一使用/分隔"""
+        files = {}
+        for root, dirs, names in os.walk(local_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError as e:
+                    self.log.warning(f"无法读取本地文件信息：{path} {str(e)}")
+                    continue
+                relative = os.path.relpath(path, local_dir).replace(os.sep, "/")
+                files[relative] = (st.st_size, int(st.st_mtime))
+        return files
+
+    def walk_remote(self, remote_dir):
+        """逐层并发列出远程目录，返回 {相对路径: (大小, 修改时间)}，远程目录不存在时返回空"""
+        files = {}
+
+        def list_dir(relative):
+            path = posixpath.join(remote_dir, relative) if relative else remote_dir
+            try:
+                return relative, self.connection_manager.with_sftp(lambda sftp: sftp.listdir_attr(path))
+            except IOError:
+                return relative, []
+
+        level = [""]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while level:
+                self._check_cancelled()
+                next_level = []
+                for relative, entries in executor.map(list_dir, level):
+                    for attr in entries:
+                        child = posixpath.join(relative, attr.filename) if relative else attr.filename
+                        if stat.S_ISDIR(attr.st_mode):
+                            next_level.append(child)
+                        elif stat.S_ISREG(attr.st_mode):
+                            files[child] = (attr.st_size, attr.st_mtime)
+                level = next_level
+        return files
+
+    def _make_remote_dirs(self, remote_dir, paths):
+        directories = {posixpath.dirname(path) for path in paths}
+        needed = set()
+        for directory in directories:
+            while directory:
+                needed.add(directory)
+                directory = posixpath.dirname(directory)
+
+        def make_dirs(sftp):
+            for directory in [""] + sorted(needed):
+                path = posixpath.join(remote_dir, directory) if directory else remote_dir
+                try:
+                    sftp.stat(path)
+                except IOError:
+                    sftp.mkdir(path)
+
+        self.connection_manager.with_sftp(make_dirs)
+
+    def _split_same_hash(self, local_dir, remote_dir, changed, local_files, remote_files):
+        """
+        大小相同但修改时间不同的文件再比较sha256，内容相同则不传输，只同步修改时间。
+        返回 (需要传输的文件, 内容相同的文件)
+        """
+        candidates = [path for path in changed
+                      if path in local_files and path in remote_files
+                      and local_files[path][0] == remote_files[path][0]]
+        remote_hashes = self._remote_hashes(remote_dir, candidates)
+        same = set()
+        for path in candidates:
+            if remote_hashes.get(path) == self._local_hash(os.path.join(local_dir, *path.split("/"))):
+                same.add(path)
+        return [path for path in changed if path not in same], same
+
+    def _remote_hashes(self, remote_dir, paths):
+        hashes = {}
+        for start in range(0, len(paths), HASH_BATCH):
+            self._check_cancelled()
+            batch = paths[start:start + HASH_BATCH]
+            command = f"cd {shlex.quote(remote_dir)} && sha256sum -- " + " ".join(shlex.quote(p) for p in batch)
+            stdin, stdout, stderr = self.connection_manager.exec_command(command)
+            for line in stdout.read().decode("utf-8", errors="replace").splitlines():
+                digest, _, path = line.partition("  ")
+                if path:
+                    hashes[path] = digest
+        return hashes
+
+    @staticmethod
+    def _local_hash(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _run(self, changed, files, transfer, total):
+        """用有限的线程池传输变化的文件"""
+        self.total_progress = Progress(self.progress, sum(files[path][0] for path in changed))
+        failed = []
+
+        def task(path):
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                return
+            try:
+                self.connection_manager.with_sftp(lambda sftp: transfer(sftp, path))
+            except TransferCancelled:
+                pass
+            except Exception as e:
+                self.log.error(f"同步文件失败：{path} {str(e)}")
+                failed.append(path)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(task, changed))
+        self._check_cancelled()
+        self.total_progress.finish()
+        return {"total": total, "transferred": len(changed) - len(failed),
+                "skipped": total - len(changed), "failed": failed}
+
+    def _file_progress(self):
+        """单个文件的进度回调，折算成增量累加到总进度上"""
+        last = [0]
+
+        def callback(transferred, total):
+            with self._progress_lock:
+                self.total_progress.advance(transferred - last[0])
+            last[0] = transferred
+
+        return callback
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise TransferCancelled()
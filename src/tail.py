@@ -0,0 +1,188 @@
+"""
+跟踪远程文件新增的内容（类似tail -F），在一个单独的SSH通道中持续读取，输出到会话的输出框。
+
+- 过滤在远程用grep完成，不匹配的行不经过网络；
+- 流量控制：已发给界面但还没有处理的内容超过MAX_PENDING时停止读取，SSH接收窗口随之用完，
+  远程的tail被阻塞，突发的大量日志不会占满界面和内存；
+- 记录已读取到的文件偏移和文件的inode，连接中断并自动重连后从该位置继续，不重复也不遗漏；
+  期间文件被轮转（inode变化）或截断时从新文件的开头开始。
+"""
+import codecs
+import shlex
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from metrics import BYTES_RECEIVED
+
+TAIL_LINES = 10  # 开始跟踪时先显示的最后几行
+TAIL_WINDOW = 256 * 1024  # 跟踪通道的SSH接收窗口（字节），不读取时远程最多再发送这么多
+MAX_PENDING = 256 * 1024  # 已发给界面但还没有显示的最大字符数
+READ_SIZE = 32768  # 每次从通道读取的字节数
+CHUNK_SIZE = 64 * 1024  # 通道中已有的数据合并后一次发给界面，减少信号数量
+RETRY_DELAY = 1  # 通道意外关闭后，重新打开前的等待时间（秒）
+MAX_RETRIES = 5  # 连续这么多次没能开始跟踪时停止
+
+
+class RemoteTail(QObject):
+    """
+    跟踪一个远程文件。pattern为None时显示全部新增内容，否则只显示包含pattern的行（regex为True时按grep -E的扩展正则匹配）。
+    output信号在后台线程中发出，界面显示后需要调用consumed()归还额度，否则读取会暂停。
+    """
+
+    output = pyqtSignal(str)
+    stopped = pyqtSignal(str)  # 停止跟踪时发出，参数为原因
+
+    def __init__(self, connection_manager, remote_file, pattern=None, regex=False, lines=TAIL_LINES, parent=None):
+        super().__init__(parent)
+        self.connection_manager = connection_manager
+        self.remote_file = remote_file
+        self.pattern = pattern or None
+        self.regex = regex
+        self.lines = lines
+        self.offset = None  # 已读取到的文件偏移，None表示还没有开始
+        self.inode = None  # 开始跟踪时文件的inode，用于发现文件被轮转
+        self.channel = None
+        self.pending = 0
+        self.credit = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="remote-tail", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """停止跟踪，关闭通道使阻塞中的读取立即返回"""
+        self.stop_event.set()
+        with self.credit:
+            self.credit.notify_all()
+        channel = self.channel
+        if channel is not None:
+            channel.close()
+
+    def consumed(self, size):
+        """界面已显示size个字符，归还相应的额度"""
+        with self.credit:
+            self.pending -= size
+            self.credit.notify_all()
+
+    def command(self):
+        """在远程执行的脚本：先输出起始偏移和文件的inode，再从该偏移开始跟踪（经过过滤）"""
+        path = shlex.quote(self.remote_file)
+        if self.offset is None:
+            start = f"o=$((s - $(tail -n {self.lines} {path} 2>/dev/null | wc -c)))"
+        else:
+            # inode变了说明文件已被轮转，文件比上次读到的位置短说明已被截断，都从头开始
+            start = f'o={self.offset}; [ "$i" != {shlex.quote(self.inode or "")} ] || [ "$s" -lt "$o" ] && o=0'
+        # ls -i是POSIX的，stat -c %i只有GNU coreutils支持；文件不存在时inode为0
+        script = (f"s=$( {{ wc -c < {path}; }} 2>/dev/null); s=$((s + 0)); "
+                  f"set -- $(ls -di {path} 2>/dev/null) 0; i=$1; {start}; echo \"$o $i\"; "
+                  f"tail -c +$((o + 1)) -F {path} 2>/dev/null")
+        if self.pattern is not None:
+            # -b在每行前输出该行相对起始位置的字节偏移，不匹配的行被跳过时也能知道读到了哪里
+            script += (f" | LC_ALL=C grep --line-buffered -a -b {'-E' if self.regex else '-F'} "
+                       f"-e {shlex.quote(self.pattern)}")
+        # 用户的登录shell不一定兼容sh语法
+        return f"sh -c {shlex.quote(script)}"
+
+    def run(self):
+        reason = "已停止跟踪"
+        retries = 0
+        while not self.stop_event.is_set():
+            started = False
+            try:
+                started, status = self._follow()
+            except Exception as e:
+                self.connection_manager.log.warning(f"跟踪远程文件{self.remote_file}时出现错误：{str(e)}")
+                status = None
+            if self.stop_event.is_set():
+                break
+            if status is not None:
+                reason = f"跟踪命令已结束（退出码{status}）"
+                break
+            retries = 0 if started else retries + 1
+            if retries >= MAX_RETRIES:
+                reason = "跟踪多次中断，已停止"
+                break
+            # 通道意外关闭（通常是连接中断）：等待自动重连后从上次的偏移继续
+            self._deliver(f"\n[跟踪中断，正在从第{self.offset or 0}字节处继续…]\n")
+            if self.stop_event.wait(RETRY_DELAY) or not self.connection_manager.reconnect():
+                reason = "连接已断开，停止跟踪"
+                break
+        self.channel = None
+        self.connection_manager.log.info(f"停止跟踪远程文件{self.remote_file}：{reason}")
+        self.stopped.emit(reason)
+
+    def _follow(self):
+        """
+        打开通道并读取到通道关闭，返回(远程命令是否已开始执行, 退出码)。
+        连接仍然正常而远程命令自己结束时退出码不为None，此时不再重试。
+        """
+        transport = self.connection_manager.ssh.get_transport()
+        channel = self.connection_manager.register_channel(transport.open_session(window_size=TAIL_WINDOW))
+        self.channel = channel
+        if self.stop_event.is_set():
+            channel.close()
+            return False, None
+        try:
+            channel.exec_command(self.command())
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            buffer = b""
+            start = None
+            while True:
+                data = channel.recv(READ_SIZE)
+                # 通道中已经到达的数据一起处理
+                while data and len(data) < CHUNK_SIZE and channel.recv_ready():
+                    more = channel.recv(READ_SIZE)
+                    if not more:
+                        break
+                    data += more
+                if not data:
+                    break
+                BYTES_RECEIVED.inc(len(data))
+                if start is None:
+                    buffer += data
+                    line, newline, data = buffer.partition(b"\n")
+                    if not newline:
+                        continue
+                    offset, _, inode = line.strip().partition(b" ")
+                    start = self.offset = int(offset or 0)
+                    self.inode = inode.decode()
+                    buffer = b""
+                    if not data:
+                        continue
+                if self.pattern is None:
+                    self.offset += len(data)
+                    self._deliver(decoder.decode(data))
+                else:
+                    buffer = self._deliver_lines(buffer + data, start)
+            started = start is not None
+            if self.stop_event.is_set():
+                return started, None
+            ended = transport.is_active() and channel.exit_status_ready()
+            return started, channel.recv_exit_status() if ended else None
+        finally:
+            channel.close()
+
+    def _deliver_lines(self, data, start):
+        """处理过滤后的输出（每行为"偏移:内容"），返回最后不完整的一行"""
+        *lines, rest = data.split(b"\n")
+        parts = []
+        for line in lines:
+            position, _, text = line.partition(b":")
+            parts.append(text.decode("utf-8", errors="replace") + "\n")
+            self.offset = start + int(position) + len(text) + 1
+        if parts:
+            self._deliver("".join(parts))
+        return rest
+
+    def _deliver(self, text):
+        """发给界面，未处理的内容太多时等待界面跟上"""
+        if not text:
+            return
+        with self.credit:
+            while self.pending >= MAX_PENDING and not self.stop_event.is_set():
+                self.credit.wait(0.5)
+            self.pending += len(text)
+        self.output.emit(text)
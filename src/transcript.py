@@ -0,0 +1,385 @@
+"""
+会话输出的磁盘记录：输出框只保留最近的若干行，完整的输出按块压缩后追加到log/sessions下的记录文件。
+与命令行的文本记录一样默认关闭，设置环境变量SHELL_TRANSCRIPT=1后才记录（见logger.py）。
+单个记录最多MAX_SIZE字节，超出后不再记录；每次新建记录时删除超过MAX_AGE天的记录，
+并从最旧的开始删除，直到目录中的记录总共不超过MAX_TOTAL_SIZE字节。
+
+- xxx.tsz：依次存放的zlib压缩块，每块压缩前约BLOCK_SIZE字节，在换行处切分；
+- xxx.idx：每块一条定长记录（块在原文中的偏移、在压缩文件中的偏移、第一行的行号、压缩后和压缩前的长度）。
+
+读取时按索引只解压需要的块，压缩文件通过mmap访问，查找逐块解压，几GB的记录也不需要整体读入内存。
+TranscriptReader提供与PagedRemoteFile相同的read/search/close接口，可以直接用PagedFileViewer查看。
+"""
+import atexit
+import bisect
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from array import array
+from collections import OrderedDict
+
+TRANSCRIPT_DIR = 'log/sessions'  # 会话记录文件所在的目录
+BLOCK_SIZE = 256 * 1024  # 每块压缩前的大小，块越大压缩率越高，读取一行需要解压的数据也越多
+FLUSH_INTERVAL = 5.0  # 不满一块的输出最多在内存中停留的时间（秒），之后把已完整的行写入磁盘
+COMPRESS_LEVEL = 1  # 压缩级别，输出量很大时写入线程也跟得上
+MAX_CACHED_BLOCKS = 8  # 每个读取器缓存的已解压块数
+SEARCH_THREADS = min(4, os.cpu_count() or 1)  # 查找时并行解压的线程数，zlib解压时不占用GIL
+SEARCH_AHEAD = 4 * SEARCH_THREADS  # 查找时预先解压的块数，找到后其余的丢弃
+# 块在原文中的偏移, 在压缩文件中的偏移, 第一行的行号, 压缩后长度, 压缩前长度
+INDEX_RECORD = struct.Struct("<QQQII")
+UNSAFE_CHARS = re.compile(r'[^\w.@-]')
+MAX_SIZE = 512 * 1024 * 1024  # 单个会话最多记录的输出（压缩前的字节数）
+MAX_TOTAL_SIZE = 1024 * 1024 * 1024  # 目录中所有记录文件的总大小上限（压缩后）
+MAX_AGE = 30  # 记录文件保留的天数
+
+
+class Transcript:
+    """
+    一个会话的输出记录。append()只把文本放入内存，由后台线程攒够一块后压缩写入，
+    尚未写入的部分（tail）同样可以读取和查找。
+    """
+
+    def __init__(self, log, name, directory=TRANSCRIPT_DIR, data_file=None):
+        self.log = log
+        self.name = name
+        self.lock = threading.Lock()
+        # 已写入块的索引，与.idx文件的内容一致
+        self.offsets = array('Q')
+        self.positions = array('Q')
+        self.first_lines = array('Q')
+        self.compressed_sizes = array('L')
+        self.written = 0  # 已写入块的原文总长度
+        self.written_lines = 0  # 已写入块中的换行数
+        self.tail = bytearray()
+        self.wakeup = threading.Event()
+        self.closed = threading.Event()
+        self.writer = None
+        self.full = False  # 已达到MAX_SIZE，之后的输出不再记录
+
+        if data_file is not None:
+            self.data_file = data_file
+            self.index_file = os.path.splitext(data_file)[0] + ".idx"
+            self._load_index()
+            return
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.data, self.index = self._create_files(directory, name)
+        self.directory = directory
+        self.writer = threading.Thread(target=self._write_loop, name="transcript", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def _create_files(self, directory, name):
+        """
+        以独占方式（O_EXCL）创建记录文件，文件名带随机后缀，
+        同一秒内打开的同名会话不会写到同一个文件，已存在的文件也不会被追加。
+        """
+        prefix = f"{UNSAFE_CHARS.sub('_', name)}_{time.strftime('%Y%m%d-%H%M%S')}"
+        while True:
+            base = os.path.join(directory, f"{prefix}_{uuid.uuid4().hex[:8]}")
+            try:
+                data = open(base + ".tsz", "xb")
+            except FileExistsError:
+                continue
+            try:
+                index = open(base + ".idx", "xb")
+            except FileExistsError:
+                data.close()
+                os.remove(base + ".tsz")
+                continue
+            except Exception:
+                data.close()
+                os.remove(base + ".tsz")
+                raise
+            self.data_file = base + ".tsz"
+            self.index_file = base + ".idx"
+            return data, index
+
+    @classmethod
+    def load(cls, log, data_file):
+        """打开以前保存的记录文件（只读）"""
+        return cls(log, os.path.basename(data_file), data_file=data_file)
+
+    def _load_index(self):
+        with open(self.index_file, "rb") as index:
+            data = index.read()
+        for record in INDEX_RECORD.iter_unpack(data[:len(data) - len(data) % INDEX_RECORD.size]):
+            self._add_block(*record)
+        if self.offsets:
+            reader = self.reader()
+            try:
+                self.written_lines = self.first_lines[-1] + reader._block(len(self.offsets) - 1).count(b"\n")
+            finally:
+                reader.close()
+        self.closed.set()
+
+    def _add_block(self, offset, position, first_line, compressed_size, size):
+        self.offsets.append(offset)
+        self.positions.append(position)
+        self.first_lines.append(first_line)
+        self.compressed_sizes.append(compressed_size)
+        self.written = offset + size
+
+    @property
+    def size(self):
+        with self.lock:
+            return self.written + len(self.tail)
+
+    def append(self, text):
+        """追加一段输出，立即返回"""
+        if not text or self.closed.is_set() or self.full:
+            return
+        data = text.encode("utf-8", errors="replace")
+        with self.lock:
+            if self.written + len(self.tail) + len(data) > MAX_SIZE:
+                self.full = True
+                data = f"\n[会话记录已达到{MAX_SIZE // (1024 * 1024)}MB，之后的输出不再记录]\n".encode("utf-8")
+            self.tail += data
+            ready = len(self.tail) >= BLOCK_SIZE
+        if self.full:
+            self.log.warning(f"会话记录{self.data_file}已达到大小上限，停止记录")
+        if ready:
+            self.wakeup.set()
+
+    def _write_loop(self):
+        prune(self.log, self.directory, keep=self.data_file)
+        while True:
+            woken = self.wakeup.wait(FLUSH_INTERVAL)
+            self.wakeup.clear()
+            closing = self.closed.is_set()
+            try:
+                # 被唤醒时只写满的块，定时写入时把已完整的行也写入，关闭时全部写入
+                while self._write_block(closing, partial=closing or not woken):
+                    pass
+            except Exception as e:
+                self.log.error(f"写入会话记录{self.data_file}错误：{str(e)}")
+            if closing:
+                break
+        self.data.close()
+        self.index.close()
+
+    def _write_block(self, closing, partial):
+        """把tail开头的一块写入磁盘，没有可写的内容时返回False"""
+        with self.lock:
+            if len(self.tail) >= BLOCK_SIZE:
+                # 在块内最后一个换行处切分，很长的一行没有换行时直接切开
+                end = self.tail.rfind(b"\n", 0, BLOCK_SIZE) + 1 or BLOCK_SIZE
+            elif partial and self.tail:
+                end = len(self.tail) if closing else self.tail.rfind(b"\n") + 1
+            else:
+                end = 0
+            if not end:
+                return False
+            block = bytes(self.tail[:end])
+        compressed = zlib.compress(block, COMPRESS_LEVEL)
+        position = self.data.tell()
+        self.data.write(compressed)
+        self.data.flush()
+        record = (self.written, position, self.written_lines, len(compressed), len(block))
+        self.index.write(INDEX_RECORD.pack(*record))
+        self.index.flush()
+        # 块先写入文件，再同时更新索引和tail，读取器看到的总是完整的内容
+        with self.lock:
+            self._add_block(*record)
+            self.written_lines += block.count(b"\n")
+            del self.tail[:end]
+        return True
+
+    def reader(self):
+        return TranscriptReader(self)
+
+    def close(self):
+        """写入剩余的输出并停止后台线程，可以重复调用"""
+        self.closed.set()
+        if self.writer is not None and self.writer.is_alive():
+            self.wakeup.set()
+            self.writer.join()
+            atexit.unregister(self.close)
+
+
+class TranscriptReader:
+    """
+    按字节范围读取和查找会话记录，接口与PagedRemoteFile相同。
+    每个读取器有自己的mmap和已解压块的缓存，可以在后台线程中与写入同时进行。
+    """
+
+    def __init__(self, transcript, max_blocks=MAX_CACHED_BLOCKS):
+        self.transcript = transcript
+        self.remote_file = f"会话记录 {transcript.name}"
+        self.max_blocks = max_blocks
+        self.blocks = OrderedDict()
+        self.file = None
+        self.map = None
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.transcript.size
+
+    def _snapshot(self):
+        """已写入的块数、原文总长度、换行数和尚未写入的部分"""
+        transcript = self.transcript
+        with transcript.lock:
+            return len(transcript.offsets), transcript.written, transcript.written_lines, bytes(transcript.tail)
+
+    def _view(self, index):
+        """映射到第index块为止的压缩文件，记录文件在不断增长，需要时重新映射"""
+        transcript = self.transcript
+        end = transcript.positions[index] + transcript.compressed_sizes[index]
+        if self.map is None or len(self.map) < end:
+            if self.file is None:
+                self.file = open(transcript.data_file, "rb")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def _decompress(self, index, view=None):
+        transcript = self.transcript
+        position = transcript.positions[index]
+        view = view if view is not None else self._view(index)
+        return zlib.decompress(view[position:position + transcript.compressed_sizes[index]])
+
+    def _block(self, index):
+        block = self.blocks.get(index)
+        if block is None:
+            block = self.blocks[index] = self._decompress(index)
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+        else:
+            self.blocks.move_to_end(index)
+        return block
+
+    def read(self, offset, size):
+        """读取[offset, offset + size)范围的数据，读取失败时返回None"""
+        try:
+            with self.lock:
+                return self._read(offset, size)
+        except Exception as e:
+            self.transcript.log.error(f"读取会话记录时出现错误：{str(e)}")
+            return None
+
+    def _read(self, offset, size):
+        count, written, _, tail = self._snapshot()
+        offset = max(0, min(offset, written + len(tail)))
+        end = min(offset + size, written + len(tail))
+        parts = []
+        index = bisect.bisect_right(self.transcript.offsets, offset, 0, count) - 1
+        position = offset
+        while position < min(end, written) and index < count:
+            base = self.transcript.offsets[index]
+            block = self._block(index)
+            parts.append(block[position - base:end - base])
+            position = base + len(block)
+            index += 1
+        if end > written:
+            parts.append(tail[max(0, offset - written):end - written])
+        return b"".join(parts)
+
+    def search(self, pattern, start=0):
+        """从start之后查找固定字符串，返回匹配处的字节偏移，没有找到或出错时返回-1"""
+        needle = pattern.encode("utf-8")
+        if not needle:
+            return -1
+        try:
+            with self.lock:
+                return self._search(needle, start)
+        except Exception as e:
+            self.transcript.log.error(f"查找会话记录时出现错误：{str(e)}")
+            return -1
+
+    def _search(self, needle, start):
+        count, written, _, tail = self._snapshot()
+        offsets = self.transcript.offsets
+        index = count if start >= written else max(0, bisect.bisect_right(offsets, start, 0, count) - 1)
+        # 上一块末尾的len(needle) - 1字节与下一块拼接，跨块的匹配也能找到
+        carry = b""
+        carry_base = offsets[index] if index < count else written
+        while index < count:
+            # 后面的若干块并行解压，按顺序查找
+            batch = range(index, min(index + SEARCH_AHEAD, count))
+            view = self._view(batch[-1])
+            futures = [get_executor().submit(self._decompress, block_index, view) for block_index in batch]
+            try:
+                for future in futures:
+                    block = carry + future.result()
+                    found = block.find(needle, max(0, start - carry_base))
+                    if found != -1:
+                        return carry_base + found
+                    carry = block[len(block) - len(needle) + 1:] if len(needle) > 1 else b""
+                    carry_base += len(block) - len(carry)
+            finally:
+                for future in futures:
+                    future.cancel()
+            index = batch[-1] + 1
+        block = carry + tail
+        found = block.find(needle, max(0, start - carry_base))
+        return carry_base + found if found != -1 else -1
+
+    def line_number(self, offset):
+        """offset所在的行号（从1开始），由索引中每块第一行的行号加上块内的换行数得到"""
+        try:
+            with self.lock:
+                count, written, lines, tail = self._snapshot()
+                if offset >= written:
+                    return lines + tail.count(b"\n", 0, offset - written) + 1
+                index = bisect.bisect_right(self.transcript.offsets, offset, 0, count) - 1
+                base = self.transcript.offsets[index]
+                return self.transcript.first_lines[index] + self._block(index).count(b"\n", 0, offset - base) + 1
+        except Exception as e:
+            self.transcript.log.error(f"读取会话记录时出现错误：{str(e)}")
+            return None
+
+    def close(self):
+        with self.lock:
+            self.blocks.clear()
+            self.map = None
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def prune(log, directory=TRANSCRIPT_DIR, keep=None):
+    """删除超过MAX_AGE天的记录，再从最旧的开始删除，使总大小不超过MAX_TOTAL_SIZE；keep为正在写入的记录"""
+    try:
+        records = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".tsz") and entry.path != keep:
+                index_file = os.path.splitext(entry.path)[0] + ".idx"
+                index_size = os.path.getsize(index_file) if os.path.exists(index_file) else 0
+                info = entry.stat()
+                records.append((info.st_mtime, info.st_size + index_size, entry.path, index_file))
+    except OSError as e:
+        log.warning(f"清理会话记录时出现错误：{str(e)}")
+        return
+    records.sort()
+    total = sum(size for _, size, _, _ in records)
+    expire = time.time() - MAX_AGE * 86400
+    for mtime, size, data_file, index_file in records:
+        if mtime >= expire and total <= MAX_TOTAL_SIZE:
+            break
+        try:
+            os.remove(data_file)
+            if os.path.exists(index_file):
+                os.remove(index_file)
+            total -= size
+        except OSError as e:
+            log.warning(f"删除会话记录{data_file}失败：{str(e)}")
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """查找时并行解压用的线程池，第一次调用时创建"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            _executor = ThreadPoolExecutor(SEARCH_THREADS, thread_name_prefix="transcript-search")
+    return _executor
@@ -0,0 +1,317 @@
+import hashlib
+import os
+import posixpath
+import stat
+import time
+import uuid
+
+from metrics import BYTES_RECEIVED, BYTES_SENT, SFTP_RATE
+
+BLOCK_SIZE = 32768  # 单个SFTP读写请求的大小，大多数服务器支持的上限
+MAX_REQUESTS = 128  # 同时在途的读请求数量，128 * 32KB = 4MB
+LOCAL_READ_SIZE = 1024 * 1024  # 上传时每次从本地文件读取的大小
+PROGRESS_INTERVAL = 0.1  # 进度回调的最小间隔（秒）
+DELTA_MIN_SIZE = 256 * 1024  # 超过该大小且大部分块未变的文件，保存时只发送变化的块
+
+
+def record_rate(transferred, start):
+    """记录一次传输的速度，续传时只按本次实际传输的字节计算"""
+    elapsed = time.perf_counter() - start
+    if transferred and elapsed > 0:
+        SFTP_RATE.observe(transferred / elapsed)
+
+
+class TransferCancelled(Exception):
+    """传输被用户取消"""
+
+
+class Progress:
+    """限制回调频率的进度上报"""
+
+    def __init__(self, callback, total, transferred=0):
+        self.callback = callback
+        self.total = total
+        self.transferred = transferred
+        self.last_report = 0
+
+    def advance(self, size):
+        self.transferred += size
+        now = time.monotonic()
+        if self.callback is not None and now - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = now
+            self.callback(self.transferred, self.total)
+
+    def finish(self):
+        if self.callback is not None:
+            self.callback(self.transferred, self.total)
+
+
+class SFTPTransfer:
+    """
+    流水线式SFTP传输：上传使用不等待确认的流水线写，下载用prefetch保持多个读请求同时在途，
+    支持进度回调、取消和断点续传（需要显式打开，续传前校验已传输部分的大小、修改时间和全部内容）。
+    """
+
+    def __init__(self, sftp, log, progress=None, cancel_event=None,
+                 block_size=BLOCK_SIZE, max_requests=MAX_REQUESTS):
+        self.sftp = sftp
+        self.log = log
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.block_size = block_size
+        self.max_requests = max_requests
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise TransferCancelled()
+
+    def upload(self, local_file, remote_file, resume=False):
+        """上传文件，返回本次实际传输的字节数。resume为True时从远程已有的部分之后继续上传"""
+        size = os.path.getsize(local_file)
+        offset = self._upload_offset(local_file, remote_file, size) if resume else 0
+        if offset:
+            self.log.info(f"从{offset}字节处继续上传：{remote_file}")
+        progress = Progress(self.progress, size, offset)
+        start = time.perf_counter()
+
+        with open(local_file, "rb") as src, self.sftp.open(remote_file, "r+b" if offset else "wb") as dst:
+            dst.set_pipelined(True)
+            src.seek(offset)
+            dst.seek(offset)
+            while True:
+                self._check_cancelled()
+                data = src.read(LOCAL_READ_SIZE)
+                if not data:
+                    break
+                dst.write(data)
+                BYTES_SENT.inc(len(data))
+                progress.advance(len(data))
+        # 关闭文件时会等待所有流水线写请求的确认
+        remote_size = self.sftp.stat(remote_file).st_size
+        if remote_size != size:
+            raise IOError(f"上传后文件大小不一致：{remote_size} != {size}")
+        progress.finish()
+        record_rate(size - offset, start)
+        return size - offset
+
+    def download(self, remote_file, local_file, resume=False):
+        """下载文件，返回本次实际传输的字节数。resume为True时从本地已有的部分之后继续下载"""
+        attr = self.sftp.stat(remote_file)
+        size = attr.st_size
+        src = self.sftp.open(remote_file, "rb")
+        try:
+            # prefetch一次发出整个文件的读请求（最多max_requests个同时在途），之后顺序读取即可；
+            # 续传时先读出开头部分与本地文件比较，一致时接着读取剩余部分，不再发出第二轮请求
+            src.prefetch(size, self.max_requests)
+            offset = self._download_offset(src, attr, local_file) if resume else 0
+            if src.tell() != offset:
+                # 开头部分不一致，已读出的数据作废，重新从头读取
+                src.close()
+                src = self.sftp.open(remote_file, "rb")
+                src.prefetch(size, self.max_requests)
+            if offset:
+                self.log.info(f"从{offset}字节处继续下载：{remote_file}")
+            progress = Progress(self.progress, size, offset)
+            start = time.perf_counter()
+
+            with open(local_file, "ab" if offset else "wb") as dst:
+                position = offset
+                while position < size:
+                    self._check_cancelled()
+                    data = src.read(min(LOCAL_READ_SIZE, size - position))
+                    if not data:
+                        raise IOError(f"下载时文件提前结束：{position} < {size}")
+                    dst.write(data)
+                    BYTES_RECEIVED.inc(len(data))
+                    progress.advance(len(data))
+                    position += len(data)
+        finally:
+            src.close()
+        progress.finish()
+        record_rate(size - offset, start)
+        return size - offset
+
+    def _upload_offset(self, local_file, remote_file, size):
+        """
+        远程文件比本地短、在本地文件最后修改之后写入，且开头部分与本地文件逐字节一致时，从远程文件大小处续传。
+        """
+        try:
+            remote = self.sftp.stat(remote_file)
+        except IOError:
+            return 0
+        remote_size = remote.st_size
+        if not remote_size or remote_size >= size or remote.st_mtime < int(os.path.getmtime(local_file)):
+            return 0
+        with open(local_file, "rb") as f, self.sftp.open(remote_file, "rb") as remote_f:
+            remote_f.prefetch(remote_size, self.max_requests)
+            return remote_size if self._same_prefix(f, remote_f, remote_size) else 0
+
+    def _download_offset(self, src, attr, local_file):
+        """
+        本地文件比远程短、在远程文件最后修改之后写入，且内容与远程文件开头逐字节一致时，从本地文件大小处续传。
+        """
+        if not os.path.exists(local_file):
+            return 0
+        local_size = os.path.getsize(local_file)
+        if not local_size or local_size >= attr.st_size or os.path.getmtime(local_file) < attr.st_mtime:
+            return 0
+        # src已经从头prefetch，这里顺序读出开头部分即可
+        with open(local_file, "rb") as f:
+            same = self._same_prefix(f, src, local_size)
+        return local_size if same else 0
+
+    def _same_prefix(self, local, remote, size):
+        """比较本地和远程文件的前size字节"""
+        position = 0
+        while position < size:
+            self._check_cancelled()
+            length = min(LOCAL_READ_SIZE, size - position)
+            data = remote.read(length)
+            if not data or data != local.read(len(data)):
+                return False
+            BYTES_RECEIVED.inc(len(data))
+            position += len(data)
+        return True
+
+    def save(self, data, remote_file, base=None, copy_remote=None, link_count=None):
+        """
+        保存内存中的数据到远程文件，返回实际发送的字节数。
+
+        普通文件先写入同目录下的临时文件，再重命名覆盖目标文件，保存中断时原文件不受影响；
+        目标是符号链接、有多个硬链接、属主无法保留或者目录不可写时，改为直接写入原文件，
+        重命名会把链接替换成普通文件、断开硬链接或者改变属主。
+
+        base为加载时各块的摘要（block_hashes()），只有内容被原位修改（长度不变的改动居多）时，
+        才在服务器上复制原文件（copy_remote(源, 目标)）并只写入变化的块；插入或删除内容后的块都会错位，
+        此时直接写入全部内容。link_count(路径)返回文件的硬链接数，无法获取时返回None。
+        """
+        try:
+            attr = self.sftp.lstat(remote_file)
+        except IOError:
+            attr = None  # 新文件
+        changed = self._changed_blocks(data, base) if base is not None else None
+        if attr is not None and self._write_in_place_required(attr, remote_file, link_count):
+            return self._save_in_place(data, remote_file, changed)
+
+        directory, name = posixpath.split(remote_file)
+        temp_file = posixpath.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            self.sftp.open(temp_file, "wb").close()
+        except IOError as e:
+            if attr is None:
+                raise
+            self.log.info(f"无法在{directory or '.'}中创建临时文件（{str(e)}），直接写入原文件：{remote_file}")
+            return self._save_in_place(data, remote_file, changed)
+
+        try:
+            sent = None
+            if changed is not None and copy_remote is not None and copy_remote(remote_file, temp_file):
+                sent = self._write_blocks(data, changed, temp_file)
+            if sent is None:
+                sent = self._write_all(data, temp_file)
+            if attr is not None and not self._copy_attributes(attr, temp_file):
+                self._remove(temp_file)
+                self.log.info(f"无法保留文件的属主，直接写入原文件：{remote_file}")
+                return self._save_in_place(data, remote_file, changed)
+            self._replace(temp_file, remote_file)
+        except Exception:
+            # 目标文件还在（原内容或新内容）时才删除临时文件，否则临时文件是新内容仅有的副本
+            if self._exists(remote_file):
+                self._remove(temp_file)
+            else:
+                self.log.error(f"保存失败，新内容保留在临时文件{temp_file}中")
+            raise
+        BYTES_SENT.inc(sent)
+        return sent
+
+    def _write_in_place_required(self, attr, remote_file, link_count):
+        if stat.S_ISLNK(attr.st_mode or 0):
+            return True
+        links = link_count(remote_file) if link_count is not None else None
+        return links is not None and links > 1
+
+    def _copy_attributes(self, attr, temp_file):
+        """把原文件的权限和属主设置到临时文件，属主无法保留时返回False"""
+        self.sftp.chmod(temp_file, stat.S_IMODE(attr.st_mode))
+        temp = self.sftp.stat(temp_file)
+        if (temp.st_uid, temp.st_gid) == (attr.st_uid, attr.st_gid):
+            return True
+        try:
+            self.sftp.chown(temp_file, attr.st_uid, attr.st_gid)
+            temp = self.sftp.stat(temp_file)
+        except IOError:
+            return False
+        return (temp.st_uid, temp.st_gid) == (attr.st_uid, attr.st_gid)
+
+    def _save_in_place(self, data, remote_file, changed=None):
+        """直接覆盖写入原文件，保留链接、属主和权限；changed不为None时只写入变化的块"""
+        if changed is None:
+            changed = range(0, len(data), self.block_size)
+        sent = self._write_blocks(data, changed, remote_file)
+        BYTES_SENT.inc(sent)
+        return sent
+
+    def _changed_blocks(self, data, base):
+        """与加载时内容不同的块的偏移，变化超过一半时返回None（复制原文件已不划算）"""
+        changed = [offset for index, offset in enumerate(range(0, len(data), self.block_size))
+                   if index >= len(base) or hashlib.md5(data[offset:offset + self.block_size]).digest() != base[index]]
+        if len(data) < DELTA_MIN_SIZE or len(changed) * 2 > len(data) // self.block_size + 1:
+            return None
+        return changed
+
+    def _write_all(self, data, remote_file):
+        with self.sftp.open(remote_file, "wb") as f:
+            f.set_pipelined(True)
+            f.write(data)
+        return len(data)
+
+    def _write_blocks(self, data, offsets, remote_file):
+        """把data中offsets处的块写入已有的远程文件，并截断到新长度"""
+        sent = 0
+        with self.sftp.open(remote_file, "r+b") as f:
+            f.set_pipelined(True)
+            for offset in offsets:
+                block = data[offset:offset + self.block_size]
+                f.seek(offset)
+                f.write(block)
+                sent += len(block)
+            f.truncate(len(data))
+        return sent
+
+    def _replace(self, temp_file, remote_file):
+        try:
+            # OpenSSH的posix-rename扩展可以直接原子覆盖已存在的文件
+            self.sftp.posix_rename(temp_file, remote_file)
+            return
+        except IOError as e:
+            if not self._exists(remote_file):
+                self.sftp.rename(temp_file, remote_file)
+                return
+            self.log.warning(f"posix-rename失败（{str(e)}），改为先把原文件改名再替换：{remote_file}")
+        # 原文件先改名保留，新文件就位后才删除；替换失败时改回原名
+        backup = temp_file + ".orig"
+        self.sftp.rename(remote_file, backup)
+        try:
+            self.sftp.rename(temp_file, remote_file)
+        except IOError:
+            self.sftp.rename(backup, remote_file)
+            raise
+        self._remove(backup)
+
+    def _exists(self, remote_file):
+        try:
+            self.sftp.lstat(remote_file)
+            return True
+        except IOError:
+            return False
+
+    def _remove(self, remote_file):
+        try:
+            self.sftp.remove(remote_file)
+        except IOError as e:
+            self.log.warning(f"删除临时文件{remote_file}失败：{str(e)}")
+
+
+def block_hashes(data, block_size=BLOCK_SIZE):
+    """各块内容的摘要，编辑器加载文件时保存，代替保存整个文件内容"""
+    return [hashlib.md5(data[offset:offset + block_size]).digest() for offset in range(0, len(data), block_size)]
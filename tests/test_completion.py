@@ -0,0 +1,96 @@
+"""
+Tab补全的测试：参数的引号和转义的处理（unquote），以及按索引补全命令和路径（CompletionIndex.complete）。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import os
+import stat
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from paramiko import SFTPAttributes  # noqa: E402
+
+from completion import CompletionIndex, PrefixList, common_prefix, unquote  # noqa: E402
+
+
+def entry(name, directory=False):
+    attr = SFTPAttributes()
+    attr.filename = name
+    attr.st_mode = (stat.S_IFDIR if directory else stat.S_IFREG) | 0o755
+    return attr
+
+
+class UnquoteTest(unittest.TestCase):
+    def test_plain_and_escaped(self):
+        self.assertEqual(unquote("/var/log"), "/var/log")
+        self.assertEqual(unquote(r"my\ file"), "my file")
+        self.assertEqual(unquote(r"a\\b"), "a\\b")
+
+    def test_quotes(self):
+        self.assertEqual(unquote("'it is'"), "it is")
+        self.assertEqual(unquote('"say \\"hi\\""'), 'say "hi"')
+        self.assertEqual(unquote("'a'\"b\"c"), "abc")
+        # 还没有输入结尾的引号
+        self.assertEqual(unquote("'unfinished wo"), "unfinished wo")
+        self.assertEqual(unquote('"open'), "open")
+
+    def test_single_quotes_keep_dollar(self):
+        self.assertEqual(unquote("'$HOME'"), "$HOME")
+
+    def test_expansions_cannot_be_resolved(self):
+        self.assertIsNone(unquote("$HOME/x"))
+        self.assertIsNone(unquote('"$HOME"'))
+        self.assertIsNone(unquote("`pwd`"))
+
+
+class CompleteTest(unittest.TestCase):
+    def setUp(self):
+        self.index = CompletionIndex(None)
+        self.index.commands = PrefixList(["ls", "lsblk", "lsof", "grep"])
+        self.index.home = "/home/dev"
+        self.index.put("/home/dev", [entry("projects", True), entry("notes.txt"), entry("my file.txt"),
+                                     entry(".bashrc")])
+        self.index.put("/", [entry("etc", True), entry("var", True)])
+
+    def test_first_word_completes_commands(self):
+        self.assertEqual(self.index.complete("ls", "/home/dev"), (0, ["ls ", "lsblk ", "lsof "], None))
+        self.assertEqual(self.index.complete("sudo gr", "/home/dev")[1], [])  # 第二个单词补全路径
+
+    def test_relative_path(self):
+        start, candidates, missing = self.index.complete("cat no", "/home/dev")
+        self.assertEqual((start, candidates, missing), (4, ["notes.txt "], None))
+        self.assertEqual(self.index.complete("cd pro", "/home/dev")[1], ["projects/"])
+
+    def test_names_with_spaces_are_escaped(self):
+        self.assertEqual(self.index.complete("cat my", "/home/dev")[1], [r"my\ file.txt "])
+        # 引号中的输入被整个替换为转义后的文本
+        self.assertEqual(self.index.complete("cat 'my f", "/home/dev"), (4, [r"my\ file.txt "], None))
+
+    def test_hidden_entries_need_a_dot(self):
+        self.assertNotIn(".bashrc ", self.index.complete("cat ", "/home/dev")[1])
+        self.assertEqual(self.index.complete("cat .b", "/home/dev")[1], [".bashrc "])
+
+    def test_absolute_and_home_paths(self):
+        self.assertEqual(self.index.complete("cd /e", "/tmp")[1], ["/etc/"])
+        self.assertEqual(self.index.complete("cat ~/no", "/tmp")[1], ["~/notes.txt "])
+
+    def test_unindexed_directory_is_requested(self):
+        self.assertEqual(self.index.complete("cat projects/", "/home/dev"), (4, [], "/home/dev/projects"))
+
+    def test_invalidated_directory_is_requested_again(self):
+        self.index.invalidate("/home/dev")
+        self.assertEqual(self.index.complete("cat no", "/home/dev"), (4, [], "/home/dev"))
+
+    def test_unresolvable_word(self):
+        self.assertEqual(self.index.complete("cat $HOME/", "/home/dev"), (4, [], None))
+        self.assertEqual(self.index.complete("cat x", None), (4, [], None))
+
+    def test_common_prefix(self):
+        self.assertEqual(common_prefix(["lsblk ", "lsof "]), "ls")
+        self.assertEqual(common_prefix([]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+ConnectionManager的测试：连接中断后哪些命令可以在重连后重新执行（_can_replay）。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from connection import ConnectionManager  # noqa: E402
+
+can_replay = ConnectionManager._can_replay
+
+
+class CanReplayTest(unittest.TestCase):
+    def test_unsent_command_is_always_replayed(self):
+        self.assertTrue(can_replay("rm -rf /tmp/build", sent=False, received=False))
+
+    def test_read_only_commands(self):
+        for command in ("ls -la /var/log", "cat '/etc/my file'", "df -h", "hostname", "hostname -f",
+                        "find . -name '*.py'", "date +%s"):
+            self.assertTrue(can_replay(command, sent=True, received=False), command)
+
+    def test_output_already_received(self):
+        self.assertFalse(can_replay("ls", sent=True, received=True))
+
+    def test_commands_that_change_state(self):
+        for command in ("rm -rf /tmp/build", "systemctl restart nginx", "vi notes.txt", "hostname web01",
+                        "date -s 12:00", "date --set=12:00", "find . -delete", "find . -exec rm {} ;",
+                        "tree -o out.txt"):
+            self.assertFalse(can_replay(command, sent=True, received=False), command)
+
+    def test_shell_syntax_is_not_replayed(self):
+        for command in ("ls; rm x", "cat a > b", "ls | xargs rm", "echo $(reboot)", "echo `id`", "ls && rm x",
+                        "echo 'unclosed"):
+            self.assertFalse(can_replay(command, sent=True, received=False), command)
+
+    def test_empty_command(self):
+        self.assertFalse(can_replay("   ", sent=True, received=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
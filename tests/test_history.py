@@ -0,0 +1,125 @@
+"""
+命令历史的测试：CommandHistory的按主机记录和持久化，以及输入框中用上下键翻看（HistoryRecall）。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from PyQt5.QtCore import QCoreApplication, QObject, pyqtSignal  # noqa: E402
+
+from history import CommandHistory  # noqa: E402
+from history_search import HistoryRecall  # noqa: E402
+
+
+class FakeLineEdit(QObject):
+    """HistoryRecall只用到输入框的textEdited信号、text()和setText()"""
+
+    textEdited = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.value = ""
+
+    def text(self):
+        return self.value
+
+    def setText(self, text):
+        self.value = text
+
+    def type(self, text):
+        self.value = text
+        self.textEdited.emit(text)
+
+
+class FakeSession:
+    def __init__(self, title):
+        self.title = title
+
+
+class CommandHistoryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.directory, "history.db")
+        self.history = CommandHistory(logging.getLogger("test"), self.db_file)
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.directory)
+
+    def test_recent_is_per_host_and_deduplicated(self):
+        for host, command in (("web", "ls"), ("web", "uptime"), ("db", "psql"), ("web", "ls "), ("web", "  ")):
+            self.history.add(host, command)
+        self.assertEqual(self.history.recent("web"), ["uptime", "ls"])
+        self.assertEqual(self.history.recent("db"), ["psql"])
+
+    def test_commands_are_saved(self):
+        self.history.recent("web")
+        for command in ("cd /srv", "git pull", "cd /srv"):
+            self.history.add("web", command)
+        self.history.close()
+        self.history = CommandHistory(logging.getLogger("test"), self.db_file)
+        self.assertEqual(self.history.recent("web"), ["git pull", "cd /srv"])
+        self.assertEqual(self.history.search("pull"), [("web", "git pull")])
+
+    def test_up_and_down_recall(self):
+        session = FakeSession("web")
+        line_edit = FakeLineEdit()
+        recall = HistoryRecall(line_edit, self.history, lambda: session)
+        for command in ("first", "second", "third"):
+            self.history.add("web", command)
+        line_edit.type("draft")
+
+        recall.move(-1)
+        self.assertEqual(line_edit.text(), "third")
+        recall.move(-1)
+        recall.move(-1)
+        recall.move(-1)  # 已经是最早的命令
+        self.assertEqual(line_edit.text(), "first")
+        recall.move(1)
+        self.assertEqual(line_edit.text(), "second")
+        recall.move(1)
+        recall.move(1)  # 翻回最下面时恢复翻看前输入的内容
+        self.assertEqual(line_edit.text(), "draft")
+        recall.move(1)
+        self.assertEqual(line_edit.text(), "draft")
+
+    def test_editing_restarts_from_latest(self):
+        session = FakeSession("web")
+        line_edit = FakeLineEdit()
+        recall = HistoryRecall(line_edit, self.history, lambda: session)
+        for command in ("first", "second"):
+            self.history.add("web", command)
+        recall.move(-1)
+        recall.move(-1)
+        line_edit.type("first -v")
+        recall.move(-1)
+        self.assertEqual(line_edit.text(), "second")
+        recall.move(1)
+        self.assertEqual(line_edit.text(), "first -v")
+
+    def test_switching_session_uses_its_host(self):
+        sessions = {"current": FakeSession("web")}
+        line_edit = FakeLineEdit()
+        recall = HistoryRecall(line_edit, self.history, lambda: sessions["current"])
+        self.history.add("web", "nginx -t")
+        self.history.add("db", "psql")
+        recall.move(-1)
+        self.assertEqual(line_edit.text(), "nginx -t")
+        sessions["current"] = FakeSession("db")
+        recall.move(-1)
+        self.assertEqual(line_edit.text(), "psql")
+
+
+if __name__ == "__main__":
+    unittest.main()
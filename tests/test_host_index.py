@@ -0,0 +1,65 @@
+"""
+HostIndex的测试：前缀匹配和模糊匹配、多个关键词、结果排序和删除。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from host_index import HostIndex  # noqa: E402
+
+ROWS = [
+    (1, "10.0.0.1", "root", "prod web"),
+    (2, "10.0.0.2", "admin", "prod db"),
+    (3, "192.168.1.5", "root", "test web"),
+    (4, "db.example.com", "postgres", None),
+]
+
+
+class HostIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = HostIndex(ROWS)
+
+    def test_empty_query_returns_all(self):
+        self.assertEqual(self.index.search(""), [1, 2, 3, 4])
+        self.assertEqual(self.index.search("   "), [1, 2, 3, 4])
+
+    def test_prefix_of_word_and_ip_part(self):
+        self.assertEqual(self.index.search("prod"), [1, 2])
+        self.assertEqual(self.index.search("168"), [3])
+        self.assertEqual(self.index.search("10.0"), [1, 2])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.index.search("web root"), [1, 3])
+        self.assertEqual(self.index.search("PROD Web"), [1])
+        self.assertEqual(self.index.search("prod staging"), [])
+
+    def test_exact_words_rank_before_prefix_and_fuzzy(self):
+        # 2、4中有与db完全相同的词，1的"prod web"只是模糊匹配，排在最后
+        self.assertEqual(self.index.search("db"), [2, 4, 1])
+        self.assertEqual(self.index.search("pstgrs"), [4])
+        index = HostIndex([(1, "10.0.0.9", "webadmin", ""), (2, "10.0.0.8", "w-e-b", ""), (3, "10.0.0.7", "web", "")])
+        self.assertEqual(index.search("web"), [3, 1, 2])
+
+    def test_special_characters_are_literal(self):
+        self.assertEqual(self.index.search("0.0.1"), [1])
+        self.assertEqual(self.index.search("(.*"), [])
+
+    def test_removed_rows_are_not_returned(self):
+        self.index.search("prod")
+        self.index.remove_rows([1])
+        self.assertEqual(self.index.search("prod"), [2])
+        self.assertEqual(self.index.search(""), [2, 3, 4])
+        self.assertEqual(len(self.index), 3)
+
+    def test_added_rows_are_searchable(self):
+        self.index.search("prod")
+        self.index.add_rows([(5, "10.0.0.3", "deploy", "prod cache")])
+        self.assertEqual(self.index.search("prod"), [1, 2, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+RemoteShell的测试：用假的通道回放服务器输出，检查哨兵行的解析、退出码和工作目录的提取。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import logging
+import os
+import sys
+import unittest
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from remote_shell import RemoteShell  # noqa: E402
+
+
+class FakeChannel:
+    """记录发送的脚本，收到脚本后把respond(脚本)返回的数据块逐块交给recv，没有数据时表示通道已关闭"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.chunks = deque()
+        self.sent = []
+        self.closed = False
+
+    def sendall(self, data):
+        self.sent.append(data)
+        self.chunks.extend(self.respond(data))
+
+    def recv(self, size):
+        return self.chunks.popleft() if self.chunks else b""
+
+    def close(self):
+        self.closed = True
+
+
+class RemoteShellTest(unittest.TestCase):
+    def setUp(self):
+        self.shell = RemoteShell(None, logging.getLogger("test"))
+
+    def sentinel(self, seq, status=0, cwd="/root"):
+        return b"\n" + self.shell._marker + f" {seq} {status} {cwd}\n".encode("utf-8")
+
+    def connect(self, respond):
+        self.shell.channel = FakeChannel(respond)
+        return self.shell.channel
+
+    def test_output_exit_status_and_cwd(self):
+        self.connect(lambda script: [b"hello\nworld", self.sentinel(1, 3, "/tmp/a b")])
+        self.assertEqual(self.shell.run("false"), "hello\nworld")
+        self.assertEqual(self.shell.exit_status, 3)
+        self.assertEqual(self.shell.cwd, "/tmp/a b")
+        self.assertTrue(self.shell.sent)
+        self.assertTrue(self.shell.received)
+
+    def test_command_is_quoted_for_eval(self):
+        channel = self.connect(lambda script: [self.sentinel(1)])
+        self.shell.run("echo 'it''s'")
+        script = channel.sent[0].decode("utf-8")
+        self.assertTrue(script.startswith("eval 'echo '\"'\"'it'\"'\"''\"'\"'s'\"'\"'' </dev/null\n"))
+        self.assertIn(self.shell._marker.decode("ascii") + "' 1 ", script)
+
+    def test_sentinel_split_across_chunks(self):
+        data = b"output" + self.sentinel(1, 0, "/var/log")
+        self.connect(lambda script: [data[i:i + 1] for i in range(len(data))])
+        self.assertEqual(self.shell.run("cat"), "output")
+        self.assertEqual(self.shell.exit_status, 0)
+        self.assertEqual(self.shell.cwd, "/var/log")
+
+    def test_streamed_output_keeps_multibyte_characters(self):
+        data = "中文输出".encode("utf-8")
+        self.connect(lambda script: [data[:4], data[4:], self.sentinel(1)])
+        chunks = []
+        self.assertEqual(self.shell.run("cat", on_output=chunks.append), "")
+        self.assertEqual("".join(chunks), "中文输出")
+        self.assertNotIn("�", "".join(chunks))
+
+    def test_stale_sentinel_of_interrupted_command_is_skipped(self):
+        self.shell._seq = 1
+        self.connect(lambda script: [b"late output", self.sentinel(1, 130), b"ok", self.sentinel(2, 0, "/srv")])
+        self.assertEqual(self.shell.run("ls"), "ok")
+        self.assertEqual(self.shell.exit_status, 0)
+        self.assertEqual(self.shell.cwd, "/srv")
+
+    def test_channel_closed_before_sentinel(self):
+        channel = self.connect(lambda script: [b"partial"])
+        self.assertEqual(self.shell.run("exit"), "partial")
+        self.assertIsNone(self.shell.exit_status)
+        self.assertTrue(channel.closed)
+        self.assertIsNone(self.shell.channel)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+JobScheduler的测试：优先级顺序、同一会话的serial任务逐个执行、取消和超时。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import logging
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+from scheduler import Job, JobScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_NORMAL  # noqa: E402
+
+WAIT_TIMEOUT = 5  # 等待任务结束的最长时间（秒）
+
+
+class RecordingJob(Job):
+    """执行时记录名称，gate不为None时等到gate被设置才返回"""
+
+    def __init__(self, name, log, priority=PRIORITY_NORMAL, serial=False, gate=None, timeout=None):
+        super().__init__(timeout=timeout)
+        self.name = name
+        self.log = log
+        self.priority = priority
+        self.serial = serial
+        self.gate = gate
+        self.started = threading.Event()
+        self.interrupted = threading.Event()
+        self.results = []
+        self.signals.finished.connect(self.results.append)
+
+    def execute(self):
+        self.log.append(self.name)
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(WAIT_TIMEOUT)
+        return self.name
+
+    def interrupt(self):
+        self.interrupted.set()
+        if self.gate is not None:
+            self.gate.set()
+
+
+class JobSchedulerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.scheduler = JobScheduler(logging.getLogger("test"), max_threads=1, class_limits={})
+        self.log = []
+
+    def wait_until(self, condition):
+        """处理事件直到condition()成立，跨线程发出的finished信号需要事件循环才能送达"""
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("等待任务结束超时")
+            self.app.processEvents()
+            time.sleep(0.005)
+
+    def test_priority_order(self):
+        gate = threading.Event()
+        blocker = self.scheduler.submit(RecordingJob("blocker", self.log, gate=gate))
+        blocker.started.wait(WAIT_TIMEOUT)
+        jobs = [self.scheduler.submit(RecordingJob(name, self.log, priority)) for name, priority in
+                (("bulk", PRIORITY_BULK), ("normal", PRIORITY_NORMAL), ("interactive", PRIORITY_INTERACTIVE))]
+        self.assertEqual(self.scheduler.depth(), {"interactive": 1, "normal": 1, "bulk": 1})
+        gate.set()
+        self.wait_until(lambda: all(job.results for job in jobs))
+        self.assertEqual(self.log, ["blocker", "interactive", "normal", "bulk"])
+
+    def test_serial_jobs_of_a_session_run_one_at_a_time(self):
+        self.scheduler = JobScheduler(logging.getLogger("test"), max_threads=4, class_limits={})
+        session, other = object(), object()
+        gate = threading.Event()
+        first = self.scheduler.submit(RecordingJob("first", self.log, serial=True, gate=gate), session)
+        second = self.scheduler.submit(RecordingJob("second", self.log, serial=True), session)
+        parallel = self.scheduler.submit(RecordingJob("other", self.log, serial=True), other)
+        self.wait_until(lambda: parallel.results)
+        self.assertTrue(first.started.is_set())
+        self.assertFalse(second.started.is_set())
+        gate.set()
+        self.wait_until(lambda: second.results)
+        self.assertEqual(self.log.index("second"), len(self.log) - 1)
+
+    def test_cancel_pending_job(self):
+        gate = threading.Event()
+        blocker = self.scheduler.submit(RecordingJob("blocker", self.log, gate=gate))
+        blocker.started.wait(WAIT_TIMEOUT)
+        pending = self.scheduler.submit(RecordingJob("pending", self.log))
+        pending.cancel()
+        self.assertEqual(pending.results, [None])
+        self.assertEqual(self.scheduler.depth()["normal"], 0)
+        gate.set()
+        self.wait_until(lambda: blocker.results)
+        self.assertNotIn("pending", self.log)
+        self.assertEqual(pending.results, [None])
+
+    def test_cancel_running_job_reports_none(self):
+        job = self.scheduler.submit(RecordingJob("running", self.log, gate=threading.Event()))
+        job.started.wait(WAIT_TIMEOUT)
+        job.cancel()
+        self.wait_until(lambda: job.results)
+        self.assertTrue(job.interrupted.is_set())
+        self.assertEqual(job.results, [None])
+        self.assertFalse(job.timed_out)
+
+    def test_timeout_interrupts_and_reports_none(self):
+        job = self.scheduler.submit(RecordingJob("slow", self.log, gate=threading.Event(), timeout=0.1))
+        self.wait_until(lambda: job.results)
+        self.assertTrue(job.interrupted.is_set())
+        self.assertTrue(job.timed_out)
+        self.assertEqual(job.results, [None])
+
+    def test_cancel_session_discards_pending_jobs(self):
+        session = object()
+        gate = threading.Event()
+        blocker = self.scheduler.submit(RecordingJob("blocker", self.log, gate=gate))
+        blocker.started.wait(WAIT_TIMEOUT)
+        pending = self.scheduler.submit(RecordingJob("pending", self.log), session)
+        self.scheduler.cancel_session(session)
+        gate.set()
+        self.wait_until(lambda: blocker.results)
+        self.assertNotIn("pending", self.log)
+        self.assertTrue(pending.cancel_event.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
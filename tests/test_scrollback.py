@@ -0,0 +1,86 @@
+"""
+输出框滚动缓冲的测试：LineRingBuffer的按行保留，以及超长的行被强制换行（ConsoleView._break_long_lines）。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+from scrollback import ConsoleView, LineRingBuffer, MAX_LINE_LENGTH  # noqa: E402
+
+
+class FakeEditor:
+    """_break_long_lines不访问输出框，只需要构造时的clear()"""
+
+    def clear(self):
+        pass
+
+
+class LineRingBufferTest(unittest.TestCase):
+    def test_appends_join_unfinished_line(self):
+        buffer = LineRingBuffer(10)
+        buffer.append("a")
+        buffer.append("b\nc")
+        buffer.append("\n")
+        self.assertEqual(buffer.text(), "ab\nc\n")
+        self.assertEqual(buffer.line_count, 3)
+
+    def test_keeps_only_last_lines(self):
+        buffer = LineRingBuffer(3)
+        buffer.append("".join(f"{i}\n" for i in range(10)))
+        self.assertEqual(buffer.text(), "7\n8\n9\n")
+        buffer.trim(2)
+        self.assertEqual(buffer.text(), "9\n")
+
+    def test_resize_and_clear(self):
+        buffer = LineRingBuffer(2)
+        buffer.append("1\n2\n3\n")
+        self.assertEqual(buffer.text(), "2\n3\n")
+        buffer.resize(3)
+        buffer.append("4\n5\n")
+        self.assertEqual(buffer.text(), "3\n4\n5\n")
+        buffer.clear()
+        self.assertEqual(buffer.text(), "")
+        self.assertEqual(buffer.line_count, 1)
+
+
+class BreakLongLinesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.view = ConsoleView(FakeEditor())
+
+    def test_short_output_is_unchanged(self):
+        self.assertEqual(self.view._break_long_lines("abc\nde"), "abc\nde")
+        self.assertEqual(self.view.line_length, 2)
+        self.assertEqual(self.view._break_long_lines("f"), "f")
+        self.assertEqual(self.view.line_length, 3)
+
+    def test_long_line_is_broken(self):
+        text = "x" * (MAX_LINE_LENGTH * 2 + 5)
+        lines = self.view._break_long_lines(text).split("\n")
+        self.assertEqual([len(line) for line in lines], [MAX_LINE_LENGTH, MAX_LINE_LENGTH, 5])
+        self.assertEqual(self.view.line_length, 5)
+
+    def test_line_continued_across_appends(self):
+        self.view._break_long_lines("y" * (MAX_LINE_LENGTH - 3))
+        result = self.view._break_long_lines("z" * 10 + "\nshort")
+        self.assertEqual(result, "zzz\n" + "z" * 7 + "\nshort")
+        self.assertEqual(self.view.line_length, 5)
+
+    def test_exact_length_is_not_broken(self):
+        text = "w" * MAX_LINE_LENGTH
+        self.assertEqual(self.view._break_long_lines(text), text)
+        self.assertEqual(self.view._break_long_lines("\n"), "\n")
+        self.assertEqual(self.view.line_length, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
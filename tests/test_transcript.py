@@ -0,0 +1,107 @@
+"""
+会话记录的测试：Transcript写入的压缩块和索引，经TranscriptReader读取、查找和计算行号后与原文一致。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from transcript import BLOCK_SIZE, Transcript  # noqa: E402
+
+
+class TranscriptTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = logging.getLogger("test")
+        # 约三块半的输出，最后半块在关闭前留在内存中
+        self.lines = [f"{index:06d} output line of the session\n" for index in range(BLOCK_SIZE * 7 // 2 // 34)]
+        self.text = "".join(self.lines).encode("utf-8")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, close=True):
+        transcript = Transcript(self.log, "root@10.0.0.1", directory=self.directory)
+        for line in self.lines:
+            transcript.append(line)
+        if close:
+            transcript.close()
+        return transcript
+
+    def test_read_across_blocks(self):
+        transcript = self.write()
+        self.assertGreaterEqual(len(transcript.offsets), 3)
+        reader = transcript.reader()
+        try:
+            self.assertEqual(reader.size, len(self.text))
+            self.assertEqual(reader.read(0, len(self.text) + 10), self.text)
+            start = BLOCK_SIZE - 100
+            self.assertEqual(reader.read(start, 1000), self.text[start:start + 1000])
+        finally:
+            reader.close()
+
+    def test_search_round_trip(self):
+        transcript = self.write()
+        reader = transcript.reader()
+        try:
+            target = self.lines[-1].strip()
+            self.assertEqual(reader.search(target), self.text.index(target.encode()))
+            self.assertEqual(reader.search("000001 output"), self.text.index(b"000001 output"))
+            first = reader.search("output line")
+            self.assertEqual(reader.search("output line", first + 1), self.text.index(b"output line", first + 1))
+            self.assertEqual(reader.search("not in the transcript"), -1)
+            self.assertEqual(reader.search(""), -1)
+        finally:
+            reader.close()
+
+    def test_search_match_spanning_blocks(self):
+        transcript = self.write()
+        reader = transcript.reader()
+        try:
+            boundary = transcript.offsets[1]
+            needle = self.text[boundary - 5:boundary + 5].decode()
+            self.assertEqual(reader.search(needle, boundary - 20), self.text.index(needle.encode(), boundary - 20))
+        finally:
+            reader.close()
+
+    def test_unwritten_tail_is_readable_and_searchable(self):
+        transcript = self.write(close=False)
+        transcript.append("\nstill in memory\n")
+        reader = transcript.reader()
+        try:
+            position = reader.search("still in memory")
+            self.assertEqual(position, len(self.text) + 1)
+            self.assertEqual(reader.read(position, 15), b"still in memory")
+        finally:
+            reader.close()
+            transcript.close()
+
+    def test_line_numbers(self):
+        transcript = self.write()
+        reader = transcript.reader()
+        try:
+            for index in (0, 1, len(self.lines) // 2, len(self.lines) - 1):
+                offset = self.text.index(self.lines[index].encode())
+                self.assertEqual(reader.line_number(offset), index + 1)
+        finally:
+            reader.close()
+
+    def test_saved_transcript_loads(self):
+        data_file = self.write().data_file
+        transcript = Transcript.load(self.log, data_file)
+        reader = transcript.reader()
+        try:
+            self.assertEqual(reader.read(0, len(self.text)), self.text)
+            self.assertEqual(transcript.written_lines, len(self.lines))
+        finally:
+            reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
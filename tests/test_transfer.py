@@ -0,0 +1,169 @@
+"""
+SFTPTransfer保存文件的测试：变化块的计算，以及保存时只写变化的块、写入全部内容和直接写入原文件的选择。
+用内存中的假SFTP代替服务器。
+
+    QT_QPA_PLATFORM=offscreen python -m pytest tests
+"""
+import logging
+import os
+import stat
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from paramiko import SFTPAttributes  # noqa: E402
+
+from transfer import BLOCK_SIZE, DELTA_MIN_SIZE, SFTPTransfer, block_hashes  # noqa: E402
+
+
+class MemoryFile:
+    def __init__(self, files, path, mode):
+        if "w" in mode:
+            files[path] = bytearray()
+        elif path not in files:
+            raise IOError(2, "No such file", path)
+        self.data = files[path]
+        self.position = 0
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def seek(self, offset):
+        self.position = offset
+
+    def write(self, data):
+        self.data[self.position:self.position + len(data)] = data
+        self.position += len(data)
+
+    def truncate(self, size):
+        del self.data[size:]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class MemorySFTP:
+    """只实现SFTPTransfer.save用到的操作，文件内容保存在files中"""
+
+    def __init__(self, files=None):
+        self.files = {path: bytearray(data) for path, data in (files or {}).items()}
+        self.renamed = []
+
+    def lstat(self, path):
+        if path not in self.files:
+            raise IOError(2, "No such file", path)
+        attr = SFTPAttributes()
+        attr.st_mode = stat.S_IFREG | 0o644
+        attr.st_uid = attr.st_gid = 1000
+        attr.st_size = len(self.files[path])
+        return attr
+
+    stat = lstat
+
+    def open(self, path, mode="r"):
+        return MemoryFile(self.files, path, mode)
+
+    def chmod(self, path, mode):
+        pass
+
+    def chown(self, path, uid, gid):
+        pass
+
+    def posix_rename(self, old, new):
+        self.renamed.append((old, new))
+        self.files[new] = self.files.pop(old)
+
+    rename = posix_rename
+
+    def remove(self, path):
+        del self.files[path]
+
+    def copy(self, source, target):
+        """服务器上复制文件（copy_remote）"""
+        self.files[target] = bytearray(self.files[source])
+        return True
+
+
+def sample(blocks):
+    return b"".join(bytes([index % 251]) * BLOCK_SIZE for index in range(blocks))
+
+
+def replace_block(data, index, fill=b"x"):
+    return data[:index * BLOCK_SIZE] + fill * BLOCK_SIZE + data[(index + 1) * BLOCK_SIZE:]
+
+
+class ChangedBlocksTest(unittest.TestCase):
+    def setUp(self):
+        self.transfer = SFTPTransfer(MemorySFTP(), logging.getLogger("test"))
+        self.original = sample(DELTA_MIN_SIZE // BLOCK_SIZE * 2)
+        self.base = block_hashes(self.original)
+
+    def test_unchanged(self):
+        self.assertEqual(self.transfer._changed_blocks(self.original, self.base), [])
+
+    def test_modified_and_appended_blocks(self):
+        data = replace_block(self.original, 3) + b"tail"
+        self.assertEqual(self.transfer._changed_blocks(data, self.base), [3 * BLOCK_SIZE, len(self.original)])
+
+    def test_mostly_changed_is_not_worth_a_delta(self):
+        data = b"\n" + self.original  # 开头插入内容后所有块都错位
+        self.assertIsNone(self.transfer._changed_blocks(data, self.base))
+
+    def test_small_file_is_written_whole(self):
+        original = sample(2)
+        self.assertIsNone(self.transfer._changed_blocks(replace_block(original, 0), block_hashes(original)))
+
+
+class SaveTest(unittest.TestCase):
+    def setUp(self):
+        self.original = sample(DELTA_MIN_SIZE // BLOCK_SIZE * 2)
+        self.sftp = MemorySFTP({"/srv/app.conf": self.original})
+        self.transfer = SFTPTransfer(self.sftp, logging.getLogger("test"))
+
+    def assertSaved(self, data):
+        self.assertEqual(bytes(self.sftp.files["/srv/app.conf"]), data)
+        self.assertEqual(list(self.sftp.files), ["/srv/app.conf"], "临时文件没有清理")
+
+    def test_in_place_edit_sends_only_changed_blocks(self):
+        data = replace_block(self.original, 5)
+        sent = self.transfer.save(data, "/srv/app.conf", block_hashes(self.original), self.sftp.copy)
+        self.assertEqual(sent, BLOCK_SIZE)
+        self.assertSaved(data)
+        self.assertEqual(len(self.sftp.renamed), 1)
+
+    def test_insertion_writes_everything(self):
+        data = b"# comment\n" + self.original
+        sent = self.transfer.save(data, "/srv/app.conf", block_hashes(self.original), self.sftp.copy)
+        self.assertEqual(sent, len(data))
+        self.assertSaved(data)
+
+    def test_without_remote_copy_writes_everything(self):
+        data = replace_block(self.original, 5)
+        sent = self.transfer.save(data, "/srv/app.conf", block_hashes(self.original), lambda source, target: False)
+        self.assertEqual(sent, len(data))
+        self.assertSaved(data)
+
+    def test_hard_linked_file_is_written_in_place(self):
+        data = replace_block(self.original, 5)[:-10]
+        sent = self.transfer.save(data, "/srv/app.conf", block_hashes(self.original), self.sftp.copy,
+                                  link_count=lambda path: 2)
+        # 最后一块变短了，也属于变化的块
+        self.assertEqual(sent, BLOCK_SIZE + BLOCK_SIZE - 10)
+        self.assertSaved(data)
+        self.assertEqual(self.sftp.renamed, [])
+
+    def test_new_file(self):
+        sent = self.transfer.save(b"new", "/srv/new.conf")
+        self.assertEqual(sent, 3)
+        self.assertEqual(bytes(self.sftp.files["/srv/new.conf"]), b"new")
+
+
+if __name__ == "__main__":
+    unittest.main()